@@ -0,0 +1,171 @@
+# analytics.py - Vectorised group-by reports over expense data
+#
+# NumPy is optional: without it the same reports are computed with plain
+# Python loops (python_group_by), just more slowly. It is imported on first
+# use (load_numpy), as it takes longer to import than the rest of the app.
+import threading
+from itertools import chain
+
+from rollups import from_minor, to_minor
+
+np = None
+# False until load_numpy() has tried to import NumPy
+_numpy_loaded = False
+
+# Supported group-by keys
+GROUPS = ("category", "payment_method", "month")
+
+
+def load_numpy():
+    """Import NumPy into np unless done already; returns it, or None without NumPy."""
+    global np, _numpy_loaded
+    if not _numpy_loaded:
+        try:
+            import numpy
+        except ImportError:  # pragma: no cover - depends on the environment
+            numpy = None
+        np, _numpy_loaded = numpy, True
+    return np
+
+
+def python_group_by(expenses, group, category=None, date_from=None, date_to=None):
+    """Reference implementation: one pass over expense dicts."""
+    buckets = {}
+    for e in expenses:
+        if ((category is not None and e['category'] != category)
+                or (date_from is not None and e['date'] < date_from)
+                or (date_to is not None and e['date'] > date_to)):
+            continue
+        key = e['date'][:7] if group == 'month' else e[group]
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = buckets[key] = [0, 0]
+        bucket[0] += 1
+        bucket[1] += to_minor(e['amount'])
+    return _report({key: tuple(bucket) for key, bucket in buckets.items()})
+
+
+def _report(buckets):
+    """{key: (count, total paisa)} -> the JSON shape served by /api/analytics."""
+    return {key: {"count": count, "total": from_minor(total), "mean": round(from_minor(total) / count, 2)}
+            for key, (count, total) in sorted(buckets.items()) if count}
+
+
+class ExpenseColumns:
+    """Columnar, date-sorted copy of the expenses.
+
+    amount is int64 paisa, date is datetime64[D], and category and
+    payment_method are dictionary-encoded int32 codes into the
+    ``categories`` / ``payment_methods`` lists. Rows are sorted by date so
+    date ranges are a searchsorted slice and months are contiguous runs.
+    """
+
+    def __init__(self, expenses):
+        load_numpy()
+        categories, payments = {}, {}
+        dates, amounts, category_codes, payment_codes = [], [], [], []
+        for e in expenses:
+            dates.append(e['date'])
+            amounts.append(e['amount'])
+            category_codes.append(categories.setdefault(e['category'], len(categories)))
+            payment_codes.append(payments.setdefault(e['payment_method'], len(payments)))
+        self.categories = list(categories)
+        self.payment_methods = list(payments)
+        self.category_index = categories
+        self.size = len(dates)
+        date = np.array(dates, dtype='datetime64[D]')
+        order = np.argsort(date, kind='stable')
+        self.date = date[order]
+        # np.rint rounds half to even like round() in rollups.to_minor.
+        self.amount = np.rint(np.array(amounts, dtype=np.float64) * 100).astype(np.int64)[order]
+        self.category = np.array(category_codes, dtype=np.int32)[order]
+        self.payment_method = np.array(payment_codes, dtype=np.int32)[order]
+
+    def _select(self, category=None, date_from=None, date_to=None):
+        """Row slice for the date range plus an optional category mask."""
+        start = 0 if date_from is None else np.searchsorted(self.date, np.datetime64(date_from, 'D'), 'left')
+        stop = self.size if date_to is None else np.searchsorted(self.date, np.datetime64(date_to, 'D'), 'right')
+        rows = slice(start, stop)
+        mask = None
+        if category is not None:
+            code = self.category_index.get(category)
+            mask = self.category[rows] == (-1 if code is None else code)
+        return rows, mask
+
+    def group_by(self, group, category=None, date_from=None, date_to=None):
+        """Count, total and mean per group key, like python_group_by()."""
+        rows, mask = self._select(category, date_from, date_to)
+        amount = self.amount[rows]
+        if group == 'month':
+            months = self.date[rows].astype('datetime64[M]')
+            if mask is not None:
+                amount, months = amount[mask], months[mask]
+            if not len(months):
+                return {}
+            # Rows are date-sorted, so each month is one contiguous run.
+            starts = np.flatnonzero(np.r_[True, months[1:] != months[:-1]])
+            totals = np.add.reduceat(amount, starts)
+            counts = np.diff(np.r_[starts, len(months)])
+            labels = [str(m) for m in months[starts]]
+        else:
+            codes = getattr(self, group)[rows]
+            if mask is not None:
+                amount, codes = amount[mask], codes[mask]
+            labels = self.categories if group == 'category' else self.payment_methods
+            # float64 weights are exact for totals below 2**53 paisa.
+            totals = np.bincount(codes, weights=amount, minlength=len(labels)).astype(np.int64)
+            counts = np.bincount(codes, minlength=len(labels))
+        return _report({label: (int(count), int(total)) for label, count, total in zip(labels, counts, totals)})
+
+
+class Analytics:
+    """Store listener keeping an ExpenseColumns snapshot fresh.
+
+    Writes only mark the columns stale; they are rebuilt on the next
+    report, so bursts of edits cost one rebuild rather than one each.
+    Expenses in archives (see archive.py), if given, are reported too.
+    """
+
+    def __init__(self, store, archives=None):
+        self.store = store
+        self.archives = archives
+        self._columns = None
+        # Bumped by every write, so columns built across one are not kept
+        self._generation = 0
+        self._lock = threading.Lock()
+        store.subscribe(self)
+
+    @property
+    def engine(self):
+        return "numpy" if load_numpy() is not None else "python"
+
+    def apply(self, old, new):
+        self._generation += 1
+        self._columns = None
+
+    def expenses(self):
+        """Every live and archived expense."""
+        expenses = self.store.iterate(batch_size=10000)
+        if self.archives is None:
+            return expenses
+        self.archives.refresh()
+        return chain(self.archives.iterate(), expenses)
+
+    def columns(self):
+        with self._lock:
+            columns = self._columns
+            if columns is None:
+                generation = self._generation
+                columns = ExpenseColumns(self.expenses())
+                if generation == self._generation:
+                    self._columns = columns
+            return columns
+
+    def group_by(self, group, category=None, date_from=None, date_to=None):
+        if group not in GROUPS:
+            raise ValueError(f"Unsupported group: {group}")
+        # Writes from other processes mark the columns stale on the way in.
+        self.store.refresh()
+        if load_numpy() is None:
+            return python_group_by(self.expenses(), group, category, date_from, date_to)
+        return self.columns().group_by(group, category, date_from, date_to)
@@ -0,0 +1,344 @@
+# archive.py - Read-only columnar archives of closed-out years
+#
+# Once a year is over its expenses rarely change, yet they would be loaded
+# into the live store and parsed again for every yearly report. Closing a
+# year (python archive.py close YEAR) moves its expenses out of the store
+# into one file per year: fixed-width columns (amount, day ordinal, label
+# codes, ...) packed with array/struct, plus heaps of UTF-8 strings
+# addressed by byte offsets. Readers memory-map the file and index
+# memoryview casts of it, so nothing is parsed or copied up front and a
+# string is only decoded when a row that needs it is read.
+#
+# Layout (little-endian, sections 8-byte aligned, see snapshot.py):
+#   header     HEADER
+#   directory  one DIRECTORY_ENTRY (offset, items) per section, in SECTIONS order
+#   sections
+import bisect
+import heapq
+import mmap
+import os
+import struct
+import sys
+from array import array
+from itertools import accumulate, compress
+from operator import and_, itemgetter
+
+from records import day_ordinal, day_string
+from snapshot import SnapshotError, StringTable, fsync_directory, map_sections, release, write_sections
+
+MAGIC = b'EXPARCH1'
+
+# magic, year
+HEADER = struct.Struct('<8sq')
+
+# (name, array typecode)
+SECTIONS = (
+    # Per expense, in (date, id) order
+    ("id", "q"),
+    ("day", "i"),
+    ("amount", "d"),
+    # Codes into labels
+    ("category", "I"),
+    ("payment_method", "I"),
+    # Codes into text
+    ("item", "I"),
+    ("notes", "I"),
+    # Codes into timestamps
+    ("created_at", "I"),
+    ("updated_at", "I"),
+    ("version", "q"),
+    # String heaps: byte offsets (one more than there are strings) into UTF-8 data
+    ("labels", "Q"),
+    ("labels_heap", "B"),
+    ("text", "Q"),
+    ("text_heap", "B"),
+    ("timestamps", "Q"),
+    ("timestamps_heap", "B"),
+)
+
+ROW_SECTIONS = 10
+
+# Rows decoded per step by YearArchive.iterate()
+BATCH_ROWS = 4096
+
+
+class ArchiveError(SnapshotError):
+    """Raised for a file that is not a complete archive."""
+
+
+def pack_heap(strings):
+    """(byte offsets, UTF-8 heap) of a list of strings, each readable on its own.
+
+    Lone surrogates are kept, as in snapshot.pack_text().
+    """
+    encoded = [text.encode('utf-8', 'surrogatepass') for text in strings]
+    return array('Q', accumulate(map(len, encoded), initial=0)), array('B', b''.join(encoded))
+
+
+class Heap(dict):
+    """Strings of a packed heap by code, each decoded the first time it is asked for."""
+
+    def __init__(self, offsets, data):
+        super().__init__()
+        self.offsets = offsets
+        self.data = data
+
+    def decode(self, code):
+        return str(self.data[self.offsets[code]:self.offsets[code + 1]], 'utf-8', 'surrogatepass')
+
+    def __missing__(self, code):
+        text = self[code] = self.decode(code)
+        return text
+
+
+def archive_path(directory, year):
+    return os.path.join(directory, f'expenses-{year:04d}.archive')
+
+
+def year_bounds(year):
+    """First and last YYYY-MM-DD date of a year."""
+    return f'{year:04d}-01-01', f'{year:04d}-12-31'
+
+
+def write_archive(path, year, expenses):
+    """Atomically write the expense dicts of one year as an archive at path.
+
+    Written beside path, fsynced and renamed over it, like snapshots.
+    """
+    expenses = sorted(expenses, key=itemgetter('date', 'id'))
+    first, last = year_bounds(year)
+    if expenses and not (first <= expenses[0]['date'] and expenses[-1]['date'] <= last):
+        raise ValueError(f"expenses outside {year} cannot go into its archive")
+    labels, text, timestamps = StringTable(), StringTable(), StringTable()
+    columns = {
+        "id": array('q', [e['id'] for e in expenses]),
+        "day": array('i', [day_ordinal(e['date']) for e in expenses]),
+        "amount": array('d', [e['amount'] for e in expenses]),
+        "category": labels.codes([e['category'] for e in expenses]),
+        "payment_method": labels.codes([e['payment_method'] for e in expenses]),
+        "item": text.codes([e['item'] for e in expenses]),
+        "notes": text.codes([e.get('notes') or '' for e in expenses]),
+        "created_at": timestamps.codes([e.get('created_at') or '' for e in expenses]),
+        "updated_at": timestamps.codes([e.get('updated_at') or '' for e in expenses]),
+        "version": array('q', [e.get('version', 0) for e in expenses]),
+    }
+    columns["labels"], columns["labels_heap"] = pack_heap(labels.strings)
+    columns["text"], columns["text_heap"] = pack_heap(text.strings)
+    columns["timestamps"], columns["timestamps_heap"] = pack_heap(timestamps.strings)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        write_sections(f, HEADER.pack(MAGIC, year), SECTIONS, columns)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    fsync_directory(path)
+
+
+class YearArchive:
+    """One archived year, memory-mapped.
+
+    Rows are read straight from the mapping: numbers by indexing the
+    column views, strings by decoding their slice of a heap. The mapping
+    stays open while the object lives.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size < HEADER.size:
+                raise ArchiveError(f"{path}: truncated archive")
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self.inode = os.fstat(f.fileno()).st_ino
+        view = memoryview(self._mmap)
+        magic, self.year = HEADER.unpack_from(view)
+        if magic != MAGIC:
+            view.release()
+            self._mmap.close()
+            raise ArchiveError(f"{path}: not an archive")
+        try:
+            self._columns = map_sections(view, HEADER.size, SECTIONS)
+        except SnapshotError as e:
+            view.release()
+            self._mmap.close()
+            raise ArchiveError(f"{path}: {e}")
+        self._view = view
+        columns = self._columns
+        if any(len(columns[name]) != len(columns["id"]) for name, _ in SECTIONS[:ROW_SECTIONS]):
+            self.close()
+            raise ArchiveError(f"{path}: expense columns differ in length")
+        self.labels = Heap(columns["labels"], columns["labels_heap"])
+        self._label_codes = {sys.intern(self.labels[code]): code for code in range(len(columns["labels"]) - 1)}
+        # Items and notes repeat, so decoded ones are kept; timestamps rarely do.
+        self._text = Heap(columns["text"], columns["text_heap"])
+        self._timestamps = Heap(columns["timestamps"], columns["timestamps_heap"])
+        # The ids sorted, for holds(); made on first use
+        self._ids = None
+
+    def __len__(self):
+        return len(self._columns["id"])
+
+    def holds(self, expense_id):
+        """Whether an expense with this id is in the archive (a binary search)."""
+        if self._ids is None:
+            self._ids = array('q', sorted(self._columns["id"]))
+        i = bisect.bisect_left(self._ids, expense_id)
+        return i < len(self._ids) and self._ids[i] == expense_id
+
+    def close(self):
+        release(self._columns)
+        self._view.release()
+        self._mmap.close()
+
+    def expenses(self, rows):
+        """The rows (a slice, or a list of positions) as the dicts the store returns."""
+        c = self._columns
+        if isinstance(rows, slice):
+            def column(name):
+                return c[name][rows].tolist()
+        else:
+            def column(name):
+                return list(map(c[name].__getitem__, rows))
+        text, labels, timestamp = self._text, self.labels, self._timestamps.decode
+        return [{"id": expense_id, "item": text[item], "amount": amount, "category": labels[category],
+                 "date": day_string(day), "payment_method": labels[payment_method], "notes": text[notes],
+                 "created_at": timestamp(created_at), "updated_at": timestamp(updated_at), "version": version}
+                for expense_id, item, amount, category, day, payment_method, notes, created_at, updated_at, version
+                in zip(column("id"), column("item"), column("amount"), column("category"), column("day"),
+                       column("payment_method"), column("notes"), column("created_at"), column("updated_at"),
+                       column("version"))]
+
+    def bounds(self, date_from=None, date_to=None):
+        """Row range [start, end) of the inclusive dates, by binary search on the day column."""
+        days = self._columns["day"]
+        start = 0 if date_from is None else bisect.bisect_left(days, date_from, key=day_string)
+        end = len(days) if date_to is None else bisect.bisect_right(days, date_to, key=day_string)
+        return start, end
+
+    def iterate(self, category=None, date_from=None, date_to=None, payment_method=None):
+        """Yield matching expenses newest first, like ExpenseStore.iterate()."""
+        start, end = self.bounds(date_from, date_to)
+        filters = []
+        for name, label in (("category", category), ("payment_method", payment_method)):
+            if label is not None:
+                code = self._label_codes.get(label)
+                if code is None:
+                    return
+                filters.append((self._columns[name], code))
+        for stop in range(end, start, -BATCH_ROWS):
+            rows = slice(max(stop - BATCH_ROWS, start), stop)
+            if filters:
+                positions = range(rows.start, rows.stop)
+                masks = [map(code.__eq__, column[rows].tolist()) for column, code in filters]
+                rows = list(compress(positions, masks[0] if len(masks) == 1 else map(and_, *masks)))
+            yield from reversed(self.expenses(rows))
+
+
+class Archives:
+    """Every year archive in a directory (none without one), newest year first.
+
+    refresh() reopens the set when the directory changes, so workers see
+    years closed by another process.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._years = {}
+        self._mtime = None
+        self.refresh()
+
+    def refresh(self):
+        mtime = None
+        if self.directory is not None:
+            try:
+                mtime = os.stat(self.directory).st_mtime_ns
+            except FileNotFoundError:
+                pass
+        if mtime == self._mtime:
+            return
+        self._mtime = mtime
+        years = {}
+        for name in sorted(os.listdir(self.directory)) if mtime is not None else ():
+            if not (name.startswith('expenses-') and name.endswith('.archive')):
+                continue
+            path = os.path.join(self.directory, name)
+            old = self._years.get(int(name[9:-8]))
+            # Archives are replaced, never modified in place.
+            if old is not None and os.stat(path).st_ino == old.inode:
+                years[old.year] = old
+            else:
+                archive = YearArchive(path)
+                years[archive.year] = archive
+        # Dropped archives are left to the garbage collector: an export
+        # may still be reading them.
+        self._years = dict(sorted(years.items(), reverse=True))
+
+    @property
+    def years(self):
+        return list(self._years)
+
+    def __len__(self):
+        return sum(map(len, self._years.values()))
+
+    def holds(self, expense_id):
+        """Whether an archived year holds an expense with this id; the store's archived hook."""
+        self.refresh()
+        return any(archive.holds(expense_id) for archive in list(self._years.values()))
+
+    def iterate(self, category=None, date_from=None, date_to=None, payment_method=None):
+        """Yield archived expenses matching the filters, newest first."""
+        for archive in list(self._years.values()):
+            first, last = year_bounds(archive.year)
+            if (date_from is not None and date_from > last) or (date_to is not None and date_to < first):
+                continue
+            yield from archive.iterate(category, date_from, date_to, payment_method)
+
+
+def newest_first(*sources):
+    """Merge streams of expenses that are each newest first into one."""
+    return heapq.merge(*sources, key=itemgetter('date', 'id'), reverse=True)
+
+
+def open_archives(directory=None):
+    """The archives in ARCHIVE_DIR (default: archive/ beside this file)."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    return Archives(directory or os.environ.get('ARCHIVE_DIR', os.path.join(here, 'archive')))
+
+
+def close_year(store, year, directory):
+    """Move every expense of year from the store into the year's archive.
+
+    Expenses already archived for the year are kept, so a year can be
+    closed again after late entries. The archive is written, durably,
+    with the store's write lock held (store.move_out), so an edit cannot
+    slip in between reading the expenses and dropping them. Returns how
+    many expenses were moved.
+    """
+    path = archive_path(directory, year)
+
+    def save(live):
+        os.makedirs(directory, exist_ok=True)
+        archived = []
+        if os.path.exists(path):
+            archive = YearArchive(path)
+            # A live copy of an archived id (re-added before archives were
+            # checked) replaces the archived one.
+            ids = {expense['id'] for expense in live}
+            archived = [expense for expense in archive.iterate() if expense['id'] not in ids]
+            archive.close()
+        write_archive(path, year, archived + live)
+
+    return len(store.move_out(*year_bounds(year), save))
+
+
+if __name__ == '__main__':
+    # python archive.py close YEAR [directory]
+    if len(sys.argv) >= 3 and sys.argv[1] == 'close':
+        from storage import open_store
+        store = open_store()
+        archives = open_archives(sys.argv[3] if len(sys.argv) > 3 else None)
+        moved = close_year(store, int(sys.argv[2]), archives.directory)
+        store.close()
+        print(f'Archived {moved} expenses from {sys.argv[2]} into {archives.directory}')
+    else:
+        print('usage: python archive.py close YEAR [directory]')
+        sys.exit(2)
@@ -0,0 +1,40 @@
+# benchmarks/bench_analytics.py - NumPy columnar group-by vs pure Python
+#
+# Times building the columnar copy and each group-by report on N synthetic
+# expenses, against the dict-loop reference, and checks both agree.
+# Run from the repo root:  python benchmarks/bench_analytics.py [rows]
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_storage import make_expenses
+
+from analytics import GROUPS, ExpenseColumns, python_group_by
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def run(rows):
+    expenses = make_expenses(rows)
+    columns, build = timed(lambda: ExpenseColumns(expenses))
+    print(f'columnar build: {build:.2f} s for {rows} rows')
+    print(f'{"group":<16} {"filter":<10} {"python ms":>10} {"numpy ms":>10} {"speedup":>8}')
+    month_from = expenses[0]['date'][:8] + '01'
+    for group in GROUPS:
+        for label, filters in (('none', {}), ('category', {'category': 'Shopping'}),
+                               ('from', {'date_from': month_from})):
+            expected, python_s = timed(lambda: python_group_by(expenses, group, **filters))
+            result, numpy_s = timed(lambda: columns.group_by(group, **filters))
+            assert result == expected, (group, filters)
+            print(f'{group:<16} {label:<10} {python_s * 1e3:>10.1f} {numpy_s * 1e3:>10.1f} '
+                  f'{python_s / numpy_s:>7.0f}x')
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
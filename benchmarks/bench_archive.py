@@ -0,0 +1,96 @@
+# benchmarks/bench_archive.py - Yearly reports from a year archive vs parsing JSON
+#
+# Writes N synthetic expenses (three years) as an expenses.json, closes
+# the oldest full year into an archive, then times a yearly per-category
+# report and a CSV-style export of that year read from the JSON file and
+# from the memory-mapped archive, each starting from the file on disk.
+# Run from the repo root:  python benchmarks/bench_archive.py [rows]
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_storage import make_expenses
+
+from archive import YearArchive, archive_path, close_year, year_bounds
+from rollups import to_minor
+from storage import JsonExpenseStore
+
+CSV_FIELDS = ["id", "item", "amount", "category", "date", "payment_method", "notes"]
+
+
+def timed(fn, repeat=3):
+    """(result, best seconds of repeat calls)."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def report(expenses):
+    totals = {}
+    for expense in expenses:
+        bucket = totals.setdefault(expense['category'], [0, 0])
+        bucket[0] += 1
+        bucket[1] += to_minor(expense['amount'])
+    return totals
+
+
+def from_json(path, year):
+    first, last = year_bounds(year)
+    with open(path, encoding='utf-8') as f:
+        return [e for e in json.load(f) if first <= e['date'] <= last]
+
+
+def from_archive(path):
+    archive = YearArchive(path)
+    try:
+        return list(archive.iterate())
+    finally:
+        archive.close()
+
+
+def rows(expenses):
+    return sum(len([expense[field] for field in CSV_FIELDS]) for expense in expenses)
+
+
+def run(rows_count):
+    expenses = make_expenses(rows_count)
+    year = min(int(e['date'][:4]) for e in expenses) + 1
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'expenses.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(expenses, f)
+        os.makedirs(os.path.join(tmp, 'live'))
+        store = JsonExpenseStore(os.path.join(tmp, 'live', 'expenses.json'), compact_every=float('inf'))
+        store.import_expenses(expenses)
+        directory = os.path.join(tmp, 'archive')
+        start = time.perf_counter()
+        moved = close_year(store, year, directory)
+        close = time.perf_counter() - start
+        store.close()
+        archive = archive_path(directory, year)
+        print(f'{year}: {moved} of {rows_count} expenses archived in {close:.2f} s; '
+              f'archive {os.path.getsize(archive) / 2**20:.1f} MiB, expenses.json {os.path.getsize(path) / 2**20:.0f} MiB')
+        print(f'{"yearly report":<16} {"json s":>8} {"archive s":>10}')
+        expected, parse = timed(lambda: report(from_json(path, year)))
+        totals, mapped = timed(lambda: report(from_archive(archive)))
+        assert totals == expected
+        print(f'{"by category":<16} {parse:>8.3f} {mapped:>10.3f}')
+        _, parse = timed(lambda: rows(from_json(path, year)))
+        _, mapped = timed(lambda: rows(from_archive(archive)))
+        print(f'{"export":<16} {parse:>8.3f} {mapped:>10.3f}')
+        mapped_archive = YearArchive(archive)
+        _, mapped = timed(lambda: list(mapped_archive.iterate(date_from=f'{year:04d}-06-01',
+                                                              date_to=f'{year:04d}-06-30')), 10)
+        mapped_archive.close()
+        print(f'one month from the archive: {mapped * 1e3:.1f} ms')
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -0,0 +1,119 @@
+# benchmarks/bench_budgets.py - Budget alerts kept per insert vs rescanning history
+#
+# Loads N synthetic expenses with a budget on every category and one on
+# all spending, then inserts expenses dated this month (and edits that
+# move expenses across categories and months) while checking the alerts
+# after every write: from the incrementally kept MonthlySpending, and by
+# rescanning the history the way a naive addExpense hook would. Also
+# times POST /api/expenses + GET /api/alerts through the Flask test
+# client, and checks the kept totals against a rebuild at the end.
+# Run from the repo root:  python benchmarks/bench_budgets.py [rows] [--inserts K]
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_storage import make_expenses
+
+import main
+from budgets import Budgets, MonthlySpending, alerts
+from shards import Shard
+from storage import JsonExpenseStore
+from synthetic import CATEGORY_PROFILES
+
+RESCANS = 5
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def new_expense(rng, day):
+    return {"item": "Groceries", "amount": rng.randint(50, 5000), "category": rng.choice(list(CATEGORY_PROFILES)),
+            "date": day, "payment_method": "Cash"}
+
+
+def rescan(store, budgets, month):
+    """Alerts computed the naive way: sum the month's spending over the whole history."""
+    spending = MonthlySpending()
+    for expense in store.all():
+        if expense['date'].startswith(month):
+            spending.apply(None, expense)
+    return alerts(budgets, spending, month)
+
+
+def run(rows, inserts):
+    rng = random.Random(3)
+    today = date.today().isoformat()
+    month = today[:7]
+    with tempfile.TemporaryDirectory() as tmp:
+        store = JsonExpenseStore(os.path.join(tmp, 'expenses.json'), compact_every=float('inf'))
+        store.import_expenses(make_expenses(rows))
+        budgets = Budgets(os.path.join(tmp, 'budgets.json'))
+        for category in [None, *CATEGORY_PROFILES]:
+            budgets.add({"category": category, "amount": 20_000 if category else 150_000})
+        shard = main._shard = Shard(store, budgets=budgets)
+        start = time.perf_counter()
+        spending = shard.spending()
+        print(f'{rows} expenses, {len(budgets.all())} budgets; spending built in {time.perf_counter() - start:.2f} s')
+
+        # The listener alone: inserts, then edits moving amount, category and month
+        added = [store.add(new_expense(rng, today)) for _ in range(1000)]
+        start = time.perf_counter()
+        for expense in added:
+            spending.apply(None, expense)
+            spending.apply(expense, None)
+        per_insert = (time.perf_counter() - start) / (2 * len(added))
+        start = time.perf_counter()
+        for expense in added:
+            moved = {**expense, "amount": expense['amount'] + 1, "category": "Other", "date": "2020-02-01"}
+            spending.apply(expense, moved)
+            spending.apply(moved, expense)
+        per_edit = (time.perf_counter() - start) / (2 * len(added))
+        print(f'MonthlySpending.apply: {per_insert * 1e6:.2f} us per insert, {per_edit * 1e6:.2f} us per cross-month edit')
+
+        # Alerts after every write: kept totals vs a rescan of the history
+        definitions = budgets.all()
+        kept = []
+        for _ in range(inserts):
+            store.add(new_expense(rng, today))
+            start = time.perf_counter()
+            result = alerts(definitions, spending, month)
+            kept.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        for _ in range(RESCANS):
+            assert rescan(store, definitions, month) == alerts(definitions, spending, month)
+        scanned = (time.perf_counter() - start) / RESCANS
+        print(f'alerts after a write: {percentile(kept, 0.5) * 1e6:.1f} us kept, {scanned * 1e3:.1f} ms rescanning '
+              f'({len(result)} alerting)')
+
+        # Over HTTP: an insert followed by the alerts, as the page would
+        client = main.app.test_client()
+        latencies = []
+        start = time.perf_counter()
+        for _ in range(inserts):
+            begin = time.perf_counter()
+            assert client.post('/api/expenses', json=new_expense(rng, today)).status_code == 201
+            assert client.get('/api/alerts').status_code == 200
+            latencies.append(time.perf_counter() - begin)
+        elapsed = time.perf_counter() - start
+        print(f'POST /api/expenses + GET /api/alerts: p50 {percentile(latencies, 0.5) * 1e3:.2f} ms, '
+              f'p99 {percentile(latencies, 0.99) * 1e3:.2f} ms, {inserts / elapsed:.0f} inserts/s')
+
+        assert MonthlySpending.build(store.all()).totals == spending.totals, 'kept totals drifted'
+        print('kept totals match a rebuild')
+        store.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('rows', nargs='?', type=int, default=500_000)
+    parser.add_argument('--inserts', type=int, default=2000)
+    args = parser.parse_args()
+    run(args.rows, args.inserts)
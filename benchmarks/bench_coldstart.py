@@ -0,0 +1,88 @@
+# benchmarks/bench_coldstart.py - Store cold start: JSON snapshot vs binary snapshot + journal
+#
+# Writes N synthetic expenses as an old-style expenses.json and as a binary
+# snapshot, then times opening the store in a fresh interpreter (import
+# included) for each, and for the binary snapshot with a journal tail of
+# edits still to replay. Exits non-zero if the snapshot + tail start
+# takes longer than the budget.
+# Run from the repo root:  python benchmarks/bench_coldstart.py [rows] [--budget SECONDS] [--tail N]
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_storage import make_expenses
+
+from storage import JsonExpenseStore
+
+# Seconds allowed to open a 1M-expense store from its snapshot and journal
+COLD_START_BUDGET = 2.5
+
+OPEN_STORE = """
+import time
+start = time.perf_counter()
+from storage import JsonExpenseStore
+store = JsonExpenseStore({path!r}, compact_every=float('inf'))
+print(time.perf_counter() - start, len(store))
+"""
+
+
+def cold_open(path):
+    """(seconds, expenses) to import storage and open the store at path in a new process."""
+    output = subprocess.run([sys.executable, '-c', OPEN_STORE.format(path=path)], cwd=ROOT,
+                            capture_output=True, text=True, check=True).stdout
+    seconds, count = output.split()
+    return float(seconds), int(count)
+
+
+def run(rows, budget, tail):
+    expenses = make_expenses(rows)
+    for i, expense in enumerate(expenses):
+        expense['updated_at'], expense['version'] = expense['created_at'], i + 1
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy = os.path.join(tmp, 'legacy', 'expenses.json')
+        os.makedirs(os.path.dirname(legacy))
+        with open(legacy, 'w', encoding='utf-8') as f:
+            json.dump(expenses, f)
+        binary = os.path.join(tmp, 'binary', 'expenses.json')
+        os.makedirs(os.path.dirname(binary))
+        store = JsonExpenseStore(binary, compact_every=float('inf'))
+        store.import_expenses(expenses)
+        start = time.perf_counter()
+        store.compact()
+        compact = time.perf_counter() - start
+        del expenses
+        print(f'snapshot: {os.path.getsize(store.snapshot_path) / 2**20:.0f} MiB written in {compact:.2f} s; '
+              f'expenses.json: {os.path.getsize(legacy) / 2**20:.0f} MiB')
+        print(f'{"start from":<28} {"seconds":>8}')
+        for label, path in (('expenses.json', legacy), ('snapshot', binary)):
+            seconds, count = cold_open(path)
+            assert count == rows, (label, count)
+            print(f'{label:<28} {seconds:>8.2f}')
+        for expense_id in range(1, tail + 1):
+            store.update(expense_id, {"amount": 1.5})
+        store.close()
+        seconds, count = cold_open(binary)
+        assert count == rows
+        label = f'snapshot + {tail} journaled'
+        print(f'{label:<28} {seconds:>8.2f}')
+    scaled = budget * rows / 1_000_000
+    verdict = 'within' if seconds <= scaled else 'OVER'
+    print(f'{verdict} budget: {seconds:.2f} s against {scaled:.2f} s')
+    return seconds <= scaled
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('rows', nargs='?', type=int, default=1_000_000)
+    parser.add_argument('--budget', type=float, default=COLD_START_BUDGET,
+                        help='seconds allowed per million expenses (default %(default)s)')
+    parser.add_argument('--tail', type=int, default=10_000, help='journaled edits to replay')
+    args = parser.parse_args()
+    sys.exit(0 if run(args.rows, args.budget, args.tail) else 1)
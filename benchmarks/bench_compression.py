@@ -0,0 +1,58 @@
+# benchmarks/bench_compression.py - Bandwidth and CPU cost of response compression
+#
+# Fetches a set of responses with no Accept-Encoding, gzip and br, and
+# reports bytes on the wire and server CPU time per request. The HTML shell
+# and assets are precompressed once per worker, so their compressed
+# variants should cost no more CPU than identity.
+# Run from the repo root:  python benchmarks/bench_compression.py [rows]
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+from bench_storage import make_expenses
+from compression import supported_encodings
+from shards import Shard
+from storage import SQLiteExpenseStore
+
+REPEAT = 20
+
+
+def measure(client, path, encoding):
+    headers = {'Accept-Encoding': encoding} if encoding else {}
+    client.get(path, headers=headers).close()  # warm up
+    size = 0
+    start = time.process_time()
+    for _ in range(REPEAT):
+        response = client.get(path, headers=headers)
+        body = response.get_data()
+        assert response.headers.get('Content-Encoding') in (encoding, None), path
+        size = len(body)
+    return size, (time.process_time() - start) / REPEAT
+
+
+def run(rows):
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SQLiteExpenseStore(os.path.join(tmp, 'expenses.db'))
+        store.import_expenses(make_expenses(rows))
+        main._shard = Shard(store)
+        client = main.app.test_client()
+        paths = ['/', main.ASSET_URLS['js_url'], main.ASSET_URLS['css_url'],
+                 '/api/expenses?limit=500', '/api/stats', '/api/load-demo', '/api/export.csv']
+        encodings = (None,) + supported_encodings()
+        print(f'{"response":<30} {"encoding":<9} {"bytes":>10} {"ratio":>7} {"cpu ms/req":>11}')
+        for path in paths:
+            identity = None
+            for encoding in encodings:
+                size, cpu = measure(client, path, encoding)
+                identity = identity or size
+                print(f'{path[:30]:<30} {encoding or "identity":<9} {size:>10} '
+                      f'{size / identity:>7.2f} {cpu * 1e3:>11.2f}')
+        store.close()
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 20_000)
@@ -0,0 +1,54 @@
+# benchmarks/bench_daterange.py - Date-window stats from prefix sums vs a scan
+#
+# Builds the rollups (with their date index) over N synthetic expenses,
+# then times "last 7/30/365 days" totals and full windowed dashboards
+# against filtering every expense by date.
+# Run from the repo root:  python benchmarks/bench_daterange.py [rows]
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_storage import make_expenses
+
+from rollups import Rollups, to_minor
+
+WINDOWS = (7, 30, 365)
+
+
+def timed(fn, repeat):
+    """Average seconds per call of fn over repeat calls."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return result, (time.perf_counter() - start) / repeat
+
+
+def scan_total(expenses, date_from, date_to):
+    count = total = 0
+    for expense in expenses:
+        if date_from <= expense['date'] <= date_to:
+            count += 1
+            total += to_minor(expense['amount'])
+    return count, total
+
+
+def run(rows):
+    expenses = make_expenses(rows)
+    rollups, build = timed(lambda: Rollups.build(expenses), 1)
+    print(f'rollups build: {build:.2f} s for {rows} rows ({len(rollups.dates.days)} days)')
+    today = date.today().isoformat()
+    print(f'{"window":>7} {"rows":>8} {"total us":>9} {"dashboard us":>13} {"scan ms":>8}')
+    for days in WINDOWS:
+        date_from = (date.today() - timedelta(days=days)).isoformat()
+        (count, total), indexed = timed(lambda: rollups.dates.total(*rollups.dates.bounds(date_from, today)), 1000)
+        _, dashboard = timed(lambda: rollups.to_dict(date_from=date_from, date_to=today), 100)
+        expected, scan = timed(lambda: scan_total(expenses, date_from, today), 3)
+        assert (count, total) == expected, days
+        print(f'{days:>6}d {count:>8} {indexed * 1e6:>9.2f} {dashboard * 1e6:>13.1f} {scan * 1e3:>8.1f}')
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
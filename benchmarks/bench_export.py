@@ -0,0 +1,73 @@
+# benchmarks/bench_export.py - Streaming CSV export at 1M rows
+#
+# Fills a SQLite store, then streams /api/export.csv through the test client
+# and reports time-to-first-byte, total time and peak Python memory
+# (tracemalloc) while the body is consumed. The same numbers are shown for
+# building the whole CSV in memory first, which is what the browser export does.
+# Run from the repo root:  python benchmarks/bench_export.py [rows]
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_storage import make_expenses
+
+import main
+from shards import Shard
+from storage import SQLiteExpenseStore
+
+
+def consume(start_response):
+    """Call start_response() and drain the byte chunks it returns.
+
+    Returns (ttfb s, total s, bytes, peak MiB). The clock starts before the
+    request is issued, because the test client primes the first chunk.
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    chunks = start_response()
+    ttfb = None
+    size = 0
+    for chunk in chunks:
+        if ttfb is None:
+            ttfb = time.perf_counter() - start
+        size += len(chunk)
+    total = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] / 2**20
+    tracemalloc.stop()
+    return ttfb, total, size, peak
+
+
+def run(rows):
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SQLiteExpenseStore(os.path.join(tmp, 'expenses.db'))
+        for start in range(0, rows, 100_000):
+            batch = make_expenses(min(100_000, rows - start), seed=start)
+            for offset, expense in enumerate(batch):
+                expense['id'] = start + offset + 1
+            store.import_expenses(batch)
+        main._shard = Shard(store)
+        client = main.app.test_client()
+
+        def streamed(headers=None):
+            response = client.get('/api/export.csv', headers=headers, buffered=False)
+            return response.response
+
+        def materialized():
+            yield b''.join(main.generate_csv(store.all()))
+
+        print(f'{"mode":<28} {"ttfb ms":>9} {"total s":>9} {"MiB out":>9} {"peak MiB":>9}')
+        for name, start_response in (('streamed', streamed),
+                                     ('streamed + gzip', lambda: streamed({'Accept-Encoding': 'gzip'})),
+                                     ('streamed + br', lambda: streamed({'Accept-Encoding': 'br'})),
+                                     ('materialized in memory', materialized)):
+            ttfb, total, size, peak = consume(start_response)
+            print(f'{name:<28} {ttfb * 1e3:>9.1f} {total:>9.2f} {size / 2**20:>9.1f} {peak:>9.1f}')
+        store.close()
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
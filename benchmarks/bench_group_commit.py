@@ -0,0 +1,66 @@
+# benchmarks/bench_group_commit.py - JSON store write throughput under concurrency
+#
+# Concurrent writers (threads in one or more processes, like gunicorn
+# workers with --threads) add expenses to one shared JsonExpenseStore.
+# Group commit lets the writers queued in a process share one fsync, so
+# throughput should rise with concurrency instead of being capped at one
+# fsync per write. "entries/fsync" is the average batch size.
+# Run from the repo root:  python benchmarks/bench_group_commit.py [writes per writer]
+import os
+import sys
+import tempfile
+import threading
+import time
+from multiprocessing import Process, Queue
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage import JsonExpenseStore
+
+# (processes, threads per process)
+LAYOUTS = ((1, 1), (1, 4), (1, 16), (4, 1), (4, 4), (4, 16))
+
+
+def writer_process(path, threads, writes, results):
+    store = JsonExpenseStore(path)
+
+    def write():
+        for i in range(writes):
+            store.add({"item": f"Coffee {i}", "amount": 120, "date": "2026-01-01"})
+
+    workers = [threading.Thread(target=write) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    results.put((store.commits, store.committed_entries))
+    store.close()
+
+
+def run(writes):
+    print(f'{"processes":>9} {"threads":>8} {"writes":>8} {"writes/s":>10} {"entries/fsync":>14}')
+    for processes, threads in LAYOUTS:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'expenses.json')
+            JsonExpenseStore(path).close()
+            results = Queue()
+            workers = [Process(target=writer_process, args=(path, threads, writes, results))
+                       for _ in range(processes)]
+            start = time.perf_counter()
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+            elapsed = time.perf_counter() - start
+            commits = entries = 0
+            for _ in workers:
+                c, e = results.get()
+                commits, entries = commits + c, entries + e
+            store = JsonExpenseStore(path)
+            assert len(store) == processes * threads * writes, len(store)
+            store.close()
+            print(f'{processes:>9} {threads:>8} {entries:>8} {entries / elapsed:>10.0f} {entries / commits:>14.1f}')
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
@@ -0,0 +1,61 @@
+# benchmarks/bench_import.py - Bulk import throughput through /api/import
+#
+# Writes N synthetic rows to CSV and NDJSON files, then streams each file
+# through the test client into a fresh JSON and SQLite store and reports
+# rows per second.
+# Run from the repo root:  python benchmarks/bench_import.py [rows]
+import csv
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_storage import make_expenses
+
+import main
+from shards import Shard
+from storage import JsonExpenseStore, SQLiteExpenseStore
+
+
+def write_files(tmp, rows):
+    csv_path = os.path.join(tmp, 'import.csv')
+    ndjson_path = os.path.join(tmp, 'import.ndjson')
+    with open(csv_path, 'w', newline='', encoding='utf-8') as c, open(ndjson_path, 'w', encoding='utf-8') as n:
+        writer = csv.writer(c)
+        writer.writerow(main.CSV_HEADER)
+        for start in range(0, rows, 100_000):
+            for expense in make_expenses(min(100_000, rows - start), seed=start):
+                writer.writerow([expense[field] for field in main.CSV_FIELDS])
+                del expense['id']
+                n.write(json.dumps(expense) + '\n')
+    return csv_path, ndjson_path
+
+
+def run(rows):
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path, ndjson_path = write_files(tmp, rows)
+        print(f'{"backend":<8} {"format":<7} {"seconds":>8} {"rows/s":>10}')
+        for backend in ('json', 'sqlite'):
+            for fmt, path, content_type in (('csv', csv_path, 'text/csv'),
+                                            ('ndjson', ndjson_path, 'application/x-ndjson')):
+                if backend == 'json':
+                    store = JsonExpenseStore(os.path.join(tmp, f'{fmt}.json'), compact_every=float('inf'))
+                else:
+                    store = SQLiteExpenseStore(os.path.join(tmp, f'{fmt}.db'))
+                main._shard = Shard(store)
+                client = main.app.test_client()
+                with open(path, 'rb') as f:
+                    start = time.perf_counter()
+                    report = client.post('/api/import', input_stream=f, content_type=content_type,
+                                         content_length=os.path.getsize(path)).json
+                    elapsed = time.perf_counter() - start
+                assert report['imported'] == rows, report
+                print(f'{backend:<8} {fmt:<7} {elapsed:>8.2f} {rows / elapsed:>10.0f}')
+                store.close()
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
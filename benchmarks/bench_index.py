@@ -0,0 +1,51 @@
+# benchmarks/bench_index.py - Requests/sec for the index page
+#
+# Compares the old per-request render_template_string() path with the
+# compiled, cached index() and with conditional GETs answered by 304.
+# Run from the repo root:  python benchmarks/bench_index.py
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import render_template_string
+
+import main
+
+
+def uncached_index():
+    """The original index() body: re-parse and re-render on every request."""
+    return render_template_string(main.HTML_TEMPLATE,
+                                  default_categories=main.DEFAULT_CATEGORIES,
+                                  default_payment_methods=main.DEFAULT_PAYMENT_METHODS,
+                                  current_date=datetime.now().strftime('%Y-%m-%d'),
+                                  **main.ASSET_URLS)
+
+
+def measure(client, requests, headers=None, path='/'):
+    """Issue GET requests against path and return requests per second."""
+    start = time.perf_counter()
+    for _ in range(requests):
+        response = client.get(path, headers=headers)
+        response.close()
+    return requests / (time.perf_counter() - start)
+
+
+def main_bench(requests=500):
+    main.app.add_url_rule('/__uncached', 'uncached_index', uncached_index)
+    client = main.app.test_client()
+    etag = client.get('/').headers['ETag']
+
+    results = [
+        ('render_template_string per request', measure(client, requests, path='/__uncached')),
+        ('compiled + cached body', measure(client, requests)),
+        ('conditional GET (304)', measure(client, requests, headers={'If-None-Match': etag})),
+    ]
+    for name, rps in results:
+        print(f'{name:<40} {rps:>10.0f} req/s')
+
+
+if __name__ == '__main__':
+    main_bench(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
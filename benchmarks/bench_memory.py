@@ -0,0 +1,70 @@
+# benchmarks/bench_memory.py - Bytes per expense held in memory
+#
+# Parses N synthetic expenses from JSON, as the store loads its snapshot,
+# and measures with tracemalloc what they cost as dicts, as compact
+# records.Expense objects, and inside a JsonExpenseStore (records plus its
+# date and version indexes) loaded from expenses.json and from a snapshot.
+# Run from the repo root:  python benchmarks/bench_memory.py [rows]
+import gc
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_storage import make_expenses
+
+from records import Expense
+from storage import JsonExpenseStore
+
+
+def measure(build):
+    """(result, bytes still allocated by build(), seconds)."""
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size, elapsed
+
+
+def as_records(data):
+    dicts = json.loads(data)
+    return [Expense.from_dict(expense) for expense in dicts]
+
+
+def run(rows):
+    expenses = make_expenses(rows)
+    for i, expense in enumerate(expenses):
+        expense['updated_at'], expense['version'] = expense['created_at'], i + 1
+    data = json.dumps(expenses)
+    del expenses
+    print(f'{"representation":<24} {"bytes/expense":>14} {"MiB":>8} {"build s":>8}')
+    for label, build in (('dicts', lambda: json.loads(data)), ('Expense records', lambda: as_records(data))):
+        result, size, elapsed = measure(build)
+        print(f'{label:<24} {size / rows:>14.0f} {size / 2**20:>8.0f} {elapsed:>8.2f}')
+        del result
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'expenses.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(data)
+        store, size, elapsed = measure(lambda: JsonExpenseStore(path))
+        print(f'{"store from JSON":<24} {size / rows:>14.0f} {size / 2**20:>8.0f} {elapsed:>8.2f}')
+        assert len(store) == rows
+        store.compact()
+        store.close()
+        del store
+        # Loading the binary snapshot also shares repeated items and notes.
+        store, size, elapsed = measure(lambda: JsonExpenseStore(path))
+        print(f'{"store from snapshot":<24} {size / rows:>14.0f} {size / 2**20:>8.0f} {elapsed:>8.2f}')
+        store.close()
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
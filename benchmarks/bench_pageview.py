@@ -0,0 +1,40 @@
+# benchmarks/bench_pageview.py - Bytes transferred per page view
+#
+# Compares the old page, with CSS and JavaScript inlined into every
+# response, against the HTML shell plus fingerprinted assets: a first visit
+# downloads everything, a repeat visit only the shell (the assets are
+# cached as immutable) or a 304 when the shell's ETag still matches.
+# Run from the repo root:  python benchmarks/bench_pageview.py
+import os
+import re
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+
+
+def run():
+    client = main.app.test_client()
+    response = client.get('/')
+    shell = response.get_data()
+    assets = [client.get(url).get_data() for url in main.ASSET_URLS.values()]
+    not_modified = client.get('/', headers={'If-None-Match': response.headers['ETag']}).get_data()
+
+    # Rebuild the old single-response page by inlining the assets again.
+    css, js = (a.decode('utf-8') for a in assets)
+    inline = shell.decode('utf-8')
+    inline = re.sub(r'<link rel="stylesheet"[^>]*>', lambda m: f'<style>\n{css}</style>', inline)
+    inline = re.sub(r'<script src="[^"]*"></script>', lambda m: f'<script>\n{js}</script>', inline)
+    inline_size = len(inline.encode('utf-8'))
+
+    print(f'{"page view":<34} {"bytes":>8}')
+    print(f'{"before: inlined page (every view)":<34} {inline_size:>8}')
+    print(f'{"after: first visit (shell + assets)":<34} {len(shell) + sum(map(len, assets)):>8}')
+    print(f'{"after: repeat visit (shell only)":<34} {len(shell):>8}')
+    print(f'{"after: revalidated repeat (304)":<34} {len(not_modified):>8}')
+    print(f'repeat-visit saving: {100 * (1 - len(shell) / inline_size):.0f}%')
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,100 @@
+# benchmarks/bench_querycache.py - Dashboard queries with and without the query cache
+#
+# Loads N synthetic expenses, then replays a dashboard-like mix through
+# the Flask test client: the same few dozen stats, filtered list and
+# analytics queries, with a write (a new expense dated today) every
+# WRITE_EVERY requests. Runs once with the cache disabled and once with
+# it, reporting latency per endpoint, the hit rate and how many cached
+# entries each write invalidated.
+# Run from the repo root:  python benchmarks/bench_querycache.py [rows] [--requests R]
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_storage import make_expenses
+
+import main
+from querycache import QueryCache
+from shards import Shard
+from storage import JsonExpenseStore
+from synthetic import CATEGORY_PROFILES
+
+WRITE_EVERY = 20
+
+
+def queries():
+    """The distinct queries a dashboard session repeats."""
+    today = date.today()
+    windows = [((today - timedelta(days=days)).isoformat(), today.isoformat()) for days in (7, 30, 365)]
+    paths = ['/api/stats', '/api/stats?group=day', '/api/expenses?limit=50',
+             '/api/analytics?group=month', '/api/analytics?group=category']
+    for category in CATEGORY_PROFILES:
+        paths.append(f'/api/stats?category={category}')
+        paths.append(f'/api/expenses?limit=50&category={category}')
+    for date_from, date_to in windows:
+        paths.append(f'/api/stats?from={date_from}&to={date_to}')
+        paths.append(f'/api/expenses?limit=50&from={date_from}&to={date_to}')
+        paths.append(f'/api/analytics?group=category&from={date_from}&to={date_to}')
+    return paths
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def replay(client, paths, requests, seed=1):
+    """{endpoint: [seconds]} for requests requests, writing every WRITE_EVERY."""
+    rng = random.Random(seed)
+    categories = list(CATEGORY_PROFILES)
+    latencies = {}
+    for n in range(requests):
+        if n % WRITE_EVERY == WRITE_EVERY - 1:
+            client.post('/api/expenses', json={"item": "Coffee", "amount": rng.randint(50, 500),
+                                                "category": rng.choice(categories),
+                                                "date": date.today().isoformat(), "payment_method": "Cash"}).close()
+            continue
+        path = rng.choice(paths)
+        start = time.perf_counter()
+        response = client.get(path)
+        response.get_data()
+        response.close()
+        latencies.setdefault(path.split('?')[0], []).append(time.perf_counter() - start)
+    return latencies
+
+
+def run(rows, requests):
+    paths = queries()
+    with tempfile.TemporaryDirectory() as tmp:
+        store = JsonExpenseStore(os.path.join(tmp, 'expenses.json'), compact_every=float('inf'))
+        store.import_expenses(make_expenses(rows))
+        client = main.app.test_client()
+        print(f'{len(paths)} distinct queries, a write every {WRITE_EVERY} requests, {rows} expenses')
+        print(f'{"cache":<6} {"endpoint":<16} {"p50 ms":>8} {"p99 ms":>8} {"mean ms":>8}')
+        for label, cache in (('off', QueryCache(max_bytes=0)), ('on', QueryCache())):
+            main._shard = Shard(store, queries=cache)
+            for path in paths:
+                client.get(path).close()  # build rollups, analytics columns
+            latencies = replay(client, paths, requests)
+            for endpoint, values in sorted(latencies.items()):
+                print(f'{label:<6} {endpoint:<16} {percentile(values, 0.5) * 1e3:>8.2f} '
+                      f'{percentile(values, 0.99) * 1e3:>8.2f} {sum(values) / len(values) * 1e3:>8.2f}')
+        writes = requests // WRITE_EVERY
+        print(f'hit rate {cache.hits / max(1, cache.hits + cache.misses) * 100:.0f}%, '
+              f'{cache.invalidations / max(1, writes):.1f} entries invalidated per write '
+              f'(of {len(paths)}), {cache.size / 1024:.0f} KiB cached')
+        store.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('rows', nargs='?', type=int, default=100_000)
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args()
+    run(args.rows, args.requests)
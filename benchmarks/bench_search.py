@@ -0,0 +1,84 @@
+# benchmarks/bench_search.py - Inverted-index search vs a linear scan
+#
+# Builds the search index over N synthetic expenses, reports build time
+# and memory, then times a mix of queries (whole words, partial words,
+# several words, with category and date filters) against scanning every
+# expense for the same substrings.
+# Run from the repo root:  python benchmarks/bench_search.py [rows]
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_storage import make_expenses
+
+from search import SearchIndex, tokenize
+
+MONTH_AGO = (date.today() - timedelta(days=30)).isoformat()
+
+QUERIES = [
+    ("coffee", {}),
+    ("netfl", {}),
+    ("co", {}),
+    ("coffee friends", {}),
+    ("subscription", {"category": "Entertainment"}),
+    ("fee", {"date_from": MONTH_AGO}),
+    ("phone urgent", {"category": "Bills & Utilities", "date_from": MONTH_AGO}),
+    ("nothingmatches", {}),
+]
+
+
+def linear_search(expenses, query, category=None, date_from=None, date_to=None):
+    """Every expense whose item or notes contain each query word, by scanning."""
+    terms = tokenize(query)
+    found = []
+    for expense in expenses:
+        if category is not None and expense['category'] != category:
+            continue
+        if (date_from is not None and expense['date'] < date_from) or (date_to is not None and expense['date'] > date_to):
+            continue
+        text = f"{expense['item']} {expense['notes']}".casefold()
+        if all(term in text for term in terms):
+            found.append(expense['id'])
+    return found
+
+
+def latencies(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def run(rows):
+    expenses = make_expenses(rows)
+    tracemalloc.start()
+    start = time.perf_counter()
+    index = SearchIndex.build(expenses)
+    build = time.perf_counter() - start
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print(f'index build: {build:.2f} s, {memory / 2**20:.0f} MiB for {rows} rows '
+          f'({len(index._vocabulary)} distinct words)')
+    print(f'{"query":<16} {"filters":<44} {"matches":>8} {"p50 ms":>8} {"p99 ms":>8} {"scan ms":>9}')
+    for query, filters in QUERIES:
+        results = index.search(query, **filters)
+        matches = linear_search(expenses, query, **filters)
+        # The top results must be matches the scan also found.
+        assert {expense_id for expense_id, _ in results} <= set(matches), query
+        assert len(results) == min(20, len(matches)), query
+        samples = sorted(latencies(lambda: index.search(query, **filters), 200))
+        scan = min(latencies(lambda: linear_search(expenses, query, **filters), 3))
+        label = ' '.join(f'{key}={value}' for key, value in filters.items())
+        print(f'{query:<16} {label:<44} {len(matches):>8} {statistics.median(samples) * 1e3:>8.3f} '
+              f'{samples[int(len(samples) * 0.99) - 1] * 1e3:>8.3f} {scan * 1e3:>9.1f}')
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
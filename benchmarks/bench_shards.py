@@ -0,0 +1,96 @@
+# benchmarks/bench_shards.py - Per-request latency against the number of users
+#
+# Creates shards for a growing number of users (EXPENSE_SHARDS_DIR), each
+# with a few synthetic expenses, and at each size sends requests through
+# the Flask test client as those users: most from a working set of recent
+# users, the rest from anyone. With an LRU of open shards, latency should
+# not grow with the number of users, only with the share of cold ones.
+# Run from the repo root:  python benchmarks/bench_shards.py [users ...] [--requests R]
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from storage import JsonExpenseStore
+from synthetic import generate_expenses
+
+USERS = (100, 1_000, 10_000, 100_000)
+EXPENSES_PER_USER = 20
+# Share of requests from the working set, and its size
+HOT_SHARE = 0.95
+HOT_USERS = 100
+CACHE_SIZE = 256
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def populate(directory, start, end):
+    """Create the shards of users start..end-1 the way the pool lays them out."""
+    for user in range(start, end):
+        path = os.path.join(directory, f'user{user}')
+        os.makedirs(path)
+        store = JsonExpenseStore(os.path.join(path, 'expenses.json'))
+        store.import_expenses(list(generate_expenses(EXPENSES_PER_USER, seed=user, days=90)))
+        store.close()
+
+
+def request(client, user, rng):
+    headers = {"X-User-Id": f'user{user}'}
+    roll = rng.random()
+    if roll < 0.8:
+        response = client.get('/api/expenses?limit=20', headers=headers)
+    elif roll < 0.9:
+        response = client.get('/api/stats', headers=headers)
+    else:
+        response = client.post('/api/expenses', headers=headers, json={
+            "item": "Coffee", "amount": 120, "category": "Food & Dining",
+            "date": "2025-01-15", "payment_method": "Cash"})
+    assert response.status_code in (200, 201), response.status_code
+    response.close()
+
+
+def run(sizes, requests):
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['EXPENSE_SHARDS_DIR'] = tmp
+        os.environ['EXPENSE_SHARD_CACHE'] = str(CACHE_SIZE)
+        import main
+        client = main.app.test_client()
+        pool = main.get_shards()
+        rng = random.Random(7)
+        populated = 0
+        print(f'{"users":>8} {"p50 ms":>7} {"p99 ms":>7} {"mean ms":>8} {"hit %":>6} {"open":>5} {"setup s":>8}')
+        for users in sizes:
+            start = time.perf_counter()
+            populate(tmp, populated, users)
+            populated = users
+            setup = time.perf_counter() - start
+            hot = rng.sample(range(users), min(HOT_USERS, users))
+            for user in hot:
+                request(client, user, rng)
+            hits, misses = pool.hits, pool.misses
+            latencies = []
+            for _ in range(requests):
+                user = rng.choice(hot) if rng.random() < HOT_SHARE else rng.randrange(users)
+                begin = time.perf_counter()
+                request(client, user, rng)
+                latencies.append(time.perf_counter() - begin)
+            hit_rate = (pool.hits - hits) / max(1, pool.hits - hits + pool.misses - misses)
+            print(f'{users:>8} {percentile(latencies, 0.5) * 1e3:>7.2f} {percentile(latencies, 0.99) * 1e3:>7.2f} '
+                  f'{sum(latencies) / len(latencies) * 1e3:>8.2f} {hit_rate * 100:>6.1f} {len(pool):>5} {setup:>8.1f}')
+        pool.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('users', nargs='*', type=int, default=USERS)
+    parser.add_argument('--requests', type=int, default=5000)
+    args = parser.parse_args()
+    run(args.users, args.requests)
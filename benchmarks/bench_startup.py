@@ -0,0 +1,154 @@
+# benchmarks/bench_startup.py - Import profile and time to first response under gunicorn
+#
+# First breaks down `import main` by the modules it imports (python -X
+# importtime in a fresh interpreter). Then writes a store of N synthetic
+# expenses and starts gunicorn the way the deployment does (one worker
+# unless --workers), timing from launch to the first page, to a whole
+# dashboard (the page, its CSS and JavaScript, then after --think seconds
+# for the browser to run the script, stats and the first page of
+# expenses) and to /ready. This runs
+# once with gunicorn.conf.py (preloaded app, warm-up before and after the
+# fork) and once with an empty config (everything built on first use).
+# Exits non-zero if, with gunicorn.conf.py, the first page or the
+# dashboard take longer than the budget.
+# Run from the repo root:
+#   python benchmarks/bench_startup.py [rows] [--budget SECONDS] [--runs R] [--workers W] [--think SECONDS]
+import argparse
+import http.client
+import os
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_storage import make_expenses
+
+from storage import JsonExpenseStore
+
+# Seconds from launching gunicorn to the first page and to the dashboard
+STARTUP_BUDGET = 2.0
+# Seconds between receiving the page and its first API call
+THINK_TIME = 0.1
+IMPORT_LINE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|( +)(\S+)')
+
+
+def import_profile():
+    """[(module, cumulative ms)] of the modules main imports itself, plus main's own time."""
+    stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import main'], cwd=ROOT,
+                            capture_output=True, text=True, check=True).stderr
+    children, total = [], None
+    for match in IMPORT_LINE.finditer(stderr):
+        own, cumulative, indent, name = int(match[1]), int(match[2]), len(match[3]), match[4]
+        # Lines are printed as imports finish, so main's children are the
+        # ones since the previous top-level import.
+        if indent == 1:
+            if name == 'main':
+                total = (own / 1e3, cumulative / 1e3)
+                break
+            children = []
+        elif indent == 3:
+            children.append((name, cumulative / 1e3))
+    return sorted(children, key=lambda child: -child[1]), total
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def get(port, path):
+    """Status of GET path, or None while nothing is listening."""
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    try:
+        conn.request('GET', path)
+        response = conn.getresponse()
+        response.read()
+        return response.status
+    except OSError:
+        return None
+    finally:
+        conn.close()
+
+
+def wait_for(port, path, start, status=200, timeout=60):
+    """Seconds since start until path answers status."""
+    while time.perf_counter() - start < timeout:
+        if get(port, path) == status:
+            return time.perf_counter() - start
+        time.sleep(0.005)
+    raise RuntimeError(f'{path} did not answer {status} within {timeout}s')
+
+
+def start_up(config, env, workers, assets, think):
+    """(first page, dashboard, ready) in seconds from launching gunicorn."""
+    port = free_port()
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, '-m', 'gunicorn', f'--config={config}', f'--bind=127.0.0.1:{port}',
+                                '--reuse-port', f'--workers={workers}', '--log-level=warning', 'main:app'],
+                               cwd=ROOT, env=env)
+    try:
+        page = wait_for(port, '/', start)
+        for path in assets:
+            assert get(port, path) == 200, path
+        time.sleep(think)
+        for path in ('/api/stats', '/api/expenses?limit=50'):
+            assert get(port, path) == 200, path
+        loaded = time.perf_counter() - start
+        ready = wait_for(port, '/ready', start)
+        return page, loaded, ready
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def run(rows, budget, runs, workers, think):
+    import main
+    assets = [main.ASSET_URLS['css_url'], main.ASSET_URLS['js_url']]
+    children, (own, total) = import_profile()
+    print(f'import main: {total:.0f} ms ({own:.1f} ms in main itself)')
+    for name, cumulative in children[:8]:
+        print(f'  {name:<16} {cumulative:>7.1f} ms')
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'expenses.json')
+        store = JsonExpenseStore(path, compact_every=float('inf'))
+        store.import_expenses(make_expenses(rows))
+        store.compact()
+        store.close()
+        empty = os.path.join(tmp, 'empty.conf.py')
+        open(empty, 'w').close()
+        env = {key: value for key, value in os.environ.items() if key != 'EXPENSE_SHARDS_DIR'}
+        env.update(EXPENSE_STORE='json', EXPENSES_FILE=path, ARCHIVE_DIR=os.path.join(tmp, 'archive'))
+        print(f'\n{rows} expenses, {workers} worker(s), {think:.2f} s think time, '
+              f'median of {runs} starts (seconds from launch)')
+        print(f'{"config":<18} {"first page":>10} {"dashboard":>10} {"ready":>7}')
+        results = {}
+        for label, config in (('empty config', empty), ('gunicorn.conf.py', os.path.join(ROOT, 'gunicorn.conf.py'))):
+            starts = [start_up(config, env, workers, assets, think) for _ in range(runs)]
+            results[label] = [statistics.median(times) for times in zip(*starts)]
+            page, loaded, ready = results[label]
+            print(f'{label:<18} {page:>10.2f} {loaded:>10.2f} {ready:>7.2f}')
+    page, loaded, _ = results['gunicorn.conf.py']
+    within = page <= budget and loaded <= budget
+    print(f'{"within" if within else "OVER"} budget: first page {page:.2f} s, dashboard {loaded:.2f} s '
+          f'against {budget:.2f} s')
+    return within
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('rows', nargs='?', type=int, default=200_000)
+    parser.add_argument('--budget', type=float, default=STARTUP_BUDGET,
+                        help='seconds allowed to the first page and to the dashboard (default %(default)s)')
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--workers', type=int, default=1, help='gunicorn workers (default: 1, as deployed)')
+    parser.add_argument('--think', type=float, default=THINK_TIME,
+                        help='seconds between the page and its API calls (default %(default)s)')
+    args = parser.parse_args()
+    sys.exit(0 if run(args.rows, args.budget, args.runs, args.workers, args.think) else 1)
@@ -0,0 +1,59 @@
+# benchmarks/bench_storage.py - JSON vs SQLite storage at 10k/100k/1M rows
+#
+# Loads N synthetic expenses into each backend, then times lookups by id
+# and the category / date-range filters the dashboard uses.
+# Run from the repo root:  python benchmarks/bench_storage.py [10000 100000 1000000]
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage import JsonExpenseStore, SQLiteExpenseStore
+from synthetic import generate_expenses
+
+
+def make_expenses(n, seed=42):
+    """n synthetic expenses spread over the last three years."""
+    return list(generate_expenses(n, seed=seed, days=3 * 365))
+
+
+def timed(fn, repeat=1):
+    """Average seconds per call of fn over repeat calls."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def bench(store, expenses, n):
+    load = timed(lambda: store.import_expenses(expenses))
+    ids = [random.randint(1, n) for _ in range(1000)]
+    lookup = timed(lambda: [store.get(i) for i in ids]) / len(ids)
+    month_from = (date.today() - timedelta(days=30)).isoformat()
+    category = timed(lambda: store.find(category="Shopping", date_from=month_from), repeat=5)
+    date_range = timed(lambda: store.find(date_from=month_from), repeat=5)
+    return load, lookup, category, date_range
+
+
+def main(sizes):
+    print(f'{"rows":>9} {"backend":<8} {"load s":>9} {"get us":>9} {"cat+30d ms":>11} {"30d ms":>9}')
+    for n in sizes:
+        expenses = make_expenses(n)
+        with tempfile.TemporaryDirectory() as tmp:
+            stores = [
+                ('json', JsonExpenseStore(os.path.join(tmp, 'expenses.json'), compact_every=float('inf'))),
+                ('sqlite', SQLiteExpenseStore(os.path.join(tmp, 'expenses.db'))),
+            ]
+            for name, store in stores:
+                load, lookup, category, date_range = bench(store, expenses, n)
+                print(f'{n:>9} {name:<8} {load:>9.2f} {lookup * 1e6:>9.1f} '
+                      f'{category * 1e3:>11.2f} {date_range * 1e3:>9.2f}')
+                store.close()
+
+
+if __name__ == '__main__':
+    main([int(a) for a in sys.argv[1:]] or [10_000, 100_000, 1_000_000])
@@ -0,0 +1,58 @@
+# benchmarks/bench_sync.py - Delta sync payload and latency vs history size
+#
+# Seeds stores of growing size, makes a fixed number of edits and deletes,
+# then times a device catching up from the version it last saw. The delta
+# should stay the same size however much history sits behind it; a full
+# download is shown for comparison.
+# Run from the repo root:  python benchmarks/bench_sync.py [changes]
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+from bench_storage import make_expenses
+from shards import Shard
+from storage import JsonExpenseStore, SQLiteExpenseStore
+
+SIZES = (1_000, 10_000, 100_000)
+
+
+def run(changes):
+    print(f'{"backend":<8} {"rows":>8} {"delta bytes":>12} {"delta ms":>9} {"full bytes":>12}')
+    for backend in ('json', 'sqlite'):
+        for rows in SIZES:
+            with tempfile.TemporaryDirectory() as tmp:
+                if backend == 'json':
+                    store = JsonExpenseStore(os.path.join(tmp, 'expenses.json'), compact_every=10**9)
+                else:
+                    store = SQLiteExpenseStore(os.path.join(tmp, 'expenses.db'))
+                store.import_expenses(make_expenses(rows))
+                main._shard = Shard(store)
+                client = main.app.test_client()
+                since = store.last_version()
+                for expense_id in range(1, changes + 1):
+                    if expense_id % 4:
+                        store.update(expense_id, {"amount": 1.5})
+                    else:
+                        store.delete(expense_id)
+                start = time.perf_counter()
+                delta = client.post('/api/sync', json={"since": since, "changes": []}).get_data()
+                elapsed = time.perf_counter() - start
+                assert len(json.loads(delta)['changes']) == changes
+                # A full download pages through everything from version 0.
+                full, version, more = 0, 0, True
+                while more:
+                    body = client.post('/api/sync', json={"since": version, "changes": []}).get_data()
+                    result = json.loads(body)
+                    full += len(body)
+                    version, more = result['version'], result['has_more']
+                print(f'{backend:<8} {rows:>8} {len(delta):>12} {elapsed * 1e3:>9.2f} {full:>12}')
+                store.close()
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 100)
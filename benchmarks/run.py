@@ -0,0 +1,244 @@
+# benchmarks/run.py - Latency and throughput suite for main:app
+#
+# Seeds a temporary store with synthetic expenses, then drives the app
+# through the Flask test client (in-process) and/or a locally spawned
+# gunicorn started the same way as the .replit deployment, and records
+# latency percentiles and throughput per endpoint. Results are written as
+# JSON to benchmarks/results/ so runs can be compared.
+#
+#   python benchmarks/run.py --rows 10000 --requests 200
+#   python benchmarks/run.py --mode gunicorn --workers 4 --concurrency 8
+#   python benchmarks/run.py --compare benchmarks/results/<earlier>.json
+import argparse
+import http.client
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from synthetic import generate_expenses
+
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+
+
+def endpoints():
+    """(name, method, path, body) for every route under test."""
+    month_ago = (date.today() - timedelta(days=30)).isoformat()
+    new_expense = json.dumps({"item": "Benchmark", "amount": 99.5, "category": "Other",
+                              "date": date.today().isoformat(), "payment_method": "Cash"})
+    return [
+        ("index", "GET", "/", None),
+        ("index_304", "GET", "/", None),
+        ("asset_js", "GET", "/assets/<js>", None),
+        ("load_demo", "GET", "/api/load-demo", None),
+        ("load_demo_10k", "GET", "/api/load-demo?n=10000&seed=1", None),
+        ("list_page", "GET", "/api/expenses?limit=50", None),
+        ("list_filtered", "GET", "/api/expenses?category=Shopping&limit=50", None),
+        ("stats", "GET", "/api/stats", None),
+        ("analytics_month", "GET", "/api/analytics?group=month", None),
+        ("export_30d", "GET", f"/api/export.csv?from={month_ago}", None),
+        ("create", "POST", "/api/expenses", new_expense),
+    ]
+
+
+def summarize(latencies, wall):
+    """Percentiles in milliseconds plus throughput for one endpoint."""
+    ordered = sorted(latencies)
+
+    def pct(p):
+        return round(ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))] * 1e3, 3)
+
+    return {
+        "requests": len(ordered),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1e3, 3),
+        "p50_ms": pct(50),
+        "p90_ms": pct(90),
+        "p99_ms": pct(99),
+        "max_ms": round(ordered[-1] * 1e3, 3),
+        "rps": round(len(ordered) / wall, 1),
+    }
+
+
+def seed_data(tmp, rows, backend):
+    """Write `rows` synthetic expenses to a fresh store; returns its environment."""
+    json_path = os.path.join(tmp, 'expenses.json')
+    with open(json_path, 'w', encoding='utf-8') as f:
+        json.dump(list(generate_expenses(rows, seed=1, days=365)), f)
+    env = {"EXPENSE_STORE": backend, "EXPENSES_FILE": json_path}
+    if backend == 'sqlite':
+        from storage import migrate_json_to_sqlite
+        env["EXPENSES_DB"] = os.path.join(tmp, 'expenses.db')
+        migrate_json_to_sqlite(json_path, env["EXPENSES_DB"])
+    return env
+
+
+# ----------------------------------------------------------------------
+# In-process: Flask test client
+# ----------------------------------------------------------------------
+def run_client(env, requests):
+    os.environ.update(env)
+    import main
+    main._shard = None
+    client = main.app.test_client()
+    etag = client.get('/').headers['ETag']
+    results = {}
+    for name, method, path, body in endpoints():
+        path = path.replace('/assets/<js>', main.ASSET_URLS['js_url'])
+        headers = {"If-None-Match": etag} if name == "index_304" else {}
+        kwargs = {"data": body, "content_type": "application/json"} if body else {}
+        client.open(path, method=method, headers=headers, **kwargs).close()  # warm up
+        latencies = []
+        start = time.perf_counter()
+        for _ in range(requests):
+            t = time.perf_counter()
+            response = client.open(path, method=method, headers=headers, **kwargs)
+            response.get_data()
+            latencies.append(time.perf_counter() - t)
+            assert response.status_code < 400, (name, response.status_code)
+        results[name] = summarize(latencies, time.perf_counter() - start)
+    return results
+
+
+# ----------------------------------------------------------------------
+# Out-of-process: gunicorn, as deployed
+# ----------------------------------------------------------------------
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def http_request(port, method, path, body=None, headers=None):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    try:
+        headers = dict(headers or {})
+        if body:
+            headers["Content-Type"] = "application/json"
+        conn.request(method, path, body=body, headers=headers)
+        response = conn.getresponse()
+        response.read()
+        return response
+    finally:
+        conn.close()
+
+
+def start_gunicorn(env, workers):
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', f'--bind=127.0.0.1:{port}', '--reuse-port',
+         f'--workers={workers}', '--log-level=warning', 'main:app'],
+        cwd=ROOT, env={**os.environ, **env})
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            http_request(port, 'GET', '/')
+            return process, port
+        except OSError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("gunicorn did not start within 30s")
+
+
+def run_gunicorn(env, requests, workers, concurrency):
+    process, port = start_gunicorn(env, workers)
+    try:
+        etag = http_request(port, 'GET', '/').getheader('ETag')
+        import main
+        results = {}
+        with ThreadPoolExecutor(concurrency) as pool:
+            for name, method, path, body in endpoints():
+                path = path.replace('/assets/<js>', main.ASSET_URLS['js_url'])
+                headers = {"If-None-Match": etag} if name == "index_304" else {}
+
+                def one(_):
+                    t = time.perf_counter()
+                    response = http_request(port, method, path, body, headers)
+                    assert response.status < 400, (name, response.status)
+                    return time.perf_counter() - t
+
+                # Warm every worker before timing.
+                list(pool.map(one, range(workers)))
+                start = time.perf_counter()
+                latencies = list(pool.map(one, range(requests)))
+                results[name] = summarize(latencies, time.perf_counter() - start)
+        return results
+    finally:
+        process.terminate()
+        process.wait(10)
+
+
+# ----------------------------------------------------------------------
+# Reporting
+# ----------------------------------------------------------------------
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_table(mode, results, baseline=None):
+    print(f'\n[{mode}]')
+    print(f'{"endpoint":<18} {"p50 ms":>9} {"p90 ms":>9} {"p99 ms":>9} {"req/s":>9}' + ('   vs baseline' if baseline else ''))
+    for name, r in results.items():
+        line = f'{name:<18} {r["p50_ms"]:>9.2f} {r["p90_ms"]:>9.2f} {r["p99_ms"]:>9.2f} {r["rps"]:>9.1f}'
+        old = (baseline or {}).get(name)
+        if old:
+            line += f'   p50 x{r["p50_ms"] / old["p50_ms"]:.2f}, req/s x{r["rps"] / old["rps"]:.2f}'
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Latency and throughput suite for main:app')
+    parser.add_argument('--rows', type=int, default=10_000, help='synthetic expenses to seed')
+    parser.add_argument('--requests', type=int, default=200, help='requests per endpoint')
+    parser.add_argument('--backend', choices=['json', 'sqlite'], default='json')
+    parser.add_argument('--mode', choices=['client', 'gunicorn', 'both'], default='client')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn workers')
+    parser.add_argument('--concurrency', type=int, default=4, help='parallel clients against gunicorn')
+    parser.add_argument('--compare', help='earlier results file to compare against')
+    parser.add_argument('--output', help='results file (default: benchmarks/results/<timestamp>.json)')
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)["results"]
+
+    report = {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "config": vars(args),
+        "results": {},
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        env = seed_data(tmp, args.rows, args.backend)
+        if args.mode in ('client', 'both'):
+            report["results"]["client"] = run_client(env, args.requests)
+        if args.mode in ('gunicorn', 'both'):
+            report["results"]["gunicorn"] = run_gunicorn(env, args.requests, args.workers, args.concurrency)
+
+    for mode, results in report["results"].items():
+        print_table(mode, results, (baseline or {}).get(mode))
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ') + '.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f'\nResults written to {output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,258 @@
+# budgets.py - Monthly budgets and the alerts they raise
+#
+# A budget caps the spending of one category, or of everything, per
+# calendar month and raises an alert at each threshold (a percentage of
+# the cap) the month's spending reaches: "Food & Dining at 90%". Spending
+# per (month, category) and per month is kept by a store listener
+# (MonthlySpending), so an insert, edit or delete costs a few dict updates
+# however long the history is; an edit that moves an expense to another
+# category or month comes off one total and goes onto the other.
+#
+# Budgets themselves are a handful of definitions in a JSON file beside
+# the store (budgets.json), replaced atomically on every change and
+# re-read by other workers when it changes.
+import json
+import os
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+from rollups import from_minor, to_minor
+from snapshot import fsync_directory
+from storage import MAX_AMOUNT, ValidationError
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+# Percentages of a budget that raise an alert, unless it lists its own
+DEFAULT_THRESHOLDS = (50, 90, 100)
+MAX_THRESHOLD = 1000
+# Name of the budget on all spending in alerts
+OVERALL = "Overall"
+
+
+class MonthlySpending:
+    """Spending in paisa per (month, category), and per month under category None.
+
+    Subscribed to an expense store, each insert/edit/delete adjusts at most
+    four totals.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # ("YYYY-MM", category or None) -> paisa
+        self.totals = {}
+
+    @classmethod
+    def build(cls, expenses):
+        """Compute the totals from scratch."""
+        spending = cls()
+        for expense in expenses:
+            spending._add(expense, 1)
+        return spending
+
+    def _add(self, expense, sign):
+        amount = to_minor(expense['amount']) * sign
+        month = expense['date'][:7]
+        totals = self.totals
+        for key in ((month, expense['category']), (month, None)):
+            total = totals.get(key, 0) + amount
+            if total:
+                totals[key] = total
+            else:
+                totals.pop(key, None)
+
+    def apply(self, old, new):
+        """Store listener hook: old is None for inserts, new is None for deletes."""
+        with self._lock:
+            if old is not None:
+                self._add(old, -1)
+            if new is not None:
+                self._add(new, 1)
+
+    def spent(self, month, category=None):
+        """Paisa spent in month ("YYYY-MM"), in one category or in all (None)."""
+        return self.totals.get((month, category), 0)
+
+
+def validate_budget(data, existing=None):
+    """Validate budget input; fields left out keep existing's values.
+
+    Returns {"category", "amount", "thresholds"}; category None is the
+    budget on all spending. Raises ValidationError on bad input.
+    """
+    if not isinstance(data, dict):
+        raise ValidationError("Budget must be a JSON object")
+    base = existing or {}
+
+    category = data.get('category', base.get('category'))
+    if isinstance(category, str):
+        category = category.strip() or None
+    elif category is not None:
+        raise ValidationError("category must be a category name, or null for all spending")
+
+    try:
+        amount = float(data.get('amount', base.get('amount')))
+    except (TypeError, ValueError, OverflowError):
+        amount = float('nan')
+    # At least one paisa, which budget_status() divides by, and no more than an expense may be
+    if not 0 < amount <= MAX_AMOUNT or to_minor(amount) < 1:
+        raise ValidationError(f"Please enter a valid budget amount from 0.01 to {MAX_AMOUNT:,}")
+
+    thresholds = data.get('thresholds', base.get('thresholds', DEFAULT_THRESHOLDS))
+    if (not isinstance(thresholds, (list, tuple)) or not thresholds
+            or not all(type(t) is int and 0 < t <= MAX_THRESHOLD for t in thresholds)):
+        raise ValidationError(f"thresholds must be a list of whole percentages from 1 to {MAX_THRESHOLD}")
+
+    return {"category": category, "amount": amount, "thresholds": sorted(set(thresholds))}
+
+
+class Budgets:
+    """Budget definitions by id, kept in a JSON file (in memory only without one).
+
+    Changes take an exclusive lock on <path>.lock, start from the latest
+    file and replace it atomically; refresh() picks up other processes'
+    changes, costing one stat when there are none.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._budgets = {}
+        self._next_id = 1
+        # (inode, mtime) of the file last loaded; every save makes a new inode
+        self._stamp = None
+        self._lock = threading.Lock()
+        self.refresh()
+
+    def _file_stamp(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def refresh(self):
+        if self.path is None:
+            return
+        with self._lock:
+            self._load()
+
+    def _load(self):
+        """Re-read the file if it changed since it was last loaded (lock held)."""
+        stamp = self._file_stamp()
+        if stamp == self._stamp:
+            return
+        budgets, next_id = [], 1
+        if stamp is not None:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+            budgets, next_id = data['budgets'], data['next_id']
+        self._budgets = {budget['id']: budget for budget in budgets}
+        self._next_id = next_id
+        self._stamp = stamp
+
+    def _save(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"next_id": self._next_id, "budgets": list(self._budgets.values())}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        fsync_directory(self.path)
+        self._stamp = self._file_stamp()
+
+    @contextmanager
+    def _changing(self):
+        """Hold the locks with the latest budgets loaded, and save them afterwards."""
+        with self._lock:
+            if self.path is None:
+                yield
+                return
+            with open(self.path + '.lock', 'a') as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                self._load()
+                yield
+                self._save()
+
+    def all(self):
+        """Every budget, oldest first."""
+        with self._lock:
+            return [dict(budget) for budget in self._budgets.values()]
+
+    def get(self, budget_id):
+        with self._lock:
+            budget = self._budgets.get(budget_id)
+            return dict(budget) if budget is not None else None
+
+    def _check_unique(self, budget, budget_id=None):
+        for other in self._budgets.values():
+            if other['category'] == budget['category'] and other['id'] != budget_id:
+                raise ValidationError(f"There is already a budget for {budget['category'] or 'all spending'}")
+
+    def add(self, data):
+        """Validate and store a new budget; returns it with its id."""
+        budget = validate_budget(data)
+        with self._changing():
+            self._check_unique(budget)
+            now = datetime.now().isoformat()
+            budget = {"id": self._next_id, **budget, "created_at": now, "updated_at": now}
+            self._budgets[budget['id']] = budget
+            self._next_id += 1
+        return dict(budget)
+
+    def update(self, budget_id, data):
+        """Change a budget (fields left out keep their values); None if there is no such budget."""
+        with self._changing():
+            existing = self._budgets.get(budget_id)
+            if existing is None:
+                return None
+            budget = validate_budget(data, existing)
+            self._check_unique(budget, budget_id)
+            budget = {**existing, **budget, "updated_at": datetime.now().isoformat()}
+            self._budgets[budget_id] = budget
+        return dict(budget)
+
+    def delete(self, budget_id):
+        with self._changing():
+            return self._budgets.pop(budget_id, None) is not None
+
+
+def budget_status(budget, spending, month):
+    """A budget with what was spent against it in month and the highest threshold reached."""
+    # Clamped like validate_budget(), for budgets saved before it checked the bounds
+    limit = max(1, to_minor(min(budget['amount'], MAX_AMOUNT)))
+    spent = spending.spent(month, budget['category'])
+    percent = spent * 100 / limit
+    reached = [threshold for threshold in budget['thresholds'] if percent >= threshold]
+    return {**budget, "month": month, "spent": from_minor(spent), "remaining": from_minor(limit - spent),
+            "percent": round(percent, 1), "alert": reached[-1] if reached else None}
+
+
+def alerts(budgets, spending, month):
+    """An alert per budget that reached one of its thresholds in month, most used first."""
+    result = []
+    for budget in budgets:
+        status = budget_status(budget, spending, month)
+        if status['alert'] is None:
+            continue
+        result.append({
+            "budget_id": budget['id'],
+            "category": budget['category'],
+            "month": month,
+            "threshold": status['alert'],
+            "percent": status['percent'],
+            "spent": status['spent'],
+            "amount": budget['amount'],
+            "message": f"{budget['category'] or OVERALL} at {status['alert']}%",
+        })
+    result.sort(key=lambda alert: -alert['percent'])
+    return result
+
+
+def open_budgets(path=None):
+    """The budgets in BUDGETS_FILE (default: budgets.json beside this file)."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    return Budgets(path or os.environ.get('BUDGETS_FILE', os.path.join(here, 'budgets.json')))
@@ -0,0 +1,130 @@
+# compression.py - gzip/brotli response compression with content negotiation
+#
+# Brotli is optional: without the brotli package only gzip is offered.
+import zlib
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - depends on the environment
+    brotli = None
+
+# Bodies smaller than this go out uncompressed; headers would eat the saving
+MIN_SIZE = 1024
+
+# Mimetypes worth compressing
+COMPRESSIBLE_TYPES = {
+    "text/html", "text/css", "text/csv", "text/plain",
+    "application/javascript", "application/json", "application/x-ndjson",
+}
+
+# Levels for responses compressed per request; precomputed bodies use the maximum
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def supported_encodings():
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def negotiate(accept_encodings):
+    """Best encoding the client accepts ("br", "gzip") or None for identity.
+
+    accept_encodings is werkzeug's request.accept_encodings.
+    """
+    best, best_quality = None, 0
+    for encoding in supported_encodings():
+        quality = accept_encodings[encoding]
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def compress(data, encoding, best=False):
+    """Compress a whole body in one go."""
+    if encoding == "br":
+        return brotli.compress(data, quality=11 if best else BROTLI_QUALITY)
+    if encoding == "gzip":
+        compressor = zlib.compressobj(9 if best else GZIP_LEVEL, zlib.DEFLATED, 31)
+        return compressor.compress(data) + compressor.flush()
+    return data
+
+
+def compress_stream(chunks, encoding):
+    """Compress a stream of byte chunks as they are produced.
+
+    Each input chunk is flushed through, so clients can start consuming
+    (e.g. NDJSON rows) without waiting for the whole body.
+    """
+    if encoding == "br":
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        for chunk in chunks:
+            data = compressor.process(chunk) + compressor.flush()
+            if data:
+                yield data
+        yield compressor.finish()
+    else:
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+        for chunk in chunks:
+            data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            if data:
+                yield data
+        yield compressor.flush()
+
+
+class PrecompressedBody:
+    """A fixed response body whose compressed variants are computed once and kept."""
+
+    def __init__(self, data):
+        self.data = data
+        self._variants = {None: data}
+
+    def get(self, encoding):
+        variant = self._variants.get(encoding)
+        if variant is None:
+            variant = self._variants[encoding] = compress(self.data, encoding, best=True)
+        return variant
+
+
+def compress_response(response, accept_encodings, if_none_match=()):
+    """Compress a Flask response in place if the client and the body allow it.
+
+    Skips bodies that are already encoded, empty (HEAD, 204, 304), of an
+    incompressible type or smaller than MIN_SIZE. Bodies with a known
+    length are compressed at once; streamed bodies are compressed chunk by
+    chunk. An ETag gets the encoding appended, and if_none_match (the
+    request's) holding that ETag turns the response into a 304.
+    """
+    response.vary.add("Accept-Encoding")
+    if (response.status_code < 200 or response.status_code in (204, 206, 304)
+            or "Content-Encoding" in response.headers
+            or response.mimetype not in COMPRESSIBLE_TYPES):
+        return response
+    encoding = negotiate(accept_encodings)
+    if encoding is None:
+        return response
+    length = response.content_length
+    if response.is_streamed:
+        if length is not None and length < MIN_SIZE:
+            return response
+    else:
+        data = response.get_data()
+        if len(data) < MIN_SIZE:
+            return response
+    response.headers["Content-Encoding"] = encoding
+    etag, weak = response.get_etag()
+    if etag:
+        etag = f"{etag}-{encoding}"
+        response.set_etag(etag, weak)
+        if response.status_code == 200 and etag in if_none_match:
+            # A conditional response (send_file) was checked against the
+            # identity ETag; the client holds this encoding's.
+            response.status_code = 304
+            return response
+    if response.is_streamed:
+        # Includes send_file() responses, which are passed through untouched otherwise.
+        response.direct_passthrough = False
+        response.response = compress_stream(response.response, encoding)
+        response.headers.pop("Content-Length", None)
+    else:
+        response.set_data(compress(data, encoding))
+    return response
@@ -0,0 +1,21 @@
+# gunicorn.conf.py - Read by gunicorn from the working directory, so the
+# .replit deployment (gunicorn ... main:app) uses it as is.
+#
+# The app is imported once, in the master, which then builds the state all
+# workers share (main.warm_up) before forking them; workers start with it
+# already in memory instead of each importing and building it again. Each
+# worker opens its own store in the background once it has answered its
+# first request (main.warm_after_first_response): open files, locks and
+# database connections must not cross a fork.
+
+preload_app = True
+
+
+def when_ready(server):
+    import main
+    main.warm_up()
+
+
+def post_fork(server, worker):
+    import main
+    main.warm_after_first_response()
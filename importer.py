@@ -0,0 +1,92 @@
+# importer.py - Bulk import of expenses from CSV or NDJSON uploads
+import csv
+import io
+import json
+
+from storage import ValidationError, validate_expense
+
+# Valid rows committed per transaction
+IMPORT_BATCH_SIZE = 5000
+
+# Row errors listed individually in the report; the rest are only counted
+MAX_REPORTED_ERRORS = 1000
+
+# CSV headings accepted for each field: the API names plus the ones the CSV export writes
+CSV_COLUMNS = {
+    "item": "item", "amount": "amount", "category": "category", "date": "date",
+    "payment_method": "payment_method", "payment method": "payment_method", "payment": "payment_method",
+    "notes": "notes", "created_at": "created_at",
+}
+
+
+def parse_csv(stream):
+    """Yield one dict per CSV row from a binary stream, reading it incrementally."""
+    reader = csv.reader(io.TextIOWrapper(stream, encoding='utf-8-sig', newline=''))
+    header = next(reader, None)
+    if header is None:
+        return
+    fields = [CSV_COLUMNS.get(name.strip().lower()) for name in header]
+    for row in reader:
+        yield {field: value for field, value in zip(fields, row) if field}
+
+
+def parse_ndjson(stream):
+    """Yield one object per line of newline-delimited JSON from a binary stream.
+
+    Lines that are not valid JSON are yielded as the ValueError they raise,
+    so they show up in the import report at their row number.
+    """
+    for line in io.TextIOWrapper(stream, encoding='utf-8'):
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            yield e
+
+
+class ImportReport:
+    """Running tally of an import, returned to the client as JSON."""
+
+    def __init__(self):
+        self.imported = 0
+        self.failed = 0
+        self.errors = []
+
+    def error(self, row, message):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": row, "error": message})
+
+    def to_dict(self):
+        return {
+            "imported": self.imported,
+            "failed": self.failed,
+            "errors": self.errors,
+            "errors_truncated": self.failed > len(self.errors),
+        }
+
+
+def import_rows(store, rows, batch_size=IMPORT_BATCH_SIZE):
+    """Validate rows like addExpense() and store the valid ones in batched transactions.
+
+    Rows are consumed lazily, so at most one batch is held in memory.
+    Row numbers in the report count data rows from 1.
+    """
+    report = ImportReport()
+    batch = []
+    for n, row in enumerate(rows, 1):
+        if isinstance(row, Exception):
+            report.error(n, f"Invalid JSON: {row}")
+            continue
+        try:
+            batch.append(validate_expense(row))
+        except ValidationError as e:
+            report.error(n, str(e))
+            continue
+        if len(batch) >= batch_size:
+            report.imported += len(store.add_many(batch))
+            batch = []
+    if batch:
+        report.imported += len(store.add_many(batch))
+    return report
@@ -1,8 +1,29 @@
 # main.py - Personal Expense Tracker for Replit
-from flask import Flask, request, render_template_string, jsonify
+from flask import Flask, Response, abort, g, request, jsonify, make_response, send_file
+import csv
+import hashlib
+import io
 import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime
 
+import metrics
+from compression import PrecompressedBody, compress_response, negotiate, supported_encodings
+from analytics import GROUPS as ANALYTICS_GROUPS, load_numpy
+from archive import newest_first, open_archives
+from budgets import alerts as budget_alerts, budget_status, open_budgets
+from importer import import_rows, parse_csv, parse_ndjson
+from querycache import QueryCache, Scope
+from rollups import check_consistency
+from shards import Shard, open_shards
+from storage import ArchivedError, ValidationError, decode_cursor, encode_cursor, open_store
+from synthetic import generate_expenses
+from sync import MAX_PUSH, SYNC_PAGE_SIZE, sync
+
 app = Flask(__name__)
 
 # Default expense categories
@@ -15,19 +36,277 @@ DEFAULT_CATEGORIES = [
 DEFAULT_PAYMENT_METHODS = ["Cash", "Digital (Esewa/Net Banking)", "Card (Credit/Debit)", "Other"]
 
 
+# ============================================
+# REQUEST METRICS
+# ============================================
+# Shared directory for cross-worker metrics under gunicorn (unset: per process)
+METRICS_DIR = os.environ.get('METRICS_DIR')
+
+# Store methods timed in storage_operation_seconds
+STORE_OPERATIONS = ["get", "find", "page", "add", "add_many", "update", "delete",
+                    "import_expenses", "allocate_ids", "put", "changes"]
+
+
+@app.before_request
+def start_request_timer():
+    metrics.check_worker(METRICS_DIR)
+    g.request_start = time.perf_counter()
+
+
+def count_streamed_bytes(chunks, endpoint):
+    """Pass a streamed body through, adding its size to the byte counter at the end."""
+    size = 0
+    try:
+        for chunk in chunks:
+            size += len(chunk)
+            yield chunk
+    finally:
+        metrics.inc('http_response_bytes_total', size, endpoint=endpoint)
+
+
+@app.after_request
+def record_request_metrics(response):
+    start = g.pop('request_start', None)
+    if start is None:
+        return response
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    metrics.observe('http_request_duration_seconds', time.perf_counter() - start, endpoint=endpoint)
+    metrics.inc('http_requests_total', endpoint=endpoint, method=request.method, status=str(response.status_code))
+    metrics.inc('http_request_bytes_total', request.content_length or 0, endpoint=endpoint)
+    if response.content_length is not None:
+        metrics.inc('http_response_bytes_total', response.content_length, endpoint=endpoint)
+    elif response.is_streamed:
+        response.response = count_streamed_bytes(response.response, endpoint)
+    metrics.inc('worker_requests_total', worker=metrics.worker_label())
+    return response
+
+
+@app.after_request
+def compress(response):
+    """gzip/brotli-encode compressible responses the client accepts.
+
+    Registered after record_request_metrics, so it runs first and the
+    metrics count the bytes actually sent.
+    """
+    return compress_response(response, request.accept_encodings, request.if_none_match)
+
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Prometheus scrape endpoint, summed over all workers when METRICS_DIR is set."""
+    return Response(metrics.render(*metrics.collect(METRICS_DIR)),
+                    mimetype='text/plain; version=0.0.4')
+
+
+# Compiled index template and the last rendered page, one per worker.
+# The page only varies with the current date, so it is rendered at most once a day.
+_index_template = None
+_index_cache = {}
+
+
+def get_index_template():
+    """Compile HTML_TEMPLATE once per worker and reuse it."""
+    global _index_template
+    if _index_template is None:
+        _index_template = app.jinja_env.from_string(HTML_TEMPLATE)
+    return _index_template
+
+
+def render_index(current_date):
+    """Return the rendered index page for a date, cached until the date changes.
+
+    The result is a PrecompressedBody, so each worker compresses the page
+    at most once per encoding.
+    """
+    body = _index_cache.get(current_date)
+    if body is None:
+        with metrics.timer('template_render_seconds', template='index'):
+            html = get_index_template().render(default_categories=DEFAULT_CATEGORIES,
+                                               default_payment_methods=DEFAULT_PAYMENT_METHODS,
+                                               current_date=current_date,
+                                               server_sync=SERVER_SYNC,
+                                               **ASSET_URLS)
+        body = PrecompressedBody(html.encode('utf-8'))
+        # Only today's page is ever served again, so drop older dates.
+        _index_cache.clear()
+        _index_cache[current_date] = body
+    return body
+
+
 @app.route('/')
 def index():
     """Main page - serves the app interface. Data handled by JavaScript."""
     current_date = datetime.now().strftime('%Y-%m-%d')
-    return render_template_string(HTML_TEMPLATE, 
-                                default_categories=DEFAULT_CATEGORIES,
-                                default_payment_methods=DEFAULT_PAYMENT_METHODS,
-                                current_date=current_date)
+    encoding = negotiate(request.accept_encodings)
+    # The ETag is derived from the template, the date and the encoding, so a
+    # matching conditional GET is answered with 304 before anything is rendered.
+    etag = f'{TEMPLATE_VERSION}-{current_date}' + (f'-{encoding}' if encoding else '')
+    if etag in request.if_none_match:
+        response = make_response('', 304)
+    else:
+        response = make_response(render_index(current_date).get(encoding))
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+    response.set_etag(etag)
+    response.vary.add('Accept-Encoding')
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+# Synthetic demo data (/api/load-demo?n=...)
+MAX_DEMO_ROWS = 5_000_000
+DEMO_CACHE_DIR = os.environ.get('DEMO_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'expense-tracker-demo'))
+DEMO_CHUNK_ROWS = 1000
+# Only requests of up to DEMO_CACHE_ROWS rows (about 200 bytes each) with
+# a seed below DEMO_CACHE_SEEDS are cached; the rest are generated on the
+# fly. Files from earlier days are deleted, then the least recently used
+# ones until the cache is within DEMO_CACHE_BYTES.
+DEMO_CACHE_ROWS = 500_000
+DEMO_CACHE_SEEDS = 16
+DEMO_CACHE_BYTES = int(os.environ.get('DEMO_CACHE_BYTES', 256 * 1024 * 1024))
+# A partial file not written to for this many seconds was left by a
+# worker that died mid-write, and is deleted
+DEMO_TMP_MAX_AGE = 3600
+
+
+def generate_demo_chunks(n, seed, days, fmt):
+    """Yield synthetic expenses as NDJSON lines or a JSON array, DEMO_CHUNK_ROWS at a time."""
+    lines = []
+    first = True
+    if fmt == 'json':
+        yield b'['
+    for expense in generate_expenses(n, seed=seed, days=days):
+        encoded = json.dumps(expense)
+        if fmt == 'json':
+            encoded = encoded if first else ',' + encoded
+            first = False
+        else:
+            encoded += '\n'
+        lines.append(encoded)
+        if len(lines) == DEMO_CHUNK_ROWS:
+            yield ''.join(lines).encode('utf-8')
+            lines = []
+    if lines:
+        yield ''.join(lines).encode('utf-8')
+    if fmt == 'json':
+        yield b']'
+
+
+def cached_demo_chunks(path, chunks):
+    """Pass chunks through while saving them to path, published only once complete."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    complete = False
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+                yield chunk
+        os.replace(tmp_path, path)
+        complete = True
+    finally:
+        # Also when the client went away (GeneratorExit) or the write failed
+        if not complete:
+            try:
+                os.unlink(tmp_path)
+            except FileNotFoundError:
+                pass
+    prune_demo_cache(path)
+
+
+def prune_demo_cache(keep=None):
+    """Delete cached demo files from earlier days, then the least recently used beyond DEMO_CACHE_BYTES.
+
+    Partial files are left alone unless stale (DEMO_TMP_MAX_AGE).
+    """
+    today = datetime.now().strftime('%Y-%m-%d')
+    current, total = [], 0
+    try:
+        entries = list(os.scandir(DEMO_CACHE_DIR))
+    except FileNotFoundError:
+        return
+    for entry in entries:
+        name, ext = os.path.splitext(entry.name)
+        try:
+            if ext == '.tmp':
+                if entry.stat().st_mtime < time.time() - DEMO_TMP_MAX_AGE:
+                    os.unlink(entry.path)
+                continue
+            if not name.endswith(today):
+                os.unlink(entry.path)
+                continue
+            stat = entry.stat()
+        except FileNotFoundError:
+            continue  # pruned by another worker
+        current.append((stat.st_mtime, stat.st_size, entry.path))
+        total += stat.st_size
+    for _, size, path in sorted(current):
+        if total <= DEMO_CACHE_BYTES:
+            break
+        if path != keep:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+def synthetic_demo_response(args):
+    """Stream n deterministic synthetic expenses, cached on disk per (n, seed, days, day) if small enough."""
+    try:
+        n = int(args['n'])
+        seed = int(args.get('seed', 0))
+        days = int(args.get('days', 365))
+    except ValueError:
+        return jsonify({"error": "n, seed and days must be integers"}), 400
+    fmt = args.get('format', 'ndjson')
+    if not 0 < n <= MAX_DEMO_ROWS or not 0 < days <= 36500 or fmt not in ('ndjson', 'json'):
+        return jsonify({"error": f"Need 0 < n <= {MAX_DEMO_ROWS}, 0 < days <= 36500 and format ndjson or json"}), 400
+    mimetype = 'application/x-ndjson' if fmt == 'ndjson' else 'application/json'
+    # Rows are dated relative to today, so the cache key includes it.
+    today = datetime.now().strftime('%Y-%m-%d')
+    chunks = generate_demo_chunks(n, seed, days, fmt)
+    if n > DEMO_CACHE_ROWS or not 0 <= seed < DEMO_CACHE_SEEDS:
+        return Response(chunks, mimetype=mimetype)
+    path = os.path.join(DEMO_CACHE_DIR, f'demo-{n}-{seed}-{days}-{today}.{fmt}')
+    try:
+        # Marks it recently used for prune_demo_cache
+        os.utime(path)
+    except FileNotFoundError:
+        return Response(cached_demo_chunks(path, chunks), mimetype=mimetype)
+    # The file is touched on every hit, so its mtime (send_file's default
+    # ETag) cannot tell versions apart; the name, with today's date, does.
+    return send_file(path, mimetype=mimetype, conditional=True, etag=os.path.basename(path))
+
+
+@app.route('/assets/<filename>')
+def static_asset(filename):
+    """Fingerprinted CSS/JS; the name changes with the content, so it is cached for a year."""
+    asset = STATIC_ASSETS.get(filename)
+    if asset is None:
+        return jsonify({"error": "Not found"}), 404
+    body, mimetype, digest = asset
+    encoding = negotiate(request.accept_encodings)
+    response = make_response(body.get(encoding))
+    response.mimetype = mimetype
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.set_etag(f'{digest}-{encoding}' if encoding else digest)
+    response.vary.add('Accept-Encoding')
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response.make_conditional(request)
 
 
 @app.route('/api/load-demo', methods=['GET'])
 def load_demo_data():
-    """API endpoint to load demo data for first-time users."""
+    """API endpoint to load demo data for first-time users.
+
+    With ?n= it instead streams n synthetic expenses spread over ?days=
+    (default 365) from ?seed= (default 0) as NDJSON, or as one JSON array
+    with ?format=json. The same parameters always give the same rows.
+    """
+    if request.args.get('n'):
+        return synthetic_demo_response(request.args)
     demo_expenses = [
         {"id": 1, "item": "Coffee", "amount": 120.00, "category": "Food & Dining", 
          "date": datetime.now().strftime('%Y-%m-%d'), "payment_method": "Cash", "notes": "Morning coffee"},
@@ -38,9 +317,529 @@ def load_demo_data():
     ]
     return jsonify(demo_expenses)
 
+
+# ============================================
+# EXPENSE REST API (server-side store)
+# ============================================
+# With EXPENSE_SHARDS_DIR set, each user (the X-User-Id header) has a
+# store of their own, opened on demand (see shards.py); otherwise there is
+# one store for everyone. The header is trusted as sent, with no
+# authentication: the page makes up a random id per browser, and anyone
+# presenting an id gets that user's data.
+USER_HEADER = 'X-User-Id'
+# The page only syncs with the server when each user has a store of their
+# own; with one store for everyone it keeps expenses in the browser alone.
+SERVER_SYNC = bool(os.environ.get('EXPENSE_SHARDS_DIR'))
+
+# False until get_shards() has looked at the configuration
+_shards = False
+_shard = None
+_shard_lock = threading.Lock()
+_query_cache = None
+
+
+def instrument_store(store):
+    return metrics.instrument(store, STORE_OPERATIONS)
+
+
+def get_query_cache():
+    """Cached responses of stats, list and report queries (see querycache.py), shared by all shards."""
+    global _query_cache
+    if _query_cache is None:
+        _query_cache = QueryCache()
+    return _query_cache
+
+
+def get_shards():
+    """The per-user ShardPool, or None when sharding is off."""
+    global _shards
+    if _shards is False:
+        _shards = open_shards(wrap=instrument_store, queries=get_query_cache())
+    return _shards
+
+
+def default_shard():
+    """The one store for everyone when sharding is off, opened on first use."""
+    global _shard
+    with _shard_lock:
+        if _shard is None:
+            _shard = Shard(instrument_store(open_store()), open_archives(), queries=get_query_cache(),
+                           budgets=open_budgets())
+        return _shard
+
+
+def current_shard(create=None):
+    """The expenses this request works on: its user's shard, or the one store.
+
+    A user's shard is only created by a request that may store something
+    (create, by default a POST); others see an empty one.
+    """
+    shard = g.get('shard')
+    if shard is None:
+        shards = get_shards()
+        if shards is None:
+            shard = default_shard()
+        else:
+            try:
+                if create is None:
+                    create = request.method == 'POST'
+                shard = shards.acquire(request.headers.get(USER_HEADER, ''), create)
+            except ValueError:
+                abort(make_response(jsonify({"error": f"A valid {USER_HEADER} header is required"}), 400))
+            g.pinned = True
+        g.shard = shard
+    return shard
+
+
+@app.teardown_request
+def release_shard(error=None):
+    if g.pop('pinned', False):
+        get_shards().release(g.pop('shard'))
+
+
+def keep_shard_open(response):
+    """Keep the request's shard open until its streamed response is closed."""
+    if g.get('pinned'):
+        shards, shard = get_shards(), g.shard
+        shards.pin(shard)
+        response.call_on_close(lambda: shards.release(shard))
+    return response
+
+
+def cached_query(query, scope, compute):
+    """JSON response to a read query, from the query cache unless a write in scope came since.
+
+    query is the normalized query as a tuple, scope the querycache.Scope of
+    expenses the result depends on and compute() builds the result.
+    """
+    shard = current_shard()
+    cache = shard.queries
+    if cache is None:
+        return jsonify(compute())
+    # Other workers' writes reach the cache, and invalidate it, through the store.
+    shard.store.refresh()
+    key = (shard.user_id,) + query
+    body = cache.get(key)
+    metrics.inc('query_cache_requests_total', endpoint=query[0], result='miss' if body is None else 'hit')
+    if body is not None:
+        return app.response_class(body, mimetype=app.json.mimetype)
+    generation = cache.generation(shard.user_id)
+    response = jsonify(compute())
+    body = response.get_data()
+    cache.put(key, body, len(body), scope, generation)
+    return response
+
+
+def get_store():
+    """The request's expense store (see storage.open_store)."""
+    return current_shard().store
+
+
+def get_archives():
+    """Closed-out years (see archive.py), picking up newly archived ones."""
+    archives = current_shard().archives
+    archives.refresh()
+    return archives
+
+
+def get_rollups():
+    """Dashboard rollups, built once and then kept current by the store."""
+    return current_shard().rollups()
+
+
+def get_budgets():
+    """Budget definitions (see budgets.py), picking up other workers' changes."""
+    budgets = current_shard().budgets
+    budgets.refresh()
+    return budgets
+
+
+def get_spending():
+    """Monthly spending per category for budgets, built once and then kept current by the store."""
+    return current_shard().spending()
+
+
+def get_analytics():
+    """Columnar analytics over the store, built on first use."""
+    return current_shard().analytics()
+
+
+def get_search():
+    """Full-text index over item and notes, built once and then kept current by the store."""
+    return current_shard().search()
+
+
+# Page sizes for /api/expenses
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+@app.route('/api/expenses', methods=['GET'])
+def list_expenses():
+    """List stored expenses newest first, one page at a time.
+
+    Filters: category, payment_method, from, to (inclusive dates). Pages are
+    keyed on (date, id), so following next_cursor costs the same on page 1000
+    as on page 1.
+    """
+    args = request.args
+    try:
+        limit = min(max(int(args.get('limit', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+        after = decode_cursor(args['cursor']) if args.get('cursor') else None
+    except ValueError:
+        return jsonify({"error": "Invalid limit or cursor"}), 400
+    category, payment_method = args.get('category') or None, args.get('payment_method') or None
+    date_from, date_to = args.get('from') or None, args.get('to') or None
+
+    def compute():
+        expenses, next_key = get_store().page(category=category, date_from=date_from, date_to=date_to,
+                                              payment_method=payment_method, limit=limit, after=after)
+        return {"expenses": expenses, "next_cursor": encode_cursor(next_key) if next_key else None}
+    # Expenses newer than the cursor cannot change this page.
+    newest = after[0] if after is not None and (date_to is None or after[0] < date_to) else date_to
+    return cached_query(("expenses", category, payment_method, date_from, date_to, limit, after),
+                        Scope(category, payment_method, date_from, newest), compute)
+
+
+@app.route('/api/expenses', methods=['POST'])
+def create_expense():
+    """Add an expense; validated like the addExpense form."""
+    try:
+        expense = get_store().add(request.get_json(silent=True))
+    except ValidationError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(expense), 201
+
+
+# Result limits for /api/search
+DEFAULT_SEARCH_RESULTS = 20
+MAX_SEARCH_RESULTS = 100
+
+
+@app.route('/api/search', methods=['GET'])
+def search_expenses():
+    """Expenses whose item or notes contain every word of ?q=, best match first.
+
+    Words may be partial ("netfl"). Combines with category, from and to.
+    """
+    args = request.args
+    query = args.get('q', '').strip()
+    if not query:
+        return jsonify({"error": "q is required"}), 400
+    try:
+        limit = min(max(int(args.get('limit', DEFAULT_SEARCH_RESULTS)), 1), MAX_SEARCH_RESULTS)
+    except ValueError:
+        return jsonify({"error": "Invalid limit"}), 400
+    matches = get_search().search(query, category=args.get('category') or None,
+                                  date_from=args.get('from') or None, date_to=args.get('to') or None,
+                                  limit=limit)
+    store = get_store()
+    results = []
+    for expense_id, score in matches:
+        expense = store.get(expense_id)
+        if expense is not None:
+            results.append({**expense, "score": score})
+    return jsonify({"query": query, "results": results})
+
+
+@app.route('/api/stats', methods=['GET'])
+def stats():
+    """Dashboard figures: totals and counts overall, per category, payment method and month.
+
+    With ?category= the response also carries the filtered total shown on
+    the Filtered Total card; ?group=day adds per-day totals. ?from= and
+    ?to= (inclusive dates) limit every figure to that window, answered
+    from prefix sums rather than by scanning.
+    """
+    args = request.args
+    date_from, date_to = args.get('from') or None, args.get('to') or None
+    groups = ["category", "payment_method", "month"]
+    if args.get('group') == 'day':
+        groups.append("day")
+    category = args.get('category') or None
+
+    def compute():
+        rollups = get_rollups()
+        result = rollups.to_dict(groups, date_from, date_to)
+        if category:
+            if date_from is None and date_to is None:
+                count, total = rollups.bucket("category", category)
+            else:
+                count, total = rollups.range_bucket("category", category, date_from, date_to)
+            result["filtered"] = {"category": category, "count": count, "total": total}
+        return result
+    # Every category is in the breakdown, so any write in the window counts.
+    return cached_query(("stats", category, date_from, date_to, len(groups)),
+                        Scope(date_from=date_from, date_to=date_to), compute)
+
+
+def date_param(args, name):
+    """Query parameter name as a YYYY-MM-DD date, None if absent; raises ValidationError otherwise."""
+    value = args.get(name) or None
+    if value is not None:
+        try:
+            valid = datetime.fromisoformat(value).date().isoformat() == value
+        except ValueError:
+            valid = False
+        if not valid:
+            raise ValidationError(f"{name} must be a date in YYYY-MM-DD format")
+    return value
+
+
+@app.route('/api/analytics', methods=['GET'])
+def analytics():
+    """Count, total and mean per category, payment_method or month (?group=).
+
+    Optional category, from and to narrow the rows first.
+    """
+    args = request.args
+    group = args.get('group', 'category')
+    if group not in ANALYTICS_GROUPS:
+        return jsonify({"error": f"group must be one of: {', '.join(ANALYTICS_GROUPS)}"}), 400
+    category = args.get('category') or None
+    try:
+        # The columns compare dates as numpy datetimes, not as strings.
+        date_from, date_to = (date_param(args, name) for name in ('from', 'to'))
+    except ValidationError as e:
+        return jsonify({"error": str(e)}), 400
+
+    def compute():
+        engine = get_analytics()
+        groups = engine.group_by(group, category=category, date_from=date_from, date_to=date_to)
+        return {"engine": engine.engine, "group": group, "groups": groups}
+    return cached_query(("analytics", group, category, date_from, date_to),
+                        Scope(category, None, date_from, date_to), compute)
+
+
+@app.route('/api/stats/check', methods=['GET'])
+def stats_check():
+    """Rebuild the rollups from the raw expenses and report any drift."""
+    differences = check_consistency(get_rollups(), current_shard().expenses())
+    return jsonify({"consistent": not differences, "differences": differences})
+
+
+# Largest id block a client may reserve in one call
+MAX_ID_BLOCK = 1_000_000
+
+
+@app.route('/api/ids', methods=['POST'])
+def allocate_ids():
+    """Reserve a block of consecutive expense ids (?count=, default 1) for bulk loads."""
+    try:
+        count = int(request.args.get('count', 1))
+    except ValueError:
+        count = 0
+    if not 1 <= count <= MAX_ID_BLOCK:
+        return jsonify({"error": f"count must be between 1 and {MAX_ID_BLOCK}"}), 400
+    ids = get_store().allocate_ids(count)
+    return jsonify({"start": ids.start, "count": count})
+
+
+# Column headings match the browser's exportToCSV()
+CSV_HEADER = ["ID", "Item", "Amount", "Category", "Date", "Payment Method", "Notes"]
+CSV_FIELDS = ["id", "item", "amount", "category", "date", "payment_method", "notes"]
+# Rows fetched from the store and written out per chunk
+EXPORT_BATCH_SIZE = 1000
+
+
+def generate_csv(expenses, batch_size=EXPORT_BATCH_SIZE):
+    """Yield CSV-encoded chunks of batch_size rows each."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_HEADER)
+    for n, expense in enumerate(expenses, 1):
+        writer.writerow([expense[field] for field in CSV_FIELDS])
+        if n % batch_size == 0:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+
+@app.route('/api/export.csv', methods=['GET'])
+def export_csv():
+    """Stream stored and archived expenses as CSV in constant memory, newest first.
+
+    Accepts the same category/payment_method/from/to filters as
+    /api/expenses. Compression is negotiated like every other response.
+    """
+    args = request.args
+    filters = {"category": args.get('category') or None, "date_from": args.get('from') or None,
+               "date_to": args.get('to') or None, "payment_method": args.get('payment_method') or None}
+    expenses = newest_first(get_store().iterate(**filters, batch_size=EXPORT_BATCH_SIZE),
+                            get_archives().iterate(**filters))
+    headers = {"Content-Disposition": f"attachment; filename=my-expenses-{datetime.now().strftime('%Y-%m-%d')}.csv"}
+    return keep_shard_open(Response(generate_csv(expenses), mimetype='text/csv', headers=headers))
+
+
+# Upload formats accepted by /api/import, by ?format= or Content-Type
+IMPORT_PARSERS = {
+    "csv": parse_csv,
+    "ndjson": parse_ndjson,
+}
+IMPORT_CONTENT_TYPES = {
+    "text/csv": "csv",
+    "application/x-ndjson": "ndjson",
+    "application/ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+}
+
+
+@app.route('/api/import', methods=['POST'])
+def import_expenses():
+    """Bulk-import expenses from a CSV or NDJSON upload.
+
+    The body is either the raw file (format from ?format= or Content-Type) or
+    a multipart form with a "file" field (format from ?format= or the file
+    extension). Rows are parsed as a stream, validated like the Add Expense
+    form and committed in batches; the response reports every failed row.
+    """
+    fmt = request.args.get('format')
+    if request.mimetype == 'multipart/form-data':
+        upload = request.files.get('file')
+        if upload is None:
+            return jsonify({"error": "Missing 'file' field"}), 400
+        fmt = fmt or upload.filename.rsplit('.', 1)[-1].lower().replace('jsonl', 'ndjson')
+        stream = upload.stream
+    else:
+        fmt = fmt or IMPORT_CONTENT_TYPES.get(request.mimetype)
+        stream = request.stream
+    parser = IMPORT_PARSERS.get(fmt)
+    if parser is None:
+        return jsonify({"error": "Unsupported format; send CSV or NDJSON"}), 415
+    try:
+        report = import_rows(get_store(), parser(stream))
+    except (UnicodeDecodeError, csv.Error) as e:
+        return jsonify({"error": f"Could not read upload: {e}"}), 400
+    return jsonify(report.to_dict())
+
+
+@app.route('/api/expenses/<int:expense_id>', methods=['GET'])
+def get_expense(expense_id):
+    expense = get_store().get(expense_id)
+    if expense is None:
+        return jsonify({"error": "Expense not found"}), 404
+    return jsonify(expense)
+
+
+@app.route('/api/expenses/<int:expense_id>', methods=['PUT'])
+def update_expense(expense_id):
+    """Edit an expense. Fields left out of the body keep their current values."""
+    try:
+        expense = get_store().update(expense_id, request.get_json(silent=True))
+    except ArchivedError as e:
+        return jsonify({"error": str(e)}), 409
+    except ValidationError as e:
+        return jsonify({"error": str(e)}), 400
+    if expense is None:
+        return jsonify({"error": "Expense not found"}), 404
+    return jsonify(expense)
+
+
+@app.route('/api/expenses/<int:expense_id>', methods=['DELETE'])
+def delete_expense(expense_id):
+    try:
+        deleted = get_store().delete(expense_id)
+    except ArchivedError as e:
+        return jsonify({"error": str(e)}), 409
+    if not deleted:
+        return jsonify({"error": "Expense not found"}), 404
+    return '', 204
+
+
+@app.route('/api/sync', methods=['POST'])
+def sync_expenses():
+    """Exchange changes with a device: {"since": version, "changes": [...]}.
+
+    The device sends what it changed since it last synced (expenses, or
+    {"id", "deleted": true, "updated_at"} for deletes) and gets back only
+    the server's changes after `since`; see sync.sync() for the response.
+    """
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        return jsonify({"error": "Body must be a JSON object"}), 400
+    since, changes = body.get('since', 0), body.get('changes', [])
+    if not isinstance(since, int) or isinstance(since, bool) or since < 0 or not isinstance(changes, list):
+        return jsonify({"error": "since must be a version number and changes a list"}), 400
+    if len(changes) > MAX_PUSH:
+        return jsonify({"error": f"At most {MAX_PUSH} changes per request"}), 413
+    try:
+        limit = min(max(int(request.args.get('limit', SYNC_PAGE_SIZE)), 1), SYNC_PAGE_SIZE)
+    except ValueError:
+        return jsonify({"error": "Invalid limit"}), 400
+    # A first sync with nothing to send only reads.
+    return jsonify(sync(current_shard(create=bool(changes)).store, since, changes, limit))
+
+
+def budget_month(args):
+    """?month=YYYY-MM, by default the current month; raises ValueError if malformed."""
+    month = args.get('month') or datetime.now().strftime('%Y-%m')
+    if len(month) != 7:
+        raise ValueError(month)
+    datetime.strptime(month, '%Y-%m')
+    return month
+
+
+@app.route('/api/budgets', methods=['GET'])
+def list_budgets():
+    """Every budget with its spending, remaining amount and highest threshold reached in ?month=."""
+    try:
+        month = budget_month(request.args)
+    except ValueError:
+        return jsonify({"error": "month must be in YYYY-MM format"}), 400
+    spending = get_spending()
+    return jsonify({"month": month,
+                    "budgets": [budget_status(budget, spending, month) for budget in get_budgets().all()]})
+
+
+@app.route('/api/budgets', methods=['POST'])
+def create_budget():
+    """Add a monthly budget: {"category": name or null for all spending, "amount", "thresholds"}."""
+    try:
+        budget = get_budgets().add(request.get_json(silent=True))
+    except ValidationError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(budget), 201
+
+
+@app.route('/api/budgets/<int:budget_id>', methods=['GET'])
+def get_budget(budget_id):
+    budget = get_budgets().get(budget_id)
+    if budget is None:
+        return jsonify({"error": "Budget not found"}), 404
+    return jsonify(budget)
+
+
+@app.route('/api/budgets/<int:budget_id>', methods=['PUT'])
+def update_budget(budget_id):
+    """Edit a budget. Fields left out of the body keep their current values."""
+    try:
+        budget = get_budgets().update(budget_id, request.get_json(silent=True))
+    except ValidationError as e:
+        return jsonify({"error": str(e)}), 400
+    if budget is None:
+        return jsonify({"error": "Budget not found"}), 404
+    return jsonify(budget)
+
+
+@app.route('/api/budgets/<int:budget_id>', methods=['DELETE'])
+def delete_budget(budget_id):
+    if not get_budgets().delete(budget_id):
+        return jsonify({"error": "Budget not found"}), 404
+    return '', 204
+
+
+@app.route('/api/alerts', methods=['GET'])
+def list_alerts():
+    """Budgets that reached one of their thresholds in ?month= ("Food & Dining at 90%"), most used first."""
+    try:
+        month = budget_month(request.args)
+    except ValueError:
+        return jsonify({"error": "month must be in YYYY-MM format"}), 400
+    return jsonify({"month": month, "alerts": budget_alerts(get_budgets().all(), get_spending(), month)})
+
 # CSS Styles
 CSS_STYLES = '''
-<style>
         * {
             box-sizing: border-box;
             margin: 0;
@@ -387,7 +1186,6 @@ CSS_STYLES = '''
                 justify-content: center;
             }
         }
-    </style>
 '''
 
 HTML_TEMPLATE = '''
@@ -396,13 +1194,17 @@ HTML_TEMPLATE = '''
 <head>
     <title>💰 Personal Expense Tracker</title>
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    ''' + CSS_STYLES + '''
+    <link rel="stylesheet" href="{{ css_url }}">
 </head>
-<body>
+<body data-sync="{{ 'on' if server_sync else 'off' }}">
     <div class="container">
         <div class="header">
             <h1>💰 Personal Expense Tracker</h1>
+            {% if server_sync %}
+            <p>Your data is stored in <strong>your own browser</strong> and synced to your account on the server.</p>
+            {% else %}
             <p>Your data is stored privately in <strong>your own browser</strong>.</p>
+            {% endif %}
             <div class="nav-links">
                 <button onclick="window.location.reload()" class="nav-btn">
                     <span>🔄</span> Refresh
@@ -442,7 +1244,7 @@ HTML_TEMPLATE = '''
                         </select>
                     </div>
                     <div class="form-group">
-                        <input type="date" id="dateInput" value="''' + datetime.now().strftime('%Y-%m-%d') + '''">
+                        <input type="date" id="dateInput" value="{{ current_date }}">
                     </div>
                     <div class="form-group">
                         <select id="paymentInput">
@@ -479,11 +1281,17 @@ HTML_TEMPLATE = '''
 
         <!-- Copyright -->
         <div class="copyright">
-            <p>© 2026 Bishnu Raj KC. All rights reserved. | Data stored locally in your browser.</p>
+            <p>© 2026 Bishnu Raj KC. All rights reserved. | Data stored {{ 'in your browser and on the server' if server_sync else 'locally in your browser' }}.</p>
         </div>
     </div>
 
-    <script>
+    <script src="{{ js_url }}"></script>
+</body>
+</html>
+'''
+
+# Application JavaScript, served as a fingerprinted static file
+APP_SCRIPT = '''
         // ============================================
         // CORE DATA MANAGEMENT (LocalStorage)
         // ============================================
@@ -504,6 +1312,157 @@ HTML_TEMPLATE = '''
             renderAll();
         }
 
+        // ============================================
+        // ID ALLOCATION
+        // ============================================
+        const NEXT_ID_KEY = 'personal_expense_tracker_next_id';
+
+        // Reserve `count` consecutive ids from a stored high-water mark and
+        // return the first one. O(1) per insert, and ids are never reused,
+        // even after the newest expense is deleted.
+        function allocateIds(count = 1) {
+            let nextId = parseInt(localStorage.getItem(NEXT_ID_KEY), 10);
+            if (isNaN(nextId)) {
+                // First run with this key: seed it once from existing data
+                // (a plain loop, since spreading a huge array into Math.max overflows the stack).
+                nextId = 1;
+                for (const e of getExpenses()) {
+                    if (e.id >= nextId) nextId = e.id + 1;
+                }
+            }
+            localStorage.setItem(NEXT_ID_KEY, String(nextId + count));
+            return nextId;
+        }
+
+        // ============================================
+        // USER IDENTITY (X-User-Id)
+        // ============================================
+        const USER_ID_KEY = 'personal_expense_tracker_user_id';
+
+        // A random id made once per browser; the server keeps a store per
+        // id and trusts it as is, so it is the only key to this data.
+        function getUserId() {
+            let userId = localStorage.getItem(USER_ID_KEY);
+            if (!userId) {
+                if (window.crypto && crypto.randomUUID) {
+                    userId = crypto.randomUUID();
+                } else {
+                    const bytes = crypto.getRandomValues(new Uint8Array(16));
+                    userId = Array.from(bytes, b => b.toString(16).padStart(2, '0')).join('');
+                }
+                localStorage.setItem(USER_ID_KEY, userId);
+            }
+            return userId;
+        }
+
+        // fetch() with this browser's user id on every request
+        function apiFetch(url, options = {}) {
+            const headers = { ...(options.headers || {}), 'X-User-Id': getUserId() };
+            return fetch(url, { ...options, headers });
+        }
+
+        // ============================================
+        // SYNC WITH THE SERVER (/api/sync)
+        // ============================================
+        // Only when the server keeps a store per user (the page says so);
+        // otherwise expenses never leave the browser.
+        const SERVER_SYNC = document.body.dataset.sync === 'on';
+        const SYNC_VERSION_KEY = 'personal_expense_tracker_sync_version';
+        const PENDING_KEY = 'personal_expense_tracker_pending';
+        let syncTimer = null;
+        let syncing = false;
+
+        // Local edits not yet sent to the server, by id; the newest one wins.
+        function getPending() {
+            try {
+                return JSON.parse(localStorage.getItem(PENDING_KEY)) || {};
+            } catch (e) {
+                return {};
+            }
+        }
+
+        function recordChanges(changes) {
+            if (!SERVER_SYNC) return;
+            const pending = getPending();
+            const now = new Date().toISOString();
+            changes.forEach(change => {
+                change.updated_at = now;
+                pending[change.id] = change;
+            });
+            localStorage.setItem(PENDING_KEY, JSON.stringify(pending));
+            scheduleSync();
+        }
+
+        function scheduleSync() {
+            clearTimeout(syncTimer);
+            syncTimer = setTimeout(syncWithServer, 1000);
+        }
+
+        // Send local changes and fetch only what changed on the server since
+        // the last sync. Offline or failed syncs keep the changes pending.
+        async function syncWithServer() {
+            if (!SERVER_SYNC) return;
+            if (syncing) return scheduleSync();
+            syncing = true;
+            try {
+                let sent = getPending();
+                let changes = Object.values(sent);
+                let hasMore = true;
+                while (hasMore) {
+                    const since = parseInt(localStorage.getItem(SYNC_VERSION_KEY), 10) || 0;
+                    const response = await apiFetch('/api/sync', {
+                        method: 'POST',
+                        headers: { 'Content-Type': 'application/json' },
+                        body: JSON.stringify({ since, changes })
+                    });
+                    if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
+                    const result = await response.json();
+                    result.rejected.forEach(r => console.warn('Sync rejected expense', r.id, r.error));
+
+                    // Drop what was sent, unless it was edited again meanwhile.
+                    const pending = getPending();
+                    for (const id in sent) {
+                        if (pending[id] && pending[id].updated_at === sent[id].updated_at) delete pending[id];
+                    }
+                    localStorage.setItem(PENDING_KEY, JSON.stringify(pending));
+
+                    applyServerChanges(result);
+                    localStorage.setItem(SYNC_VERSION_KEY, String(result.version));
+                    hasMore = result.has_more;
+                    sent = {};
+                    changes = [];
+                }
+            } catch (error) {
+                console.warn('Sync failed, will retry later:', error);
+            } finally {
+                syncing = false;
+            }
+        }
+
+        function applyServerChanges(result) {
+            const byId = new Map((result.reset ? [] : getExpenses()).map(e => [e.id, e]));
+            let maxId = 0;
+            for (const oldId in result.ids) byId.delete(Number(oldId));
+            result.changes.forEach(change => {
+                if (change.deleted) {
+                    byId.delete(change.id);
+                } else {
+                    byId.set(change.id, change);
+                }
+                if (change.id > maxId) maxId = change.id;
+            });
+            if (result.reset) {
+                // Keep local changes the server has not seen yet.
+                Object.values(getPending()).forEach(c => { if (!c.deleted) byId.set(c.id, c); });
+            }
+            // Never hand out an id the server already knows about.
+            const nextId = parseInt(localStorage.getItem(NEXT_ID_KEY), 10);
+            if (isNaN(nextId) || nextId <= maxId) localStorage.setItem(NEXT_ID_KEY, String(maxId + 1));
+            if (result.changes.length || result.reset || Object.keys(result.ids).length) {
+                saveExpenses(Array.from(byId.values()));
+            }
+        }
+
         // ============================================
         // CORE APP FUNCTIONS
         // ============================================
@@ -538,7 +1497,7 @@ HTML_TEMPLATE = '''
 
             // Get current expenses and generate new ID
             const expenses = getExpenses();
-            const newId = expenses.length > 0 ? Math.max(...expenses.map(e => e.id)) + 1 : 1;
+            const newId = allocateIds();
 
             // Create new expense object
             const newExpense = {
@@ -555,10 +1514,10 @@ HTML_TEMPLATE = '''
             // Add to expenses and save
             expenses.push(newExpense);
             saveExpenses(expenses);
+            recordChanges([{ ...newExpense }]);
 
-            // Reset form (keep date as today)
+            // Reset form (the date input's default value is today)
             event.target.reset();
-            document.getElementById('dateInput').value = "''' + datetime.now().strftime('%Y-%m-%d') + '''";
 
             // Focus back to first input
             document.getElementById('itemInput').focus();
@@ -590,6 +1549,7 @@ HTML_TEMPLATE = '''
             expense.amount = amountValue;
 
             saveExpenses(expenses);
+            recordChanges([{ ...expense }]);
         }
 
         function deleteExpense(id) {
@@ -599,6 +1559,7 @@ HTML_TEMPLATE = '''
             const filteredExpenses = expenses.filter(e => e.id !== id);
 
             saveExpenses(filteredExpenses);
+            recordChanges([{ id: id, deleted: true }]);
         }
 
         function filterExpenses() {
@@ -641,6 +1602,17 @@ HTML_TEMPLATE = '''
             document.getElementById('statsDashboard').innerHTML = statsHTML;
         }
 
+        // Rows are rendered a page at a time, newest first, so the table
+        // costs the same to draw whether there are 50 or 50,000 expenses.
+        const PAGE_SIZE = 50;
+        let tableRows = [];
+        let tableShown = 0;
+
+        function compareNewestFirst(a, b) {
+            if (a.date !== b.date) return a.date < b.date ? 1 : -1;
+            return b.id - a.id;
+        }
+
         function renderExpensesTable() {
             const expenses = getFilteredExpenses();
             const container = document.getElementById('expensesTable');
@@ -656,7 +1628,10 @@ HTML_TEMPLATE = '''
                 return;
             }
 
-            let tableHTML = `
+            tableRows = expenses.slice().sort(compareNewestFirst);
+            tableShown = 0;
+
+            container.innerHTML = `
                 <table>
                     <thead>
                         <tr>
@@ -669,28 +1644,39 @@ HTML_TEMPLATE = '''
                             <th>Actions</th>
                         </tr>
                     </thead>
-                    <tbody>
+                    <tbody id="expensesBody"></tbody>
+                </table>
+                <div id="loadMore"></div>
             `;
+            renderNextPage();
+        }
 
-            expenses.forEach(exp => {
-                tableHTML += `
-                    <tr>
-                        <td>${exp.date}</td>
-                        <td><strong>${exp.item}</strong></td>
-                        <td><span class="category-badge">${exp.category}</span></td>
-                        <td class="amount">Rs. ${exp.amount.toFixed(2)}</td>
-                        <td>${exp.payment_method}</td>
-                        <td>${exp.notes ? (exp.notes.length > 30 ? exp.notes.substring(0, 30) + '...' : exp.notes) : ''}</td>
-                        <td class="actions">
-                            <button onclick="editExpense(${exp.id})" class="btn-edit">Edit</button>
-                            <button onclick="deleteExpense(${exp.id})" class="btn-delete">Delete</button>
-                        </td>
-                    </tr>
-                `;
-            });
+        function renderExpenseRow(exp) {
+            return `
+                <tr>
+                    <td>${exp.date}</td>
+                    <td><strong>${exp.item}</strong></td>
+                    <td><span class="category-badge">${exp.category}</span></td>
+                    <td class="amount">Rs. ${exp.amount.toFixed(2)}</td>
+                    <td>${exp.payment_method}</td>
+                    <td>${exp.notes ? (exp.notes.length > 30 ? exp.notes.substring(0, 30) + '...' : exp.notes) : ''}</td>
+                    <td class="actions">
+                        <button onclick="editExpense(${exp.id})" class="btn-edit">Edit</button>
+                        <button onclick="deleteExpense(${exp.id})" class="btn-delete">Delete</button>
+                    </td>
+                </tr>
+            `;
+        }
+
+        function renderNextPage() {
+            const page = tableRows.slice(tableShown, tableShown + PAGE_SIZE);
+            document.getElementById('expensesBody').insertAdjacentHTML('beforeend', page.map(renderExpenseRow).join(''));
+            tableShown += page.length;
 
-            tableHTML += '</tbody></table>';
-            container.innerHTML = tableHTML;
+            const remaining = tableRows.length - tableShown;
+            document.getElementById('loadMore').innerHTML = remaining > 0
+                ? `<button onclick="renderNextPage()" class="btn-primary">Show more (${remaining} remaining)</button>`
+                : '';
         }
 
         function renderCategoryFilter() {
@@ -731,7 +1717,7 @@ HTML_TEMPLATE = '''
 
             try {
                 console.log("Fetching demo data...");
-                const response = await fetch('/api/load-demo');
+                const response = await apiFetch('/api/load-demo');
 
                 if (!response.ok) {
                     throw new Error(`HTTP error! status: ${response.status}`);
@@ -743,23 +1729,22 @@ HTML_TEMPLATE = '''
                 const currentExpenses = getExpenses();
                 console.log("Current expenses:", currentExpenses);
 
-                // Calculate next available ID
-                const maxId = currentExpenses.length > 0 
-                    ? Math.max(...currentExpenses.map(e => e.id)) 
-                    : 0;
-
-                console.log("Max ID:", maxId);
+                // Reserve one block of IDs for all demo expenses
+                const firstId = allocateIds(demoExpenses.length);
 
                 // Update IDs for demo expenses
                 demoExpenses.forEach((exp, index) => {
-                    exp.id = maxId + index + 1;
+                    exp.id = firstId + index;
                 });
 
                 console.log("Updated demo expenses:", demoExpenses);
 
                 // Combine and save
+                const createdAt = new Date().toISOString();
+                demoExpenses.forEach(exp => { exp.created_at = exp.created_at || createdAt; });
                 const allExpenses = [...currentExpenses, ...demoExpenses];
                 saveExpenses(allExpenses);
+                recordChanges(demoExpenses.map(exp => ({ ...exp })));
 
                 alert(`Demo data loaded successfully! Added ${demoExpenses.length} items.`);
 
@@ -768,9 +1753,7 @@ HTML_TEMPLATE = '''
 
                 // Fallback data
                 const currentExpenses = getExpenses();
-                const nextId = currentExpenses.length > 0 
-                    ? Math.max(...currentExpenses.map(e => e.id)) + 1 
-                    : 1;
+                const nextId = allocateIds(3);
 
                 const fallbackDemo = [
                     {
@@ -802,13 +1785,21 @@ HTML_TEMPLATE = '''
                     }
                 ];
 
+                const createdAt = new Date().toISOString();
+                fallbackDemo.forEach(exp => { exp.created_at = createdAt; });
                 const allExpenses = [...currentExpenses, ...fallbackDemo];
                 saveExpenses(allExpenses);
+                recordChanges(fallbackDemo.map(exp => ({ ...exp })));
 
                 alert('Demo data loaded (using fallback)!');
             }
         }
 
+        function csvField(value) {
+            const text = value === undefined || value === null ? '' : String(value);
+            return /[",\\r\\n]/.test(text) ? `"${text.replace(/"/g, '""')}"` : text;
+        }
+
         function exportToCSV() {
             const expenses = getExpenses();
             if (expenses.length === 0) {
@@ -816,13 +1807,14 @@ HTML_TEMPLATE = '''
                 return;
             }
 
-            let csv = 'ID,Item,Amount,Category,Date,Payment Method,Notes\\n';
+            // One Blob part per row instead of one ever-growing string
+            const parts = ['ID,Item,Amount,Category,Date,Payment Method,Notes\\n'];
             expenses.forEach(exp => {
-                const escapedNotes = exp.notes ? exp.notes.replace(/"/g, '""') : '';
-                csv += `${exp.id},${exp.item},${exp.amount},${exp.category},${exp.date},${exp.payment_method},"${escapedNotes}"\\n`;
+                parts.push([exp.id, exp.item, exp.amount, exp.category, exp.date, exp.payment_method, exp.notes]
+                    .map(csvField).join(',') + '\\n');
             });
 
-            const blob = new Blob([csv], { type: 'text/csv' });
+            const blob = new Blob(parts, { type: 'text/csv' });
             const url = URL.createObjectURL(blob);
             const a = document.createElement('a');
             a.href = url;
@@ -835,6 +1827,8 @@ HTML_TEMPLATE = '''
 
         function clearAllData() {
             if (confirm('⚠️ WARNING: This will permanently delete ALL your expense data. Continue?')) {
+                // Deleted on every synced device of this user, not just this one.
+                recordChanges(getExpenses().map(e => ({ id: e.id, deleted: true })));
                 localStorage.removeItem(STORAGE_KEY);
                 alert('All data cleared!');
                 renderAll();
@@ -847,17 +1841,19 @@ HTML_TEMPLATE = '''
         document.addEventListener('DOMContentLoaded', () => {
             console.log("App initialized");
 
-            // Check if first time user
-            const expenses = getExpenses();
-            console.log("Initial expenses:", expenses);
-
-            if (expenses.length === 0) {
-                setTimeout(() => {
-                    if (confirm('👋 Welcome! Would you like to load some demo expenses to see how the app works?')) {
-                        loadDemoData();
-                    }
-                }, 500);
-            }
+            // Pull changes made on other devices, then check if first time user
+            syncWithServer().then(() => {
+                const expenses = getExpenses();
+                console.log("Initial expenses:", expenses);
+
+                if (expenses.length === 0) {
+                    setTimeout(() => {
+                        if (confirm('👋 Welcome! Would you like to load some demo expenses to see how the app works?')) {
+                            loadDemoData();
+                        }
+                    }, 500);
+                }
+            });
 
             // Initial render
             renderAll();
@@ -870,17 +1866,163 @@ HTML_TEMPLATE = '''
             // Focus on item input
             document.getElementById('itemInput').focus();
         });
-    </script>
-</body>
-</html>
 '''
 
+# ============================================
+# FINGERPRINTED STATIC ASSETS
+# ============================================
+# CSS_STYLES and APP_SCRIPT are served as separate files whose names carry a
+# hash of their content, so browsers can cache them forever and only the
+# small HTML shell is fetched on repeat visits.
+STATIC_ASSETS = {}
+ASSET_URLS = {}
+
+
+def build_static_assets():
+    """Fingerprint CSS_STYLES and APP_SCRIPT into STATIC_ASSETS; run once at startup."""
+    for key, content, extension, mimetype in (('css_url', CSS_STYLES, 'css', 'text/css'),
+                                              ('js_url', APP_SCRIPT, 'js', 'application/javascript')):
+        body = content.strip().encode('utf-8') + b'\n'
+        digest = hashlib.sha256(body).hexdigest()[:12]
+        filename = f'app.{digest}.{extension}'
+        STATIC_ASSETS[filename] = (PrecompressedBody(body), f'{mimetype}; charset=utf-8', digest)
+        ASSET_URLS[key] = f'/assets/{filename}'
+
+
+build_static_assets()
+
+# Changes whenever the HTML shell, any asset it references or whether it syncs changes
+TEMPLATE_VERSION = hashlib.sha256((HTML_TEMPLATE + ''.join(ASSET_URLS.values()) + str(SERVER_SYNC))
+                                  .encode('utf-8')).hexdigest()[:16]
+
+# ============================================
+# STARTUP AND READINESS
+# ============================================
+# Autoscale instances start from zero often, so what a worker would
+# otherwise build during its first requests is built ahead of them:
+# warm_up() the state all workers can share, run by the gunicorn master
+# before it forks them (gunicorn.conf.py), and warm_data() each worker's
+# own store and rollups, in a background thread started once the worker
+# has sent its first response: loading holds the GIL, so started any
+# earlier it would hold up that first page, and the browser only asks for
+# data after loading the page and its script. Stores are not opened in
+# the master: their files and locks are per process, and a store reloads
+# itself after a fork anyway. /ready answers 503 until a worker has done
+# both, and starts warming a worker that has not.
+# Seconds taken by each warm-up step, reported by /ready
+STARTUP_TIMINGS = {}
+_warm_up_lock = threading.Lock()
+_warmed_up = False
+# Set in each gunicorn worker: warm up after the first response
+_warm_after_first_response = False
+# Process that started warming in the background (threads do not survive a fork)
+_warming_pid = None
+_data_ready = threading.Event()
+_warm_error = None
+
+
+@contextmanager
+def startup_step(name):
+    start = time.perf_counter()
+    yield
+    STARTUP_TIMINGS[name] = round(time.perf_counter() - start, 4)
+
+
+def warm_up():
+    """Build what every worker shares and needs for its first page: today's page, compressed."""
+    global _warmed_up
+    with _warm_up_lock:
+        if _warmed_up:
+            return
+        with startup_step('index_page'):
+            page = render_index(datetime.now().strftime('%Y-%m-%d'))
+            for encoding in supported_encodings():
+                page.get(encoding)
+        with startup_step('demo_cache'):
+            # Files a server that was killed mid-write left behind
+            prune_demo_cache()
+        _warmed_up = True
+
+
+def warm_data():
+    """Open this worker's store and build its rollups, then import NumPy and compress the assets.
+
+    With sharding, stores are opened per user as requests come instead.
+    """
+    if get_shards() is None:
+        with startup_step('store'):
+            shard = default_shard()
+        with startup_step('rollups'):
+            shard.rollups()
+    with startup_step('numpy'):
+        load_numpy()
+    # Browsers fetch the assets along with the first page, so this mostly
+    # helps workers warmed by /ready before any.
+    with startup_step('static_assets'):
+        for body, mimetype, digest in STATIC_ASSETS.values():
+            for encoding in supported_encodings():
+                body.get(encoding)
+
+
+def _warm():
+    global _warm_error, _warming_pid
+    try:
+        warm_up()
+        warm_data()
+    except Exception as exc:
+        _warm_error = f'{type(exc).__name__}: {exc}'
+        app.logger.exception('Warm-up failed')
+        # Let the next response or /ready try again rather than stay unready.
+        with _warm_up_lock:
+            _warming_pid = None
+    else:
+        _warm_error = None
+        _data_ready.set()
+
+
+def start_warming():
+    """Warm up in a background thread, once per process."""
+    global _warming_pid
+    with _warm_up_lock:
+        if _warming_pid == os.getpid():
+            return
+        _warming_pid = os.getpid()
+    threading.Thread(target=_warm, name='warm-up', daemon=True).start()
+
+
+def warm_after_first_response():
+    """Have this process start warming up once its first response is sent; gunicorn calls it in each new worker."""
+    global _warm_after_first_response
+    _warm_after_first_response = True
+
+
+@app.after_request
+def warm_once_sent(response):
+    if _warm_after_first_response and _warming_pid != os.getpid():
+        # Run by the server after the body is written
+        response.call_on_close(start_warming)
+    return response
+
+
+@app.route('/ready')
+def ready():
+    """Readiness probe: 200 once this worker has warmed up, 503 (and warming it up) before."""
+    start_warming()
+    is_ready = _data_ready.is_set()
+    body = {"ready": is_ready, "pid": os.getpid(), "startup": STARTUP_TIMINGS}
+    if _warm_error is not None:
+        body["error"] = _warm_error
+    return jsonify(body), 200 if is_ready else 503
+
 if __name__ == '__main__':
     print('=' * 60)
     print('💰 PERSONAL EXPENSE TRACKER (Browser-Based)')
     print('=' * 60)
     print('🌐 Each user gets their own private data in their browser.')
-    print('💾 No data is stored on the server.')
+    if SERVER_SYNC:
+        print(f'💾 Synced to a store per user in {os.environ["EXPENSE_SHARDS_DIR"]}.')
+    else:
+        print('💾 The page keeps data in the browser only; nothing is synced to the server.')
     print('📱 Fully mobile-compatible design.')
     print('🚀 Open the webview to start using the app!')
     print('© 2026 Bishnu Raj KC. All rights reserved.')
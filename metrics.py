@@ -0,0 +1,259 @@
+# metrics.py - Request timing and counters in Prometheus text format
+#
+# Every thread records into its own shard, so the hot path takes no locks;
+# shards are only summed when /metrics is scraped. Under gunicorn each
+# worker also publishes its totals to METRICS_DIR (when set) so any worker
+# can answer a scrape for the whole server.
+import bisect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Histogram bucket upper bounds, in seconds
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Seconds between a worker's publications to METRICS_DIR
+FLUSH_INTERVAL = 1.0
+
+# name -> (type, help)
+METRICS = {
+    "http_requests_total": ("counter", "HTTP requests by endpoint, method and status"),
+    "http_request_duration_seconds": ("histogram", "Time spent in the request handler"),
+    "http_request_bytes_total": ("counter", "Request body bytes received"),
+    "http_response_bytes_total": ("counter", "Response body bytes sent"),
+    "template_render_seconds": ("histogram", "Time spent rendering templates"),
+    "storage_operation_seconds": ("histogram", "Time spent in expense store operations"),
+    "query_cache_requests_total": ("counter", "Query cache lookups by endpoint and result (hit or miss)"),
+    "worker_requests_total": ("counter", "Requests handled per worker process"),
+    "worker_start_time_seconds": ("gauge", "Unix time each worker process started"),
+}
+
+
+class _Shard:
+    """One thread's metrics; only that thread ever writes to it."""
+
+    def __init__(self):
+        self.counters = {}
+        # key -> [count per bucket..., +Inf count, sum]
+        self.histograms = {}
+
+
+_local = threading.local()
+_shards = []
+_shards_lock = threading.Lock()
+_pid = os.getpid()
+_started = False
+
+
+def _shard():
+    shard = getattr(_local, 'shard', None)
+    if shard is None:
+        shard = _local.shard = _Shard()
+        with _shards_lock:
+            _shards.append(shard)
+    return shard
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def inc(name, value=1, **labels):
+    """Add value to a counter."""
+    counters = _shard().counters
+    key = _key(name, labels)
+    counters[key] = counters.get(key, 0) + value
+
+
+def observe(name, seconds, **labels):
+    """Record one observation in a histogram."""
+    histograms = _shard().histograms
+    key = _key(name, labels)
+    values = histograms.get(key)
+    if values is None:
+        values = histograms[key] = [0] * (len(BUCKETS) + 2)
+    # Index len(BUCKETS) is the +Inf bucket.
+    values[bisect.bisect_left(BUCKETS, seconds)] += 1
+    values[-1] += seconds
+
+
+@contextmanager
+def timer(name, **labels):
+    """Observe the duration of a with-block in a histogram."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, **labels)
+
+
+def instrument(obj, methods, name="storage_operation_seconds"):
+    """Time the given methods of obj in a histogram labelled op=<method>."""
+    for method in methods:
+        original = getattr(obj, method)
+
+        def timed(*args, _original=original, _op=method, **kwargs):
+            start = time.perf_counter()
+            try:
+                return _original(*args, **kwargs)
+            finally:
+                observe(name, time.perf_counter() - start, op=_op)
+
+        setattr(obj, method, timed)
+    return obj
+
+
+def check_worker(directory=None):
+    """Call at the start of each request; sets up metrics in a new worker.
+
+    After a fork the child starts with copies of the parent's shards, which
+    would otherwise be counted twice, so they are dropped. With a directory,
+    a daemon thread publishes this worker's totals there every FLUSH_INTERVAL.
+    """
+    global _pid, _local, _shards, _started
+    if _started and _pid == os.getpid():
+        return
+    _pid = os.getpid()
+    _local = threading.local()
+    _shards = []
+    _started = True
+    counters = _shard().counters
+    counters[_key("worker_start_time_seconds", {"worker": str(_pid)})] = time.time()
+    if directory:
+        threading.Thread(target=_flush_forever, args=(directory, _pid), daemon=True).start()
+
+
+def _flush_forever(directory, pid):
+    while pid == os.getpid():
+        time.sleep(FLUSH_INTERVAL)
+        try:
+            flush(directory)
+        except OSError:
+            pass
+
+
+def worker_label():
+    return str(_pid)
+
+
+# ----------------------------------------------------------------------
+# Aggregation across threads and workers
+# ----------------------------------------------------------------------
+def snapshot():
+    """This process's metrics summed over all thread shards."""
+    counters, histograms = {}, {}
+    with _shards_lock:
+        shards = list(_shards)
+    for shard in shards:
+        for key, value in list(shard.counters.items()):
+            counters[key] = counters.get(key, 0) + value
+        for key, values in list(shard.histograms.items()):
+            total = histograms.get(key)
+            histograms[key] = list(values) if total is None else [a + b for a, b in zip(total, values)]
+    return counters, histograms
+
+
+def _dump(counters, histograms):
+    return {"counters": [[name, labels, value] for (name, labels), value in counters.items()],
+            "histograms": [[name, labels, values] for (name, labels), values in histograms.items()]}
+
+
+def _merge(into, data):
+    counters, histograms = into
+    for name, labels, value in data["counters"]:
+        key = (name, tuple(map(tuple, labels)))
+        counters[key] = counters.get(key, 0) + value
+    for name, labels, values in data["histograms"]:
+        key = (name, tuple(map(tuple, labels)))
+        total = histograms.get(key)
+        histograms[key] = list(values) if total is None else [a + b for a, b in zip(total, values)]
+
+
+def flush(directory):
+    """Publish this worker's totals to directory/worker-<pid>.json."""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'worker-{os.getpid()}.json')
+    # Per-thread temp name: the flusher thread and a scrape may both be writing.
+    tmp_path = f'{path}.{threading.get_ident()}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(_dump(*snapshot()), f)
+    os.replace(tmp_path, path)
+
+
+def pid_alive(pid):
+    """Whether a process with this pid is running on this machine."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _remove(path):
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+
+def collect(directory=None):
+    """Metrics for the whole server: every worker file in directory, or just this process."""
+    if not directory:
+        return snapshot()
+    flush(directory)
+    merged = ({}, {})
+    for filename in os.listdir(directory):
+        if filename.startswith('worker-') and filename.endswith('.json'):
+            if not pid_alive(int(filename[len('worker-'):-len('.json')])):
+                # Left behind by an exited worker (or an earlier server run).
+                # Prometheus treats the drop in totals as a counter reset.
+                _remove(os.path.join(directory, filename))
+                continue
+            try:
+                with open(os.path.join(directory, filename), encoding='utf-8') as f:
+                    _merge(merged, json.load(f))
+            except (OSError, ValueError):
+                # A worker is replacing its file right now; it is picked up next scrape.
+                continue
+    return merged
+
+
+# ----------------------------------------------------------------------
+# Prometheus text exposition
+# ----------------------------------------------------------------------
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(pairs, extra=()):
+    pairs = list(pairs) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}'
+
+
+def render(counters, histograms):
+    """Prometheus text format (version 0.0.4) for the given metrics."""
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        if kind == 'histogram':
+            for (metric, labels), values in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(BUCKETS + ('+Inf',), values):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{_labels(labels, [("le", bound)])} {cumulative}')
+                lines.append(f'{name}_sum{_labels(labels)} {values[-1]}')
+                lines.append(f'{name}_count{_labels(labels)} {cumulative}')
+        else:
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f'{name}{_labels(labels)} {value}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,175 @@
+# querycache.py - Cached responses of read queries, invalidated by writes
+#
+# The dashboard asks for the same stats, filtered lists and reports over
+# and over while the data changes far less often. Responses are kept
+# under their normalized query, together with the slice of the data they
+# depend on: a user, optionally a category and payment method, and a date
+# range. A write drops only the entries whose slice contains the old or
+# the new version of the expense it changed, so editing a Food expense in
+# March leaves cached February and Transport figures in place.
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Bytes of cached bodies (plus ENTRY_OVERHEAD each) kept per process
+QUERY_CACHE_BYTES = int(os.environ.get('QUERY_CACHE_BYTES', 32 * 2**20))
+# Seconds an entry is served at most, as a backstop for changes the
+# cache was not told about
+QUERY_CACHE_TTL = float(os.environ.get('QUERY_CACHE_TTL', 300))
+# Rough per-entry cost of the key, scope and bookkeeping
+ENTRY_OVERHEAD = 512
+
+
+class Scope:
+    """The expenses a cached result depends on; None means any."""
+
+    __slots__ = ("category", "payment_method", "date_from", "date_to")
+
+    def __init__(self, category=None, payment_method=None, date_from=None, date_to=None):
+        self.category = category
+        self.payment_method = payment_method
+        self.date_from = date_from
+        self.date_to = date_to
+
+    def covers(self, expense):
+        return ((self.category is None or expense['category'] == self.category)
+                and (self.payment_method is None or expense['payment_method'] == self.payment_method)
+                and (self.date_from is None or expense['date'] >= self.date_from)
+                and (self.date_to is None or expense['date'] <= self.date_to))
+
+
+class _Entry:
+    __slots__ = ("user", "value", "size", "scope", "expires")
+
+    def __init__(self, user, value, size, scope, expires):
+        self.user = user
+        self.value = value
+        self.size = size
+        self.scope = scope
+        self.expires = expires
+
+
+class _Invalidator:
+    """Store listener dropping one user's entries that a change touches."""
+
+    def __init__(self, cache, user):
+        self.cache = cache
+        self.user = user
+
+    def apply(self, old, new):
+        self.cache.invalidate(self.user, old, new)
+
+
+class QueryCache:
+    """LRU of query results with a TTL and a cap on the bytes they take.
+
+    Keys are tuples starting with the user (None without sharding)
+    followed by the normalized query. attach() subscribes the cache to a
+    user's store, so writes invalidate what they affect.
+    """
+
+    def __init__(self, max_bytes=QUERY_CACHE_BYTES, ttl=QUERY_CACHE_TTL, clock=time.monotonic):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.clock = clock
+        self.size = 0
+        self._entries = OrderedDict()
+        # user -> category (None: any) -> keys, so a write only looks at
+        # the entries that could contain it
+        self._index = {}
+        # user -> count of writes seen, so a result computed while one
+        # happened is not cached
+        self._generations = {}
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.invalidations = self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """The cached value of key, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires <= self.clock():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry.value
+
+    def generation(self, user):
+        """Token to take before computing a result for user and hand to put()."""
+        return self._generations.get(user, 0)
+
+    def put(self, key, value, size, scope, generation):
+        """Cache value (size bytes) under key; scope says which changes invalidate it.
+
+        Nothing is cached if the user's data changed since generation was
+        taken: the value may predate the change.
+        """
+        size += ENTRY_OVERHEAD
+        if size > self.max_bytes // 8:
+            # One huge page would push out dozens of small dashboards.
+            return
+        user = key[0]
+        with self._lock:
+            if self._generations.get(user, 0) != generation:
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = _Entry(user, value, size, scope, self.clock() + self.ttl)
+            self._index.setdefault(user, {}).setdefault(scope.category, set()).add(key)
+            self.size += size
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self.size -= entry.size
+        categories = self._index[entry.user]
+        keys = categories[entry.scope.category]
+        keys.discard(key)
+        if not keys:
+            del categories[entry.scope.category]
+            if not categories:
+                del self._index[entry.user]
+
+    def invalidate(self, user, *expenses):
+        """Drop the user's entries whose scope covers any of the expenses (None is skipped)."""
+        with self._lock:
+            self._generations[user] = self._generations.get(user, 0) + 1
+            categories = self._index.get(user)
+            if not categories:
+                return
+            for expense in expenses:
+                if expense is None:
+                    continue
+                for category in (None, expense['category']):
+                    for key in list(categories.get(category, ())):
+                        if self._entries[key].scope.covers(expense):
+                            self._remove(key)
+                            self.invalidations += 1
+                    if user not in self._index:
+                        return
+
+    def forget(self, user):
+        """Drop every entry of a user."""
+        with self._lock:
+            self._generations[user] = self._generations.get(user, 0) + 1
+            for keys in list(self._index.get(user, {}).values()):
+                for key in list(keys):
+                    self._remove(key)
+
+    def attach(self, user, store):
+        """Start serving a user's queries from store, whose writes invalidate them.
+
+        Anything cached from an earlier store of the user may have missed
+        writes, so it is dropped.
+        """
+        self.forget(user)
+        store.subscribe(_Invalidator(self, user))
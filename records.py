@@ -0,0 +1,93 @@
+# records.py - Compact in-memory representation of stored expenses
+#
+# A dict per expense costs several hundred bytes: the dict itself, a float
+# and fresh copies of the category, payment method and date strings. The
+# JSON store keeps Expense records instead and only builds dicts for the
+# expenses a request actually returns.
+import sys
+from collections import namedtuple
+from datetime import date
+
+# 'YYYY-MM-DD' <-> ordinal, so every expense on a day shares one int and one string
+_ordinals = {}
+_days = {}
+
+
+def day_ordinal(day):
+    """Ordinal of a YYYY-MM-DD date string."""
+    ordinal = _ordinals.get(day)
+    if ordinal is None:
+        ordinal = date.fromisoformat(day).toordinal()
+        _ordinals[day] = ordinal
+        _days[ordinal] = day
+    return ordinal
+
+
+def day_string(ordinal):
+    """YYYY-MM-DD string of a day ordinal."""
+    day = _days.get(ordinal)
+    if day is None:
+        day = date.fromordinal(ordinal).isoformat()
+        _ordinals[day] = ordinal
+        _days[ordinal] = day
+    return day
+
+
+def pack_amount(amount):
+    """Amount in rupees -> integer paisa, or the float itself if that would round it."""
+    minor = round(amount * 100)
+    return minor if minor / 100 == amount else amount
+
+
+def unpack_amount(amount):
+    return amount / 100 if type(amount) is int else amount
+
+
+class Expense(namedtuple('Expense', ['id', 'item', 'amount', 'category', 'day', 'payment_method', 'notes',
+                                     'created_at', 'updated_at', 'version'])):
+    """One stored expense: the EXPENSE_FIELDS plus the store's SYNC_FIELDS.
+
+    An immutable tuple with no per-instance dict (edits replace the
+    record). Category and payment method are interned (they come from a
+    handful of values), the amount is held in paisa and the date as a day
+    ordinal. Being a plain tuple underneath, records can be built in bulk
+    without running Python code per record (see snapshot.py).
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def from_dict(cls, data):
+        created_at = data.get('created_at') or ''
+        updated_at = data.get('updated_at') or ''
+        return cls(data['id'], data['item'], pack_amount(data['amount']), sys.intern(data['category']),
+                   day_ordinal(data['date']), sys.intern(data['payment_method']), data.get('notes') or '',
+                   # Never-edited expenses share the one string.
+                   created_at, created_at if updated_at == created_at else updated_at,
+                   data.get('version', 0))
+
+    @property
+    def date(self):
+        return _days[self.day]
+
+    def to_dict(self):
+        """The expense as the API returns it, keys in EXPENSE_FIELDS + SYNC_FIELDS order."""
+        return {
+            "id": self.id,
+            "item": self.item,
+            "amount": unpack_amount(self.amount),
+            "category": self.category,
+            "date": _days[self.day],
+            "payment_method": self.payment_method,
+            "notes": self.notes,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+            "version": self.version,
+        }
+
+    def matches(self, category=None, date_from=None, date_to=None, payment_method=None):
+        """True if the expense passes the find() filters (see storage.matches)."""
+        return ((category is None or self.category == category)
+                and (payment_method is None or self.payment_method == payment_method)
+                and (date_from is None or _days[self.day] >= date_from)
+                and (date_to is None or _days[self.day] <= date_to))
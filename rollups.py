@@ -0,0 +1,319 @@
+# rollups.py - Incrementally maintained totals for the stats dashboard
+import bisect
+import threading
+
+
+def to_minor(amount):
+    """Amount in rupees -> integer paisa, so running totals never drift."""
+    return int(round(amount * 100))
+
+
+def from_minor(minor):
+    return minor / 100
+
+
+class _Fenwick:
+    """Prefix sums over a list that stay O(log n) to update and to query.
+
+    values holds the per-position numbers; tree is the Fenwick (binary
+    indexed) tree over them, tree[i - 1] covering positions
+    (i - lowbit(i), i].
+    """
+
+    __slots__ = ('values', 'tree')
+
+    def __init__(self, size=0):
+        self.values = [0] * size
+        self.tree = [0] * size
+
+    def add(self, position, delta):
+        self.values[position] += delta
+        i = position + 1
+        tree = self.tree
+        while i <= len(tree):
+            tree[i - 1] += delta
+            i += i & -i
+
+    def prefix(self, end):
+        """Sum of values[:end]."""
+        total = 0
+        tree = self.tree
+        while end > 0:
+            total += tree[end - 1]
+            end -= end & -end
+        return total
+
+    def range(self, start, end):
+        return self.prefix(end) - self.prefix(start)
+
+    def append(self):
+        """Add a zero-valued position at the end."""
+        self.values.append(0)
+        n = len(self.values)
+        # The new node covers (n - lowbit(n), n]; position n itself is 0.
+        self.tree.append(self.prefix(n - 1) - self.prefix(n - (n & -n)))
+
+    def insert(self, position):
+        """Add a zero-valued position anywhere; rebuilds the tree in O(n)."""
+        self.values.insert(position, 0)
+        self.rebuild()
+
+    def rebuild(self):
+        tree = self.tree = list(self.values)
+        n = len(tree)
+        for i in range(1, n + 1):
+            parent = i + (i & -i)
+            if parent <= n:
+                tree[parent - 1] += tree[i - 1]
+
+
+class DateIndex:
+    """Counts and totals per day, with prefix sums for any date range.
+
+    Days are kept sorted; each series (overall, and per category and per
+    payment method) has a Fenwick tree of counts and one of totals over
+    them. Finding a range is a bisect and its total two prefix sums, so
+    "last 30 days" costs O(log days) however many expenses fall in it.
+    Days are never dropped, so an emptied day just sums to zero.
+    """
+
+    SERIES = ("category", "payment_method")
+
+    def __init__(self):
+        self.days = []
+        # None (every expense) or (group, key) -> (counts, totals in paisa)
+        self.series = {None: (_Fenwick(), _Fenwick())}
+
+    @classmethod
+    def build(cls, expenses):
+        """Index expenses from scratch, building each tree once at the end."""
+        index = cls()
+        points = {}
+        for expense in expenses:
+            amount = to_minor(expense['amount'])
+            for key in index._series_keys(expense):
+                day_points = points.setdefault(key, {})
+                point = day_points.get(expense['date'])
+                if point is None:
+                    point = day_points[expense['date']] = [0, 0]
+                point[0] += 1
+                point[1] += amount
+        index.days = sorted(points.get(None, ()))
+        index.series = {None: (_Fenwick(len(index.days)), _Fenwick(len(index.days)))}
+        positions = {day: i for i, day in enumerate(index.days)}
+        for key, day_points in points.items():
+            counts, totals = index._get_series(key)
+            for day, (count, total) in day_points.items():
+                counts.values[positions[day]] = count
+                totals.values[positions[day]] = total
+            counts.rebuild()
+            totals.rebuild()
+        return index
+
+    def _series_keys(self, expense):
+        return (None,) + tuple((group, expense[group]) for group in self.SERIES)
+
+    def _get_series(self, key):
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = (_Fenwick(len(self.days)), _Fenwick(len(self.days)))
+        return series
+
+    def _position(self, day):
+        """Index of day in self.days, adding it first if it is new."""
+        days = self.days
+        if not days or days[-1] < day:
+            days.append(day)
+            for counts, totals in self.series.values():
+                counts.append()
+                totals.append()
+            return len(days) - 1
+        i = bisect.bisect_left(days, day)
+        if days[i] != day:
+            days.insert(i, day)
+            for counts, totals in self.series.values():
+                counts.insert(i)
+                totals.insert(i)
+        return i
+
+    def add(self, expense, sign):
+        i = self._position(expense['date'])
+        amount = to_minor(expense['amount']) * sign
+        for key in self._series_keys(expense):
+            counts, totals = self._get_series(key)
+            counts.add(i, sign)
+            totals.add(i, amount)
+
+    def bounds(self, date_from=None, date_to=None):
+        """[start, end) positions of the days within the inclusive date bounds."""
+        start = 0 if date_from is None else bisect.bisect_left(self.days, date_from)
+        end = len(self.days) if date_to is None else bisect.bisect_right(self.days, date_to)
+        return start, max(start, end)
+
+    def total(self, start, end, key=None):
+        """(count, total in paisa) over positions [start, end) of one series."""
+        series = self.series.get(key)
+        if series is None:
+            return 0, 0
+        counts, totals = series
+        return counts.range(start, end), totals.range(start, end)
+
+    def by_month(self, start, end, key=None):
+        """{month: (count, total)} over positions [start, end), one range sum per month."""
+        result = {}
+        i = start
+        while i < end:
+            month = self.days[i][:7]
+            # Months end before the next one, whatever the day.
+            month_end = min(end, bisect.bisect_left(self.days, month + '\uffff', i))
+            count, total = self.total(i, month_end, key)
+            if count:
+                result[month] = (count, total)
+            i = month_end
+        return result
+
+    def by_day(self, start, end, key=None):
+        """{day: (count, total)} for the non-empty days in [start, end)."""
+        series = self.series.get(key)
+        if series is None:
+            return {}
+        counts, totals = series
+        return {self.days[i]: (counts.values[i], totals.values[i])
+                for i in range(start, end) if counts.values[i]}
+
+
+class Rollups:
+    """Counts and totals overall and per category, payment method, day and month.
+
+    Subscribed to an expense store, each insert/edit/delete adjusts a
+    handful of counters, so reading the dashboard figures costs the same
+    no matter how long the history is.
+    """
+
+    GROUPS = ("category", "payment_method", "day", "month")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total = 0
+        # group -> key -> [count, total in paisa]
+        self.groups = {group: {} for group in self.GROUPS}
+        self.dates = DateIndex()
+
+    @classmethod
+    def build(cls, expenses):
+        """Compute rollups from scratch."""
+        rollups = cls()
+        expenses = list(expenses)
+        for expense in expenses:
+            rollups._add(expense, 1, dates=False)
+        rollups.dates = DateIndex.build(expenses)
+        return rollups
+
+    @staticmethod
+    def _keys(expense):
+        return (("category", expense['category']),
+                ("payment_method", expense['payment_method']),
+                ("day", expense['date']),
+                ("month", expense['date'][:7]))
+
+    def _add(self, expense, sign, dates=True):
+        amount = to_minor(expense['amount']) * sign
+        if dates:
+            self.dates.add(expense, sign)
+        self.count += sign
+        self.total += amount
+        for group, key in self._keys(expense):
+            bucket = self.groups[group].get(key)
+            if bucket is None:
+                bucket = self.groups[group][key] = [0, 0]
+            bucket[0] += sign
+            bucket[1] += amount
+            if bucket[0] == 0:
+                del self.groups[group][key]
+
+    def apply(self, old, new):
+        """Store listener hook: old is None for inserts, new is None for deletes."""
+        with self._lock:
+            if old is not None:
+                self._add(old, -1)
+            if new is not None:
+                self._add(new, 1)
+
+    def bucket(self, group, key):
+        """(count, total) for one key of a group, e.g. ("category", "Shopping")."""
+        count, total = self.groups[group].get(key, (0, 0))
+        return count, from_minor(total)
+
+    def range_bucket(self, group, key, date_from=None, date_to=None):
+        """(count, total) for one key of a group between inclusive dates, in O(log days)."""
+        with self._lock:
+            count, total = self.dates.total(*self.dates.bounds(date_from, date_to), (group, key))
+        return count, from_minor(total)
+
+    def to_dict(self, groups=("category", "payment_method", "month"), date_from=None, date_to=None):
+        """Dashboard figures, for the whole history or between inclusive dates."""
+        if date_from is not None or date_to is not None:
+            return self._range_dict(groups, date_from, date_to)
+        with self._lock:
+            result = {
+                "count": self.count,
+                "total": from_minor(self.total),
+                "average": round(from_minor(self.total) / self.count, 2) if self.count else 0,
+            }
+            for group in groups:
+                result[f"by_{group}"] = {key: {"count": count, "total": from_minor(total)}
+                                         for key, (count, total) in sorted(self.groups[group].items())}
+        return result
+
+    def _range_dict(self, groups, date_from, date_to):
+        dates = self.dates
+        with self._lock:
+            start, end = dates.bounds(date_from, date_to)
+            count, total = dates.total(start, end)
+            result = {
+                "from": date_from,
+                "to": date_to,
+                "count": count,
+                "total": from_minor(total),
+                "average": round(from_minor(total) / count, 2) if count else 0,
+            }
+            for group in groups:
+                if group == "month":
+                    buckets = dates.by_month(start, end)
+                elif group == "day":
+                    buckets = dates.by_day(start, end)
+                else:
+                    buckets = {key: dates.total(start, end, (group, key)) for key in self.groups[group]}
+                result[f"by_{group}"] = {key: {"count": count, "total": from_minor(total)}
+                                         for key, (count, total) in sorted(buckets.items()) if count}
+        return result
+
+    def diff(self, other):
+        """Differences from self (expected) to other (actual); empty when they agree.
+
+        Buckets are shown as [count, total in paisa].
+        """
+        differences = []
+        if (self.count, self.total) != (other.count, other.total):
+            differences.append(f"overall: expected {[self.count, self.total]}, got {[other.count, other.total]}")
+        for group in self.GROUPS:
+            mine, theirs = self.groups[group], other.groups[group]
+            for key in sorted(mine.keys() | theirs.keys()):
+                if mine.get(key) != theirs.get(key):
+                    differences.append(f"{group} {key!r}: expected {mine.get(key)}, got {theirs.get(key)}")
+        # The date index must agree day by day, including its prefix sums.
+        for key in sorted(self.dates.series.keys() | other.dates.series.keys(), key=str):
+            mine = self.dates.by_day(0, len(self.dates.days), key)
+            theirs = other.dates.by_day(0, len(other.dates.days), key)
+            mine_total = self.dates.total(*self.dates.bounds(), key)
+            theirs_total = other.dates.total(*other.dates.bounds(), key)
+            if mine != theirs or mine_total != theirs_total:
+                differences.append(f"dates {key!r}: expected {mine_total}, got {theirs_total}")
+        return differences
+
+
+def check_consistency(rollups, expenses):
+    """Rebuild rollups from raw expenses and diff them against the live ones."""
+    with rollups._lock:
+        return Rollups.build(expenses).diff(rollups)
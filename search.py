@@ -0,0 +1,216 @@
+# search.py - Full-text search over expense item names and notes
+#
+# An inverted index kept current as a store listener, like the rollups.
+# Postings are bucketed by day so results come out newest first and a
+# query can stop as soon as it has a page of best-possible matches,
+# however many expenses mention "coffee". Partial words ("netfl") are
+# matched against the vocabulary through a trigram index rather than by
+# scanning every expense.
+import bisect
+import re
+import threading
+
+# Searched fields and their weight in the score
+FIELDS = {"item": 2.0, "notes": 1.0}
+
+# Score multiplier for a term matching only part of a word
+PARTIAL_WEIGHT = 0.5
+
+_WORD = re.compile(r'\w+')
+
+
+def tokenize(text):
+    """Case-folded words of a text."""
+    return _WORD.findall(text.casefold()) if text else []
+
+
+def trigrams(word):
+    return {word[i:i + 3] for i in range(len(word) - 2)}
+
+
+class SearchIndex:
+    """Inverted index over item and notes, maintained incrementally.
+
+    For each field, word -> day -> set of expense ids. The vocabulary is
+    kept sorted (for short prefixes) and trigram-indexed (for partial
+    words); it stays small next to the number of expenses.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.postings = {field: {} for field in FIELDS}
+        # word -> number of (field, day) buckets it appears in
+        self._words = {}
+        self._vocabulary = []
+        # trigram -> words containing it
+        self._trigrams = {}
+        # every day that has had an indexed expense, ascending
+        self._days = []
+        # id -> category, for filtering without a store lookup
+        self._categories = {}
+
+    @classmethod
+    def build(cls, expenses):
+        """Index expenses from scratch."""
+        index = cls()
+        for expense in expenses:
+            index._add(expense)
+        return index
+
+    # ------------------------------------------------------------------
+    # Maintenance
+    # ------------------------------------------------------------------
+    def _add(self, expense):
+        expense_id, day = expense['id'], expense['date']
+        self._categories[expense_id] = expense['category']
+        if not self._days or self._days[-1] < day:
+            self._days.append(day)
+        else:
+            i = bisect.bisect_left(self._days, day)
+            if i == len(self._days) or self._days[i] != day:
+                self._days.insert(i, day)
+        for field in FIELDS:
+            postings = self.postings[field]
+            for word in set(tokenize(expense.get(field))):
+                days = postings.get(word)
+                if days is None:
+                    days = postings[word] = {}
+                ids = days.get(day)
+                if ids is None:
+                    ids = days[day] = set()
+                    self._add_word(word)
+                ids.add(expense_id)
+
+    def _remove(self, expense):
+        expense_id, day = expense['id'], expense['date']
+        self._categories.pop(expense_id, None)
+        for field in FIELDS:
+            postings = self.postings[field]
+            for word in set(tokenize(expense.get(field))):
+                days = postings.get(word)
+                ids = days.get(day) if days else None
+                if ids is None:
+                    continue
+                ids.discard(expense_id)
+                if not ids:
+                    del days[day]
+                    if not days:
+                        del postings[word]
+                    self._remove_word(word)
+
+    def _add_word(self, word):
+        count = self._words.get(word, 0)
+        self._words[word] = count + 1
+        if count:
+            return
+        bisect.insort(self._vocabulary, word)
+        for trigram in trigrams(word):
+            self._trigrams.setdefault(trigram, set()).add(word)
+
+    def _remove_word(self, word):
+        count = self._words[word] - 1
+        if count:
+            self._words[word] = count
+            return
+        del self._words[word]
+        del self._vocabulary[bisect.bisect_left(self._vocabulary, word)]
+        for trigram in trigrams(word):
+            words = self._trigrams[trigram]
+            words.discard(word)
+            if not words:
+                del self._trigrams[trigram]
+
+    def apply(self, old, new):
+        """Store listener hook: old is None for inserts, new is None for deletes."""
+        with self._lock:
+            if old is not None:
+                self._remove(old)
+            if new is not None:
+                self._add(new)
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+    def expand(self, term):
+        """{word: weight} for the indexed words a query term matches.
+
+        The word itself scores 1; words the term is a prefix of (short
+        terms) or a substring of (three letters or more) score PARTIAL_WEIGHT.
+        """
+        if len(term) < 3:
+            start = bisect.bisect_left(self._vocabulary, term)
+            end = bisect.bisect_left(self._vocabulary, term + '\uffff')
+            words = self._vocabulary[start:end]
+        else:
+            candidates = None
+            for trigram in trigrams(term):
+                found = self._trigrams.get(trigram)
+                if not found:
+                    return {}
+                candidates = set(found) if candidates is None else candidates & found
+            words = [word for word in candidates if term in word]
+        return {word: 1.0 if word == term else PARTIAL_WEIGHT for word in words}
+
+    def _best_score(self, words):
+        """Highest score an expanded term can contribute, given where its words occur."""
+        return max(field_weight * weight
+                   for field, field_weight in FIELDS.items()
+                   for word, weight in words.items() if word in self.postings[field])
+
+    def _score_day(self, day, expanded):
+        """{id: score} for the expenses of one day matching every term."""
+        scores = None
+        for words in expanded:
+            term_scores = {}
+            for field, field_weight in FIELDS.items():
+                postings = self.postings[field]
+                for word, weight in words.items():
+                    ids = postings.get(word, {}).get(day)
+                    if not ids:
+                        continue
+                    score = field_weight * weight
+                    for expense_id in ids if scores is None else ids & scores.keys():
+                        if term_scores.get(expense_id, 0) < score:
+                            term_scores[expense_id] = score
+            if not term_scores:
+                return {}
+            if scores is None:
+                scores = term_scores
+            else:
+                scores = {expense_id: scores[expense_id] + score
+                          for expense_id, score in term_scores.items() if expense_id in scores}
+        return scores or {}
+
+    def search(self, query, category=None, date_from=None, date_to=None, limit=20):
+        """Ids and scores of the best matches for every word of query, best first.
+
+        Scores add up per term: an exact word in the item beats one in the
+        notes, which beats a partial word; ties go to the newest expense.
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        with self._lock:
+            expanded = [self.expand(term) for term in terms]
+            if not all(expanded):
+                return []
+            # The highest score any expense could get, for stopping early.
+            best = sum(self._best_score(words) for words in expanded)
+            start = 0 if date_from is None else bisect.bisect_left(self._days, date_from)
+            end = len(self._days) if date_to is None else bisect.bisect_right(self._days, date_to)
+            results = []
+            perfect = 0
+            # Newest day first: once a page of top-scoring matches is
+            # found, nothing older can rank above them.
+            for i in range(end - 1, start - 1, -1):
+                day = self._days[i]
+                for expense_id, score in sorted(self._score_day(day, expanded).items(), reverse=True):
+                    if category is not None and self._categories.get(expense_id) != category:
+                        continue
+                    results.append((expense_id, score))
+                    perfect += score == best
+                if perfect >= limit:
+                    break
+        # Stable: equal scores stay newest first.
+        results.sort(key=lambda r: -r[1])
+        return results[:limit]
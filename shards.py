@@ -0,0 +1,333 @@
+# shards.py - Per-user partitioning of the expense store
+#
+# With EXPENSE_SHARDS_DIR set, every user gets a store of their own under
+# <dir>/<user id>/ (same backend and file names as the single store, with
+# their archives and budgets beside it), so one user's data, locks and
+# indexes never touch another's. Only the SHARD_CACHE_SIZE most recently
+# used shards stay open; opening another closes the least recently used
+# one that no request is using, after folding its journal into a snapshot
+# so it reopens quickly.
+import os
+import re
+import threading
+from array import array
+from collections import OrderedDict
+from itertools import chain
+
+from analytics import Analytics
+from archive import Archives
+from budgets import Budgets, MonthlySpending
+from rollups import Rollups
+from search import SearchIndex
+from storage import ExpenseStore, open_store
+
+# Open shards kept per process
+SHARD_CACHE_SIZE = int(os.environ.get('EXPENSE_SHARD_CACHE', 256))
+
+# Accepted user ids: they name directories
+USER_ID = re.compile(r'[A-Za-z0-9_-]{1,64}')
+
+
+class _Backlog:
+    """Store listener standing in for derived state while it is built.
+
+    Subscribed before the build reads the store, it holds on to the
+    changes made meanwhile. start() then replays into the built state
+    those the build did not already see, judged by the version of each
+    expense it read, and from then on passes changes straight through.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._changes = []
+        self.target = None
+
+    def apply(self, old, new):
+        with self._lock:
+            target = self.target
+            if target is None:
+                self._changes.append((old, new))
+                return
+        target.apply(old, new)
+
+    def start(self, target, ids, versions):
+        """Catch target up and forward to it; ids and versions are what the build read."""
+        with self._lock:
+            wanted = {(new or old)['id'] for old, new in self._changes}
+            # id -> version as the target has it, None once deleted
+            seen = {}
+            if wanted:
+                seen = {expense_id: version for expense_id, version in zip(ids, versions) if expense_id in wanted}
+            for old, new in self._changes:
+                expense_id = (new or old)['id']
+                if seen.get(expense_id) == (old['version'] if old is not None else None):
+                    target.apply(old, new)
+                    seen[expense_id] = new['version'] if new is not None else None
+            self._changes = None
+            self.target = target
+
+
+class Shard:
+    """One store and the state derived from it, each built on first use.
+
+    The derived state subscribes to the store, which keeps it current;
+    later calls pick up other processes' writes through store.refresh().
+    """
+
+    def __init__(self, store, archives=None, user_id=None, queries=None, budgets=None):
+        self.store = store
+        self.archives = archives if archives is not None else Archives(None)
+        if self.archives.directory is not None:
+            # Edits to closed years are refused under the store's write lock.
+            store.archived = self.archives.holds
+        self.budgets = budgets if budgets is not None else Budgets(None)
+        self.user_id = user_id
+        # querycache.QueryCache serving this shard's reads, if any
+        self.queries = queries
+        if queries is not None:
+            queries.attach(user_id, store)
+        # Requests using the shard; a pinned shard is never closed.
+        self.pins = 0
+        self._rollups = None
+        self._spending = None
+        self._analytics = None
+        self._search = None
+        self._lock = threading.Lock()
+
+    def expenses(self):
+        """Every archived and live expense."""
+        self.archives.refresh()
+        return chain(self.archives.iterate(), self.store.all())
+
+    def _derive(self, build, expenses):
+        """build(expenses()) subscribed to the store, missing no write made while it ran.
+
+        Building can take seconds (in the background warm-up, say) while
+        requests keep writing, so the store is listened to first.
+        """
+        backlog = _Backlog()
+        self.store.subscribe(backlog)
+        ids, versions = array('q'), array('q')
+
+        def read():
+            for expense in expenses():
+                ids.append(expense['id'])
+                versions.append(expense['version'])
+                yield expense
+        try:
+            state = build(read())
+        except BaseException:
+            self.store.unsubscribe(backlog)
+            raise
+        backlog.start(state, ids, versions)
+        return state
+
+    def rollups(self):
+        """Dashboard rollups over the archives and the store.
+
+        Archives never change except by closing a year, which moves
+        expenses out of the store without telling listeners, so the
+        figures stay right.
+        """
+        with self._lock:
+            if self._rollups is None:
+                self._rollups = self._derive(Rollups.build, self.expenses)
+                return self._rollups
+        # Other workers' writes reach the rollups through the store.
+        self.store.refresh()
+        return self._rollups
+
+    def spending(self):
+        """Monthly spending per category over the archives and the store, for budgets."""
+        with self._lock:
+            if self._spending is None:
+                self._spending = self._derive(MonthlySpending.build, self.expenses)
+                return self._spending
+        self.store.refresh()
+        return self._spending
+
+    def analytics(self):
+        """Columnar analytics over the archives and the store."""
+        with self._lock:
+            if self._analytics is None:
+                self._analytics = Analytics(self.store, self.archives)
+            return self._analytics
+
+    def search(self):
+        """Full-text index over item and notes of the live expenses."""
+        with self._lock:
+            if self._search is None:
+                # all() rather than pages, which an edit moving an expense
+                # across the cursor would make it miss or read twice.
+                self._search = self._derive(SearchIndex.build, self.store.all)
+                return self._search
+        self.store.refresh()
+        return self._search
+
+    def close(self):
+        """Flush the store so it reopens quickly, then close it."""
+        if self.queries is not None:
+            self.queries.forget(self.user_id)
+        self.store.flush()
+        self.store.close()
+
+
+class _NoExpenses(ExpenseStore):
+    """Read-only store of a user who has stored nothing yet; see ShardPool.acquire()."""
+
+    def __len__(self):
+        return 0
+
+    def all(self):
+        return []
+
+    def get(self, expense_id):
+        return None
+
+    def find(self, category=None, date_from=None, date_to=None, payment_method=None):
+        return []
+
+    def page(self, category=None, date_from=None, date_to=None, payment_method=None, limit=50, after=None):
+        return [], None
+
+    def tombstone(self, expense_id):
+        return None
+
+    def changes(self, since=0, limit=1000):
+        return []
+
+    def last_version(self):
+        return 0
+
+    def update(self, expense_id, data):
+        return None
+
+    def delete(self, expense_id, updated_at=None):
+        return False
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class ShardPool:
+    """Shards by user id, at most capacity of them open.
+
+    acquire() pins a shard for a request and release() unpins it; when
+    more than capacity are open, the least recently used unpinned shards
+    are flushed and closed. Shards all in use may briefly exceed it.
+    """
+
+    def __init__(self, directory, backend=None, capacity=SHARD_CACHE_SIZE, wrap=None, queries=None):
+        self.directory = directory
+        self.backend = backend or os.environ.get('EXPENSE_STORE', 'json')
+        self.capacity = capacity
+        # Applied to every store opened, e.g. metrics.instrument
+        self.wrap = wrap
+        # Query cache shared by all shards, keyed by user id
+        self.queries = queries
+        self._open = OrderedDict()
+        # Stands in for every user with no directory yet, on reads
+        self._nobody = Shard(_NoExpenses())
+        self._lock = threading.Lock()
+        # For metrics and benchmarks
+        self.hits = self.misses = self.evictions = 0
+
+    def __len__(self):
+        return len(self._open)
+
+    def path(self, user_id):
+        """Directory of a user's shard."""
+        if not USER_ID.fullmatch(user_id):
+            raise ValueError(f"Invalid user id: {user_id!r}")
+        return os.path.join(self.directory, user_id)
+
+    def _open_shard(self, user_id):
+        directory = self.path(user_id)
+        os.makedirs(directory, exist_ok=True)
+        name = 'expenses.json' if self.backend == 'json' else 'expenses.db'
+        store = open_store(self.backend, os.path.join(directory, name))
+        if self.wrap is not None:
+            store = self.wrap(store)
+        return Shard(store, Archives(os.path.join(directory, 'archive')), user_id, self.queries,
+                     Budgets(os.path.join(directory, 'budgets.json')))
+
+    def acquire(self, user_id, create=True):
+        """The user's shard, opened if need be and pinned until release().
+
+        Unless create, a user with nothing on disk gets an empty read-only
+        stand-in instead of a new directory: ids are not authenticated, so
+        only requests that store something may create files.
+        """
+        with self._lock:
+            shard = self._open.get(user_id)
+            if shard is not None:
+                self.hits += 1
+                self._open.move_to_end(user_id)
+                shard.pins += 1
+                return shard
+            if not create and not os.path.isdir(self.path(user_id)):
+                self._nobody.pins += 1
+                return self._nobody
+        # Opened without the pool lock: loading one shard must not stall
+        # requests for the others.
+        shard = self._open_shard(user_id)
+        with self._lock:
+            current = self._open.get(user_id)
+            if current is not None:
+                # Another thread opened it meanwhile; use theirs.
+                self.hits += 1
+                self._open.move_to_end(user_id)
+                current.pins += 1
+                duplicate, shard = shard, current
+            else:
+                self.misses += 1
+                duplicate = None
+                self._open[user_id] = shard
+                shard.pins += 1
+            evicted = self._evict()
+        if duplicate is not None:
+            duplicate.store.close()
+        for old in evicted:
+            old.close()
+        return shard
+
+    def pin(self, shard):
+        """Pin an acquired shard once more, e.g. for a streamed response; release() each pin."""
+        with self._lock:
+            shard.pins += 1
+
+    def release(self, shard):
+        with self._lock:
+            shard.pins -= 1
+            evicted = self._evict()
+        for old in evicted:
+            old.close()
+
+    def _evict(self):
+        """Take least recently used unpinned shards out until at most capacity are open (lock held)."""
+        evicted = []
+        if len(self._open) <= self.capacity:
+            return evicted
+        for user_id, shard in list(self._open.items()):
+            if len(self._open) <= self.capacity:
+                break
+            if shard.pins == 0:
+                del self._open[user_id]
+                evicted.append(shard)
+        self.evictions += len(evicted)
+        return evicted
+
+    def close(self):
+        with self._lock:
+            shards, self._open = list(self._open.values()), OrderedDict()
+        for shard in shards:
+            shard.close()
+
+
+def open_shards(directory=None, wrap=None, queries=None):
+    """The ShardPool in EXPENSE_SHARDS_DIR, or None when sharding is off."""
+    directory = directory or os.environ.get('EXPENSE_SHARDS_DIR')
+    return ShardPool(directory, wrap=wrap, queries=queries) if directory else None
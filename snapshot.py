@@ -0,0 +1,272 @@
+# snapshot.py - Binary snapshots of the JSON store's state
+#
+# json.load of a big expenses.json dominates startup, so compaction writes
+# this format instead. It is columnar: each field of every expense is one
+# packed array, strings sit in a UTF-8 heap addressed by offsets, and the
+# two sort orders the store keeps are saved ready-made. Startup memory-maps
+# the file and builds the records with map() and zip() over memoryview
+# casts of the mapping: nothing is parsed and no Python code runs per
+# expense. Each distinct item, note and label is stored (and decoded) once.
+#
+# Layout, little-endian, sections 8-byte aligned:
+#   header     HEADER
+#   directory  one DIRECTORY_ENTRY (offset, items) per section, in SECTIONS order
+#   sections
+import mmap
+import os
+import struct
+import sys
+from array import array
+from itertools import accumulate, repeat
+from operator import itemgetter
+
+from records import Expense, day_ordinal, day_string
+
+MAGIC = b'EXPSNAP2'
+
+# magic, next_id, version
+HEADER = struct.Struct('<8sqq')
+DIRECTORY_ENTRY = struct.Struct('<qq')
+
+# (name, array typecode)
+SECTIONS = (
+    # Per expense, in (date, id) order
+    ("id", "q"),
+    ("version", "q"),
+    ("day", "i"),
+    ("category", "I"),
+    ("payment_method", "I"),
+    ("item", "I"),
+    ("notes", "I"),
+    # Amount in paisa, or 0 where it is not a whole number of paisa and
+    # "rupees" has it instead
+    ("paisa", "q"),
+    ("rupees", "d"),
+    # created_at is timestamps[i]; updated_at is timestamps[updated_at[i]]
+    ("updated_at", "I"),
+    # Deleted expenses
+    ("tombstone_id", "q"),
+    ("tombstone_version", "q"),
+    ("tombstone_updated_at", "I"),
+    # The store's (version, id) order: positions of expenses, then of
+    # tombstones numbered on from the last expense
+    ("log", "I"),
+    # Distinct labels, items and notes: character offsets (one more than
+    # there are strings) into the UTF-8 text
+    ("strings", "Q"),
+    ("strings_text", "B"),
+    ("timestamps", "Q"),
+    ("timestamps_text", "B"),
+)
+
+ALIGNMENT = 8
+
+
+class SnapshotError(ValueError):
+    """Raised for a file that is not a complete snapshot."""
+
+
+class Snapshot:
+    """What read_snapshot() loaded.
+
+    expenses are Expense records in (date, id) order, order and log the
+    store's (date, id) and (version, id) indexes, tombstones dicts.
+    """
+
+    def __init__(self, expenses, order, log, tombstones, next_id, version):
+        self.expenses = expenses
+        self.order = order
+        self.log = log
+        self.tombstones = tombstones
+        self.next_id = next_id
+        self.version = version
+
+
+class StringTable:
+    """Distinct strings numbered in order of first use."""
+
+    def __init__(self):
+        self._index = {}
+
+    def codes(self, values):
+        """Array of the numbers of values, adding the strings not seen yet."""
+        index = self._index
+        for text in dict.fromkeys(values):
+            index.setdefault(text, len(index))
+        return array('I', map(index.__getitem__, values))
+
+    @property
+    def strings(self):
+        return list(self._index)
+
+
+def pack_text(strings):
+    """(character offsets, UTF-8 bytes) of a list of strings, for unpack_text().
+
+    Lone surrogates (which JSON can carry) are kept as their 3-byte
+    encoding rather than failing the whole snapshot.
+    """
+    return (array('Q', accumulate(map(len, strings), initial=0)),
+            array('B', ''.join(strings).encode('utf-8', 'surrogatepass')))
+
+
+def unpack_text(offsets, data):
+    """The strings packed by pack_text(), decoding the whole text in one go."""
+    text = str(data, 'utf-8', 'surrogatepass')
+    return list(map(text.__getitem__, map(slice, offsets[:-1], offsets[1:])))
+
+
+def write_sections(f, header, sections, columns):
+    """Write header, the directory of sections and every column array to f."""
+    f.write(header)
+    position = len(header) + len(sections) * DIRECTORY_ENTRY.size
+    directory = []
+    for name, _ in sections:
+        position += -position % ALIGNMENT
+        directory.append(DIRECTORY_ENTRY.pack(position, len(columns[name])))
+        position += len(columns[name]) * columns[name].itemsize
+    f.write(b''.join(directory))
+    position = f.tell()
+    for name, _ in sections:
+        padding = -position % ALIGNMENT
+        f.write(bytes(padding))
+        data = memoryview(columns[name]).cast('B')
+        f.write(data)
+        position += padding + len(data)
+
+
+def map_sections(view, header_size, sections):
+    """{name: memoryview cast to its typecode} for every section of a mapped file.
+
+    The caller releases the views (see release()) before the mapping closes.
+    """
+    columns = {}
+    try:
+        for i, (name, typecode) in enumerate(sections):
+            offset, items = DIRECTORY_ENTRY.unpack_from(view, header_size + i * DIRECTORY_ENTRY.size)
+            end = offset + items * struct.calcsize(typecode)
+            if offset < header_size or end > len(view) or offset % ALIGNMENT:
+                raise SnapshotError(f"section {name} lies outside the file")
+            columns[name] = view[offset:end].cast(typecode)
+    except (struct.error, SnapshotError):
+        release(columns)
+        raise SnapshotError("damaged section directory")
+    return columns
+
+
+def release(columns):
+    for column in columns.values():
+        column.release()
+
+
+def write_snapshot(path, expenses, tombstones, log, next_id, version):
+    """Atomically replace path with a snapshot of the given state.
+
+    expenses are Expense records in (date, id) order, log the (version, id)
+    pairs of every expense and tombstone in order. The file is written
+    beside path, fsynced, renamed over it and the directory fsynced, so a
+    crash leaves either the old snapshot or the new one, never a mix.
+    """
+    # Records are tuples, so zip(*) turns them into columns without a Python loop.
+    (ids, items, amounts, categories, days, payment_methods, notes,
+     created_at, updated_at, versions) = list(zip(*expenses)) or [()] * len(Expense._fields)
+    tombstones = list(tombstones)
+    strings = StringTable()
+    timestamps = list(created_at)
+    # Edited expenses add their updated_at after all the created_at.
+    edited = [i for i, (created, updated) in enumerate(zip(created_at, updated_at)) if updated != created]
+    updated_index = array('I', range(len(ids)))
+    for position, i in enumerate(edited, len(timestamps)):
+        updated_index[i] = position
+    timestamps.extend(updated_at[i] for i in edited)
+    tombstone_updated_at = array('I', range(len(timestamps), len(timestamps) + len(tombstones)))
+    timestamps.extend(t['updated_at'] for t in tombstones)
+    columns = {
+        "id": array('q', ids),
+        "version": array('q', versions),
+        "day": array('i', days),
+        "category": strings.codes(categories),
+        "payment_method": strings.codes(payment_methods),
+        "item": strings.codes(items),
+        "notes": strings.codes(notes),
+        "paisa": array('q', [amount if type(amount) is int else 0 for amount in amounts]),
+        "rupees": array('d', [0.0 if type(amount) is int else amount for amount in amounts]),
+        "updated_at": updated_index,
+        "tombstone_id": array('q', [t['id'] for t in tombstones]),
+        "tombstone_version": array('q', [t['version'] for t in tombstones]),
+        "tombstone_updated_at": tombstone_updated_at,
+    }
+    position = dict(zip(ids, range(len(ids))))
+    position.update(zip(columns["tombstone_id"], range(len(ids), len(ids) + len(tombstones))))
+    columns["log"] = array('I', map(position.__getitem__, map(itemgetter(1), log)))
+    columns["strings"], columns["strings_text"] = pack_text(strings.strings)
+    columns["timestamps"], columns["timestamps_text"] = pack_text(timestamps)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        write_sections(f, HEADER.pack(MAGIC, next_id, version), SECTIONS, columns)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    fsync_directory(path)
+
+
+def fsync_directory(path):
+    """Make a rename into path's directory durable."""
+    fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def read_snapshot(path):
+    """Load a snapshot written by write_snapshot(); raises SnapshotError if it is damaged."""
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size < HEADER.size:
+            raise SnapshotError(f"{path}: truncated snapshot")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped, memoryview(mapped) as view:
+            magic, next_id, version = HEADER.unpack_from(view)
+            if magic != MAGIC:
+                raise SnapshotError(f"{path}: not a snapshot")
+            columns = map_sections(view, HEADER.size, SECTIONS)
+            try:
+                return _build(columns, next_id, version)
+            except (IndexError, UnicodeDecodeError) as e:
+                raise SnapshotError(f"{path}: damaged snapshot ({e})")
+            finally:
+                release(columns)
+
+
+def _build(columns, next_id, version):
+    strings = list(map(sys.intern, unpack_text(columns["strings"], columns["strings_text"])))
+    timestamps = unpack_text(columns["timestamps"], columns["timestamps_text"])
+    # Python lists of the ids and versions, so the records, the sort orders
+    # and the tombstones all share the same int objects.
+    ids = columns["id"].tolist()
+    versions = columns["version"].tolist()
+    count = len(ids)
+    if any(len(columns[name]) != count for name, _ in SECTIONS[:10]):
+        raise SnapshotError("expense columns differ in length")
+    # One shared int and string per day, as records.day_ordinal() gives out.
+    days = {ordinal: day_ordinal(day_string(ordinal)) for ordinal in set(columns["day"])}
+    day_strings = {ordinal: day_string(ordinal) for ordinal in days}
+    expenses = list(map(tuple.__new__, repeat(Expense), zip(
+        ids,
+        map(strings.__getitem__, columns["item"]),
+        [paisa or rupees for paisa, rupees in zip(columns["paisa"], columns["rupees"])],
+        map(strings.__getitem__, columns["category"]),
+        map(days.__getitem__, columns["day"]),
+        map(strings.__getitem__, columns["payment_method"]),
+        map(strings.__getitem__, columns["notes"]),
+        timestamps[:count],
+        map(timestamps.__getitem__, columns["updated_at"]),
+        versions,
+    )))
+    order = list(zip(map(day_strings.__getitem__, columns["day"]), ids))
+    tombstones = [{"id": expense_id, "deleted": True, "updated_at": timestamps[updated_at], "version": deleted_at}
+                  for expense_id, deleted_at, updated_at
+                  in zip(columns["tombstone_id"], columns["tombstone_version"], columns["tombstone_updated_at"])]
+    ids.extend(t['id'] for t in tombstones)
+    versions.extend(t['version'] for t in tombstones)
+    log = list(zip(map(versions.__getitem__, columns["log"]), map(ids.__getitem__, columns["log"])))
+    return Snapshot(expenses, order, log, tombstones, next_id, version)
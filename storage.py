@@ -0,0 +1,1382 @@
+# storage.py - Server-side expense storage for the Expense Tracker
+import base64
+import bisect
+import gc
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+from contextlib import contextmanager
+from operator import itemgetter
+from datetime import datetime, timezone
+
+from metrics import pid_alive
+from records import Expense
+from snapshot import read_snapshot, write_snapshot
+
+log = logging.getLogger(__name__)
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+# Fields every stored expense carries, in the order the JS addExpense() builds them.
+EXPENSE_FIELDS = ["id", "item", "amount", "category", "date", "payment_method", "notes", "created_at"]
+
+# Fields the store stamps on every write, for delta sync (see sync.py):
+# version comes from one increasing sequence shared by all writes, and
+# updated_at is when the change was made, on whichever device made it.
+SYNC_FIELDS = ["updated_at", "version"]
+
+# Journal entries allowed to pile up before they are folded into the snapshot:
+# at least COMPACT_EVERY, and up to COMPACT_RATIO of the store, so that
+# rewriting a big snapshot stays rare next to the writes it absorbs while
+# the journal replayed at startup stays short.
+COMPACT_EVERY = 1000
+COMPACT_RATIO = 0.02
+
+# A batch this many times smaller than the store is indexed entry by entry;
+# anything bigger re-sorts the indexes once instead (insort is O(n) per entry).
+REINDEX_RATIO = 100
+
+
+# Largest accepted amount: totals of millions of expenses stay exact in
+# paisa, as integers and as float64
+MAX_AMOUNT = 1_000_000_000
+
+# A SQLite store records how far it has read the change log (letting
+# entries every reader has passed be deleted) after this many entries.
+LOG_SAVE_EVERY = 1000
+
+
+class ValidationError(ValueError):
+    """Raised when submitted expense data fails the addExpense() rules."""
+
+
+class ArchivedError(ValidationError):
+    """Raised on a change to an expense that was moved into a closed year's archive."""
+
+
+def check_text(name, value):
+    """Raise ValidationError unless value is a string UTF-8 can store (no lone surrogates)."""
+    if not isinstance(value, str):
+        raise ValidationError(f"{name} must be a string")
+    try:
+        value.encode('utf-8')
+    except UnicodeEncodeError:
+        raise ValidationError(f"{name} contains characters that are not valid Unicode text")
+
+
+def validate_expense(data, existing=None):
+    """Validate expense input with the same rules as the JS addExpense().
+
+    When an existing expense is given, missing fields keep their current
+    values so the result can be used for edits. Returns a new dict without
+    an id; raises ValidationError on bad input.
+    """
+    if not isinstance(data, dict):
+        raise ValidationError("Expense must be a JSON object")
+    base = existing or {}
+
+    def field(name, default=''):
+        value = data.get(name, base.get(name, default))
+        return value.strip() if isinstance(value, str) else value
+
+    def text(name, default=''):
+        value = field(name, default)
+        if value is not None:
+            check_text(name, value)
+        return value
+
+    item = text('item')
+    if not item:
+        raise ValidationError("Please enter an item name")
+
+    amount = field('amount', None)
+    try:
+        # float(True) is 1.0, but a flag is not an amount.
+        amount = float('nan') if isinstance(amount, bool) else float(amount)
+    except (TypeError, ValueError, OverflowError):
+        amount = float('nan')
+    if not 0 < amount <= MAX_AMOUNT:
+        raise ValidationError(f"Please enter a valid amount greater than 0 and at most {MAX_AMOUNT:,}")
+
+    date = field('date')
+    if not date:
+        raise ValidationError("Please select a date")
+    try:
+        # fromisoformat is ~30x faster than strptime, but also accepts week
+        # and ordinal dates ("2025-W01-1", "2024-001"); only the canonical
+        # spelling of the day it parsed is stored.
+        canonical = datetime.fromisoformat(date).date().isoformat()
+    except (TypeError, ValueError):
+        canonical = None
+    if canonical != date:
+        raise ValidationError("Date must be in YYYY-MM-DD format")
+
+    created_at = base.get('created_at') or data.get('created_at')
+    if created_at is not None:
+        check_text('created_at', created_at)
+
+    return {
+        "item": item,
+        "amount": amount,
+        "category": text('category') or 'Other',
+        "date": date,
+        "payment_method": text('payment_method') or 'Cash',
+        "notes": text('notes') or '',
+        "created_at": created_at or datetime.now().isoformat(),
+    }
+
+
+@contextmanager
+def paused_gc():
+    """Hold off the cyclic garbage collector while building many objects at once.
+
+    Loading allocates millions of tuples and strings, none of them in
+    cycles; left running, the collector would rescan them over and over.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def timestamp():
+    """The current UTC time in the format of the browser's Date.toISOString()."""
+    return datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+
+
+def encode_cursor(key):
+    """Opaque page cursor for a (date, id) key."""
+    return base64.urlsafe_b64encode(f"{key[0]}|{key[1]}".encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor(); raises ValueError on a malformed cursor."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        date, expense_id = raw.split('|')
+        return date, int(expense_id)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+
+
+class ExpenseStore:
+    """Interface shared by the storage backends.
+
+    Expenses go in and come out as plain dicts with the EXPENSE_FIELDS keys
+    plus the SYNC_FIELDS the store stamps on every write. Deletes leave a
+    tombstone, so changes() can report them to other devices. Derived structures (rollups, indexes) subscribe() to be told about every
+    change as listener.apply(old, new), with old None for inserts and new
+    None for deletes.
+    """
+
+    _listeners = ()
+    # Optional callable telling whether an id was moved out to an archive
+    # (archive.Archives.holds); update(), delete() and put() refuse those.
+    archived = None
+
+    def subscribe(self, listener):
+        self._listeners = self._listeners + (listener,)
+
+    def unsubscribe(self, listener):
+        self._listeners = tuple(l for l in self._listeners if l is not listener)
+
+    def _notify(self, old, new):
+        for listener in self._listeners:
+            listener.apply(old, new)
+
+    def refresh(self):
+        """Pick up writes other processes made, telling listeners about them.
+
+        Reads do this themselves; derived state that is read without
+        touching the store (rollups) calls it first.
+        """
+
+    def __len__(self):
+        raise NotImplementedError
+
+    def all(self):
+        raise NotImplementedError
+
+    def get(self, expense_id):
+        raise NotImplementedError
+
+    def find(self, category=None, date_from=None, date_to=None, payment_method=None):
+        """Expenses matching every given filter; dates are inclusive YYYY-MM-DD bounds."""
+        raise NotImplementedError
+
+    def page(self, category=None, date_from=None, date_to=None, payment_method=None, limit=50, after=None):
+        """One page of matching expenses, newest first.
+
+        Ordering is by (date, id) descending; ``after`` is the (date, id) key
+        of the last row of the previous page. Returns (expenses, next_key);
+        next_key is None once the listing is exhausted (a backend may also
+        hand out a cursor whose page turns out empty).
+        """
+        raise NotImplementedError
+
+    def iterate(self, category=None, date_from=None, date_to=None, payment_method=None, batch_size=1000):
+        """Yield every matching expense, newest first, fetching batch_size rows at a time."""
+        after = None
+        while True:
+            expenses, after = self.page(category, date_from, date_to, payment_method,
+                                        limit=batch_size, after=after)
+            yield from expenses
+            if after is None:
+                return
+
+    def allocate_ids(self, count=1):
+        """Reserve count consecutive ids and return them as a range.
+
+        Ids come from a persisted sequence, so they are never handed out
+        twice, even after the highest expense is deleted or across restarts.
+        """
+        raise NotImplementedError
+
+    def add(self, data):
+        raise NotImplementedError
+
+    def add_many(self, expenses):
+        """Store a batch of validated expenses in one transaction, assigning new ids.
+
+        Returns the stored expenses with their ids.
+        """
+        raise NotImplementedError
+
+    def update(self, expense_id, data):
+        raise NotImplementedError
+
+    def delete(self, expense_id, updated_at=None):
+        """Delete an expense, leaving a tombstone stamped updated_at (default now)."""
+        raise NotImplementedError
+
+    def check_archived(self, expense_id):
+        """Raise ArchivedError if expense_id was moved out to an archive."""
+        if self.archived is not None and self.archived(expense_id):
+            raise ArchivedError(f"Expense {expense_id} is archived with its closed year and can no longer be changed")
+
+    def move_out(self, date_from, date_to, save):
+        """Drop the expenses dated date_from..date_to once save(expenses) has stored them elsewhere.
+
+        For closing a year (see archive.py). The store's write lock is held
+        from reading the expenses to dropping them, so no write in between
+        is lost. Unlike delete() this leaves no tombstone and bumps no
+        version: the expenses still exist, only not in this store. Listeners,
+        in every process, are told apply(expense, expense) for each, which
+        leaves state derived from archives and store alike as it was but
+        drops cached reads of the store (querycache). Returns the expenses
+        moved.
+        """
+        raise NotImplementedError
+
+    def put(self, expense):
+        """Insert or replace a validated expense under its own id.
+
+        Keeps the given updated_at, so a change synced from another device
+        carries that device's timestamp. Returns the stored expense.
+        """
+        raise NotImplementedError
+
+    def tombstone(self, expense_id):
+        """The tombstone of a deleted expense, or None."""
+        raise NotImplementedError
+
+    def changes(self, since=0, limit=1000):
+        """Up to limit changes with a version above since, oldest first.
+
+        A change is a stored expense, or a tombstone
+        ``{"id", "deleted": True, "updated_at", "version"}``. Only the
+        latest change per id is kept, so this scales with what changed since
+        the given version rather than with the history.
+        """
+        raise NotImplementedError
+
+    def last_version(self):
+        """Version of the most recent change, 0 for an empty store."""
+        raise NotImplementedError
+
+    def import_expenses(self, expenses):
+        """Store already-validated expenses as-is, keeping their ids.
+
+        Their updated_at is kept when present; versions are always new.
+        """
+        raise NotImplementedError
+
+    def flush(self):
+        """Fold pending writes into the main file so the store reopens quickly.
+
+        Writes are durable without it; this only shortens the next load.
+        """
+
+    def close(self):
+        pass
+
+
+def matches(expense, category=None, date_from=None, date_to=None, payment_method=None):
+    """True if an expense passes the find() filters."""
+    return ((category is None or expense['category'] == category)
+            and (payment_method is None or expense['payment_method'] == payment_method)
+            and (date_from is None or expense['date'] >= date_from)
+            and (date_to is None or expense['date'] <= date_to))
+
+
+class _Commit:
+    """One queued write; build() runs under the store's locks and returns (entries, result)."""
+
+    __slots__ = ('build', 'result', 'error', 'done')
+
+    def __init__(self, build):
+        self.build = build
+        self.result = None
+        self.error = None
+        self.done = False
+
+
+class JsonExpenseStore(ExpenseStore):
+    """Expenses held in memory by id, persisted as a snapshot plus a journal.
+
+    Every change is appended to ``<path>.journal`` as one JSON line and
+    fsynced before it is acknowledged, so a write costs one small append
+    instead of rewriting the whole file. The journal is folded into a
+    binary snapshot, ``<path>.snapshot`` (see snapshot.py), every
+    COMPACT_EVERY entries (more for big stores, see COMPACT_RATIO).
+    Startup maps the snapshot and replays only the journal written since.
+    The snapshot also holds the id and version sequences and the tombstones.
+
+    ``path`` itself (expenses.json, a plain JSON list) and ``<path>.meta``
+    are the format before snapshots: they are read when there is no
+    snapshot yet and left untouched after (expenses.json is the seed data
+    checked into the repo), since the snapshot, once written, wins.
+
+    In memory each expense is a compact records.Expense; reads hand out
+    dicts built from them, so callers may modify what they get.
+
+    Several processes (gunicorn workers) can share the files. Writers hold
+    an exclusive fcntl lock on ``<path>.lock`` and first replay whatever
+    other processes appended, so ids and versions never collide; readers
+    replay new journal lines before answering. Each compaction starts a new
+    journal whose first line carries a generation number, so a process can
+    tell it has moved on. Within a process, writes are group-committed:
+    writers queue up and one of them journals the whole queue with a single
+    fsync.
+    """
+
+    def __init__(self, path, compact_every=COMPACT_EVERY):
+        self.path = path
+        self.journal_path = path + '.journal'
+        self.meta_path = path + '.meta'
+        self.snapshot_path = path + '.snapshot'
+        self.lock_path = path + '.lock'
+        self.compact_every = compact_every
+        # Guards the in-memory state; the lock file guards the files across processes.
+        self._lock = threading.Lock()
+        # Group commit: the thread holding _leader writes everything in _queue.
+        self._queue = []
+        self._queue_lock = threading.Lock()
+        self._leader = threading.Lock()
+        self._lock_file = None
+        self._journal = None
+        self._journal_ino = None
+        self._pid = None
+        # fsyncs and entries journaled by this process, for benchmarks
+        self.commits = 0
+        self.committed_entries = 0
+        self._open()
+
+    # ------------------------------------------------------------------
+    # Loading and persistence
+    # ------------------------------------------------------------------
+    def _reset(self):
+        self._expenses = {}
+        # (date, id) of every expense, ascending, for keyset pagination
+        self._order = []
+        # id -> tombstone of every deleted expense
+        self._tombstones = {}
+        # (version, id) of every expense and tombstone, ascending, for changes()
+        self._log = []
+        self._version = 0
+        self._next_id = 1
+        self._generation = 0
+        # Journal entries applied (for compaction) and bytes read, in the open journal
+        self._journal_entries = 0
+        self._offset = 0
+        # After a failed compaction, entries to wait for before trying again
+        self._compact_at = 0
+
+    def _open(self):
+        """Open the files for this process and load everything from disk."""
+        self._pid = os.getpid()
+        # Descriptors inherited across a fork share their lock with the
+        # parent, so every process opens its own.
+        if self._lock_file is not None:
+            os.close(self._lock_file)
+        self._lock_file = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        with self._lock, self._locked(exclusive=True):
+            self._load()
+
+    def _check_fork(self):
+        if self._pid != os.getpid():
+            self._open()
+
+    @contextmanager
+    def _locked(self, exclusive):
+        """Hold the cross-process lock file, shared for readers or exclusive for writers."""
+        if fcntl is None:
+            yield
+            return
+        fcntl.flock(self._lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _load(self):
+        """Rebuild all state from the snapshot and journal (file lock held)."""
+        with paused_gc():
+            self._load_state()
+
+    def _load_state(self):
+        self._reset()
+        snapshot = os.path.exists(self.snapshot_path)
+        if snapshot:
+            snapshot = read_snapshot(self.snapshot_path)
+            self._next_id, self._version = snapshot.next_id, snapshot.version
+            self._tombstones = {t['id']: t for t in snapshot.tombstones}
+            self._expenses = dict(zip(map(itemgetter(0), snapshot.expenses), snapshot.expenses))
+            # The snapshot carries the sort orders; the journal tail updates them.
+            self._order, self._log = snapshot.order, snapshot.log
+        else:
+            self._load_json()
+        if not os.path.exists(self.journal_path):
+            self._start_journal(0)
+        self._open_journal()
+        self._read_journal(index=bool(snapshot), notify=False)
+        if not snapshot:
+            # The sort orders are built once after replay, not per entry.
+            self._reindex()
+        # Snapshots written before the sequences existed carry no meta file.
+        self._next_id = max(self._next_id, max(self._expenses, default=0) + 1)
+
+    def _load_json(self):
+        """Load the JSON snapshot and meta file kept before binary snapshots."""
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path, encoding='utf-8') as f:
+                meta = json.load(f)
+            self._next_id = meta['next_id']
+            self._version = meta.get('version', 0)
+            self._tombstones = {t['id']: t for t in meta.get('tombstones', ())}
+        if os.path.exists(self.path):
+            with open(self.path, encoding='utf-8') as f:
+                for expense in json.load(f):
+                    if 'version' not in expense:
+                        # Written before versions existed: every such row is version 1.
+                        expense['version'] = 1
+                        expense['updated_at'] = expense.get('created_at') or ''
+                    self._expenses[expense['id']] = Expense.from_dict(expense)
+                    self._version = max(self._version, expense['version'])
+
+    def _open_journal(self, fd=None):
+        """Switch to the journal now at journal_path (or the given descriptor of it)."""
+        if self._journal is not None:
+            os.close(self._journal)
+        self._journal = os.open(self.journal_path, os.O_RDWR | os.O_APPEND) if fd is None else fd
+        self._journal_ino = os.fstat(self._journal).st_ino
+        self._offset = 0
+        self._journal_entries = 0
+        self._compact_at = 0
+
+    def _reindex(self, touched=None):
+        """Rebuild the sort orders, or only the entries of the touched ids.
+
+        With touched, the untouched entries keep their order and the new
+        ones are sorted and merged in (timsort merges two sorted runs in
+        linear time), so a journal tail over a big snapshot costs a pass
+        over the lists rather than rebuilding every key.
+        """
+        if touched is None:
+            self._order = sorted((e.date, e.id) for e in self._expenses.values())
+            self._log = sorted([(e.version, e.id) for e in self._expenses.values()]
+                               + [(t['version'], t['id']) for t in self._tombstones.values()])
+            return
+        expenses = [e for e in map(self._expenses.get, touched) if e is not None]
+        tombstones = [t for t in map(self._tombstones.get, touched) if t is not None]
+        order = [key for key in self._order if key[1] not in touched]
+        order.extend(sorted((e.date, e.id) for e in expenses))
+        order.sort()
+        log = [key for key in self._log if key[1] not in touched]
+        log.extend(sorted([(e.version, e.id) for e in expenses] + [(t['version'], t['id']) for t in tombstones]))
+        log.sort()
+        self._order, self._log = order, log
+
+    def _bulk(self, count):
+        return count * REINDEX_RATIO > len(self._expenses)
+
+    def _start_journal(self, generation):
+        """Atomically replace the journal with an empty one of the given generation."""
+        tmp_path = self.journal_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps({"op": "generation", "generation": generation}) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.journal_path)
+
+    def _read_journal(self, index=True, notify=True):
+        """Apply journal lines appended since the last read.
+
+        With index the sort orders are kept up to date (and listeners
+        notified, if notify); without, the caller reindexes afterwards.
+        """
+        size = os.fstat(self._journal).st_size
+        if size <= self._offset:
+            return
+        data = os.pread(self._journal, size - self._offset, self._offset)
+        reindex = index and self._bulk(data.count(b'\n'))
+        changes, touched = [], set()
+        for line in data.splitlines(keepends=True):
+            if not line.endswith(b'\n'):
+                # A torn final line from a crash mid-append; the next writer truncates it.
+                break
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                break
+            self._offset += len(line)
+            if entry['op'] == 'generation':
+                self._generation = entry['generation']
+                continue
+            self._journal_entries += 1
+            for change in self._apply(entry, index and not reindex):
+                if reindex:
+                    touched.add((change[1] or change[0]).id)
+                if index and notify:
+                    changes.append(change)
+        if reindex:
+            self._reindex(touched)
+        self._announce(changes)
+
+    def _catch_up(self):
+        """Replay what other processes wrote since this one last looked (file lock held)."""
+        self._read_journal()
+        if os.stat(self.journal_path).st_ino == self._journal_ino:
+            return
+        # Another process compacted. The old journal was read to its end
+        # above, and the new one must be the very next generation;
+        # otherwise a whole journal was missed and only the snapshot has it.
+        journal = os.open(self.journal_path, os.O_RDWR | os.O_APPEND)
+        header = os.pread(journal, 256, 0).split(b'\n', 1)[0]
+        try:
+            generation = json.loads(header)['generation']
+        except (ValueError, KeyError):
+            generation = None
+        if generation != self._generation + 1:
+            os.close(journal)
+            self._reload()
+            return
+        self._open_journal(journal)
+        self._read_journal()
+
+    def _reload(self, notify=True):
+        """Reload from disk, telling listeners about every expense that differs."""
+        old = self._expenses
+        self._load()
+        if not notify:
+            return
+        for expense_id in old.keys() | self._expenses.keys():
+            before, after = old.get(expense_id), self._expenses.get(expense_id)
+            if before != after:
+                self._announce([(before, after)])
+
+    def refresh(self):
+        self._refresh()
+
+    def _refresh(self):
+        """Pick up writes made by other processes; a stat() when there are none."""
+        self._check_fork()
+        try:
+            st = os.stat(self.journal_path)
+        except FileNotFoundError:
+            return
+        if st.st_size == self._offset and st.st_ino == self._journal_ino:
+            return
+        with self._lock, self._locked(exclusive=False):
+            self._catch_up()
+
+    def _apply(self, entry, index=True):
+        """Apply a journal entry to the in-memory state, updating the indexes if index.
+
+        Returns the (old, new) changes as records for _announce().
+        """
+        if entry['op'] == 'put':
+            if 'version' not in entry['expense']:
+                # Journaled before versions existed.
+                entry['expense']['version'] = self._version + 1
+                entry['expense']['updated_at'] = entry['expense'].get('created_at') or ''
+            expense = Expense.from_dict(entry['expense'])
+            old = self._expenses.get(expense.id)
+            self._expenses[expense.id] = expense
+            tombstone = self._tombstones.pop(expense.id, None)
+            if expense.id >= self._next_id:
+                self._next_id = expense.id + 1
+            self._version = max(self._version, expense.version)
+            if index:
+                if old is not None:
+                    self._unindex(old)
+                if tombstone is not None:
+                    self._unlog(tombstone)
+                bisect.insort(self._order, (expense.date, expense.id))
+                self._log.append((expense.version, expense.id))
+            return [(old, expense)]
+        elif entry['op'] == 'delete':
+            old = self._expenses.pop(entry['id'], None)
+            if old is None:
+                return []
+            tombstone = {"id": entry['id'], "deleted": True, "updated_at": entry.get('updated_at', ''),
+                         "version": entry.get('version', self._version + 1)}
+            self._tombstones[entry['id']] = tombstone
+            self._version = max(self._version, tombstone['version'])
+            if index:
+                self._unindex(old)
+                self._log.append((tombstone['version'], tombstone['id']))
+            return [(old, None)]
+        elif entry['op'] == 'evict':
+            evicted = [expense for expense in (self._expenses.pop(expense_id, None) for expense_id in entry['ids'])
+                       if expense is not None]
+            gone = {expense.id for expense in evicted}
+            if gone:
+                # Evictions come in bulk: one pass over each sort order. Done
+                # even without index, as a touched-only reindex keeps the
+                # keys of ids it was not told about.
+                self._order = [key for key in self._order if key[1] not in gone]
+                self._log = [key for key in self._log if key[1] not in gone]
+            # Moved out unchanged (see ExpenseStore.move_out).
+            return [(expense, expense) for expense in evicted]
+        elif entry['op'] == 'ids':
+            self._next_id = max(self._next_id, entry['next_id'])
+        return []
+
+    def _unindex(self, expense):
+        del self._order[bisect.bisect_left(self._order, (expense.date, expense.id))]
+        del self._log[bisect.bisect_left(self._log, (expense.version, expense.id))]
+
+    def _unlog(self, tombstone):
+        del self._log[bisect.bisect_left(self._log, (tombstone['version'], tombstone['id']))]
+
+    def _announce(self, changes):
+        """Tell listeners about (old, new) record changes, as the dicts reads return."""
+        if not self._listeners:
+            return
+        for old, new in changes:
+            self._notify(old and old.to_dict(), new and new.to_dict())
+
+    def _stamp(self, expenses):
+        """Give each expense the next version (in order) and, if missing, updated_at."""
+        now = timestamp()
+        return [{**expense, "updated_at": expense.get('updated_at') or now, "version": self._version + 1 + i}
+                for i, expense in enumerate(expenses)]
+
+    def _write(self, build):
+        """Journal the entries from build() durably and return its result.
+
+        build runs with every lock held and sees all earlier writes, from
+        this process or others. Writers that arrive while a commit is in
+        progress queue up; the next thread to become leader journals the
+        whole queue with one write and one fsync.
+        """
+        commit = _Commit(build)
+        with self._queue_lock:
+            self._queue.append(commit)
+        with self._leader:
+            if not commit.done:
+                with self._queue_lock:
+                    batch, self._queue = self._queue, []
+                self._commit(batch)
+        if commit.error is not None:
+            raise commit.error
+        return commit.result
+
+    def _commit(self, batch):
+        self._check_fork()
+        try:
+            with self._lock:
+                with self._locked(exclusive=True):
+                    self._catch_up()
+                    if os.fstat(self._journal).st_size > self._offset:
+                        # Drop a torn entry left by a crashed writer before appending after it.
+                        os.ftruncate(self._journal, self._offset)
+                    entries, changes, chunks = [], [], []
+                    for commit in batch:
+                        applied = False
+                        try:
+                            built, result = commit.build()
+                            chunk = ''.join(json.dumps(entry) + '\n' for entry in built).encode('utf-8')
+                            reindex = self._bulk(len(built))
+                            touched, built_changes = set(), []
+                            applied = True
+                            for entry in built:
+                                for change in self._apply(entry, index=not reindex):
+                                    built_changes.append(change)
+                                    touched.add((change[1] or change[0]).id)
+                            if reindex:
+                                self._reindex(touched)
+                        except Exception as e:
+                            commit.error = e
+                            if applied:
+                                # Undo whatever part of this commit was applied: back
+                                # to what is on disk, plus the batch's earlier commits.
+                                self._reload(notify=False)
+                                for entry in entries:
+                                    self._apply(entry)
+                            continue
+                        commit.result = result
+                        entries.extend(built)
+                        changes.extend(built_changes)
+                        chunks.append(chunk)
+                    if not entries:
+                        return
+                    data = b''.join(chunks)
+                    try:
+                        written = 0
+                        while written < len(data):
+                            written += os.write(self._journal, data[written:])
+                    except OSError as e:
+                        # Nothing was acknowledged: cut the journal back and forget
+                        # the batch, which listeners have not been told about.
+                        os.ftruncate(self._journal, self._offset)
+                        self._reload(notify=False)
+                        for commit in batch:
+                            commit.error = commit.error or e
+                        return
+                    self._offset += len(data)
+                    self._journal_entries += len(entries)
+                # Other processes may append while this one waits for the disk.
+                # fsync flushes the whole file, so workers committing at the
+                # same time share it, and their later entries never reach the
+                # disk ahead of these.
+                try:
+                    os.fsync(self._journal)
+                except OSError as e:
+                    for commit in batch:
+                        commit.error = commit.error or e
+                    return
+                self.commits += 1
+                self.committed_entries += len(entries)
+                self._announce(changes)
+                if self._journal_entries >= max(self.compact_every, len(self._expenses) * COMPACT_RATIO,
+                                                self._compact_at):
+                    self._compact_after_commit()
+        finally:
+            for commit in batch:
+                commit.done = True
+
+    def _compact_after_commit(self):
+        """Compact once the journal is long enough (self._lock held).
+
+        The batch that got it there is already durable and announced, so a
+        failure here is only logged; compaction is retried once the journal
+        has doubled.
+        """
+        try:
+            with self._locked(exclusive=True):
+                self._catch_up()
+                self._compact()
+        except Exception:
+            log.exception("Compacting %s failed", self.snapshot_path)
+            self._compact_at = 2 * self._journal_entries
+
+    def _compact(self):
+        """Fold the journal into the snapshot (both locks held)."""
+        with paused_gc():
+            write_snapshot(self.snapshot_path, map(self._expenses.__getitem__, map(itemgetter(1), self._order)),
+                           self._tombstones.values(), self._log, self._next_id, self._version)
+        # Replace the journal only after the new snapshot is safely in place.
+        # Replaying the old journal over the new snapshot is harmless, so a
+        # crash in between loses nothing.
+        self._start_journal(self._generation + 1)
+        self._open_journal()
+        self._read_journal()
+
+    def compact(self):
+        """Fold the journal into the JSON snapshot."""
+        self._check_fork()
+        with self._leader, self._lock, self._locked(exclusive=True):
+            self._catch_up()
+            self._compact()
+
+    def flush(self):
+        """Compact if the journal holds anything since the last snapshot."""
+        self._check_fork()
+        with self._leader, self._lock, self._locked(exclusive=True):
+            self._catch_up()
+            if self._journal_entries:
+                self._compact()
+
+    def close(self):
+        with self._lock:
+            for fd in (self._journal, self._lock_file):
+                if fd is not None and self._pid == os.getpid():
+                    os.close(fd)
+            self._journal = self._lock_file = None
+
+    # ------------------------------------------------------------------
+    # CRUD
+    # ------------------------------------------------------------------
+    def __len__(self):
+        self._refresh()
+        return len(self._expenses)
+
+    def all(self):
+        self._refresh()
+        return [e.to_dict() for e in list(self._expenses.values())]
+
+    def get(self, expense_id):
+        self._refresh()
+        expense = self._expenses.get(expense_id)
+        return expense and expense.to_dict()
+
+    def find(self, category=None, date_from=None, date_to=None, payment_method=None):
+        self._refresh()
+        return [e.to_dict() for e in list(self._expenses.values())
+                if e.matches(category, date_from, date_to, payment_method)]
+
+    def page(self, category=None, date_from=None, date_to=None, payment_method=None, limit=50, after=None):
+        self._refresh()
+        order = self._order
+        # Start just below the cursor (or the upper date bound) and walk towards older keys.
+        if after is not None:
+            i = bisect.bisect_left(order, after)
+        elif date_to is not None:
+            # inf sorts after any id, so every expense on date_to is included.
+            i = bisect.bisect_right(order, (date_to, float('inf')))
+        else:
+            i = len(order)
+        expenses = []
+        while i > 0 and len(expenses) < limit:
+            i -= 1
+            date, expense_id = order[i]
+            if date_from is not None and date < date_from:
+                i = 0
+                break
+            expense = self._expenses[expense_id]
+            if expense.matches(category, date_from, date_to, payment_method):
+                expenses.append(expense.to_dict())
+        next_key = None
+        if len(expenses) == limit and i > 0:
+            last = expenses[-1]
+            next_key = (last['date'], last['id'])
+        return expenses, next_key
+
+    def tombstone(self, expense_id):
+        self._refresh()
+        return self._tombstones.get(expense_id)
+
+    def changes(self, since=0, limit=1000):
+        self._refresh()
+        with self._lock:
+            # inf sorts after any id, so every change at version since is skipped.
+            start = bisect.bisect_right(self._log, (since, float('inf')))
+            changes = []
+            for _, expense_id in self._log[start:start + limit]:
+                expense = self._expenses.get(expense_id)
+                changes.append(expense.to_dict() if expense is not None else self._tombstones[expense_id])
+            return changes
+
+    def last_version(self):
+        self._refresh()
+        return self._version
+
+    def allocate_ids(self, count=1):
+        def build():
+            start = self._next_id
+            return [{"op": "ids", "next_id": start + count}], range(start, start + count)
+        return self._write(build)
+
+    def add(self, data):
+        expense = validate_expense(data)
+
+        def build():
+            # The put itself advances the sequence, on replay as well.
+            [stored] = self._stamp([{"id": self._next_id, **expense}])
+            return [{"op": "put", "expense": stored}], stored
+        return self._write(build)
+
+    def add_many(self, expenses):
+        def build():
+            stored = self._stamp([{"id": self._next_id + i, **expense} for i, expense in enumerate(expenses)])
+            return [{"op": "put", "expense": expense} for expense in stored], stored
+        return self._write(build)
+
+    def update(self, expense_id, data):
+        def build():
+            existing = self._expenses.get(expense_id)
+            if existing is None:
+                self.check_archived(expense_id)
+                return [], None
+            [expense] = self._stamp([{"id": expense_id, **validate_expense(data, existing.to_dict())}])
+            return [{"op": "put", "expense": expense}], expense
+        return self._write(build)
+
+    def delete(self, expense_id, updated_at=None):
+        def build():
+            if expense_id not in self._expenses:
+                self.check_archived(expense_id)
+                return [], False
+            return [{"op": "delete", "id": expense_id,
+                     "updated_at": updated_at or timestamp(), "version": self._version + 1}], True
+        return self._write(build)
+
+    def move_out(self, date_from, date_to, save):
+        def build():
+            order = self._order
+            start = bisect.bisect_left(order, (date_from,))
+            end = bisect.bisect_right(order, (date_to, float('inf')))
+            moved = [self._expenses[expense_id].to_dict() for _, expense_id in order[start:end]]
+            if not moved:
+                return [], moved
+            save(moved)
+            return [{"op": "evict", "ids": [expense['id'] for expense in moved]}], moved
+        return self._write(build)
+
+    def put(self, expense):
+        def build():
+            if expense['id'] not in self._expenses:
+                self.check_archived(expense['id'])
+            [stored] = self._stamp([expense])
+            return [{"op": "put", "expense": stored}], stored
+        return self._write(build)
+
+    def import_expenses(self, expenses):
+        expenses = list(expenses)
+        if not expenses:
+            return
+
+        def build():
+            return [{"op": "put", "expense": expense} for expense in self._stamp(expenses)], None
+        self._write(build)
+
+
+class SQLiteExpenseStore(ExpenseStore):
+    """Expenses in a SQLite database in WAL mode.
+
+    Each thread gets its own connection (reopened after a gunicorn fork),
+    statements are fixed SQL strings so sqlite3 reuses its prepared
+    statement cache, and the filters used by the UI are served by B-tree
+    indexes on date, category and payment_method.
+
+    Every write also appends (old, new) rows as JSON to change_log, in the
+    same transaction, and listeners hear about changes only by reading
+    that log: after this process's own writes, and from refresh() when
+    PRAGMA data_version says another connection committed. So derived
+    state in each gunicorn worker sees every worker's writes, in commit
+    order. Each store records how far it has read in log_readers; entries
+    every live reader has passed are deleted.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS expenses (
+            id INTEGER PRIMARY KEY,
+            item TEXT NOT NULL,
+            amount REAL NOT NULL,
+            category TEXT NOT NULL,
+            date TEXT NOT NULL,
+            payment_method TEXT NOT NULL,
+            notes TEXT NOT NULL DEFAULT '',
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL DEFAULT '',
+            version INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE INDEX IF NOT EXISTS idx_expenses_date ON expenses (date, id);
+        CREATE INDEX IF NOT EXISTS idx_expenses_category ON expenses (category, date, id);
+        CREATE INDEX IF NOT EXISTS idx_expenses_payment ON expenses (payment_method, date, id);
+        CREATE TABLE IF NOT EXISTS tombstones (
+            id INTEGER PRIMARY KEY,
+            updated_at TEXT NOT NULL,
+            version INTEGER NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_tombstones_version ON tombstones (version);
+        CREATE TABLE IF NOT EXISTS sequences (
+            name TEXT PRIMARY KEY,
+            next_id INTEGER NOT NULL
+        );
+        INSERT OR IGNORE INTO sequences (name, next_id)
+            SELECT 'expenses', COALESCE(MAX(id), 0) + 1 FROM expenses;
+    """
+
+    # Run after SCHEMA and the column upgrade in _upgrade().
+    VERSION_SCHEMA = """
+        CREATE INDEX IF NOT EXISTS idx_expenses_version ON expenses (version);
+        INSERT OR IGNORE INTO sequences (name, next_id)
+            SELECT 'changes', COALESCE(MAX(version), 0) + 1 FROM expenses;
+        CREATE TABLE IF NOT EXISTS change_log (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            old TEXT,
+            new TEXT
+        );
+        CREATE TABLE IF NOT EXISTS log_readers (
+            reader TEXT PRIMARY KEY,
+            pid INTEGER NOT NULL,
+            seq INTEGER NOT NULL
+        );
+    """
+
+    COLUMNS = ", ".join(EXPENSE_FIELDS + SYNC_FIELDS)
+    SELECT_ONE = f"SELECT {COLUMNS} FROM expenses WHERE id = ?"
+    INSERT = (f"INSERT INTO expenses ({COLUMNS}) "
+              f"VALUES (:id, :item, :amount, :category, :date, :payment_method, :notes, :created_at, "
+              f":updated_at, :version)")
+    PUT = INSERT.replace("INSERT", "INSERT OR REPLACE", 1)
+    UPDATE = ("UPDATE expenses SET item = :item, amount = :amount, category = :category, date = :date, "
+              "payment_method = :payment_method, notes = :notes, created_at = :created_at, "
+              "updated_at = :updated_at, version = :version WHERE id = :id")
+    DELETE = "DELETE FROM expenses WHERE id = ?"
+    BURY = "INSERT OR REPLACE INTO tombstones (id, updated_at, version) VALUES (?, ?, ?)"
+    UNBURY = "DELETE FROM tombstones WHERE id = ?"
+    SELECT_TOMBSTONE = "SELECT id, 1 AS deleted, updated_at, version FROM tombstones WHERE id = ?"
+    # One statement, so both tables are read from the same snapshot.
+    CHANGES = (f"SELECT {COLUMNS}, 0 AS deleted FROM expenses WHERE version > :since "
+               f"UNION ALL SELECT id, NULL, NULL, NULL, NULL, NULL, NULL, NULL, updated_at, version, 1 "
+               f"FROM tombstones WHERE version > :since ORDER BY version LIMIT :limit")
+    ALLOCATE = "UPDATE sequences SET next_id = next_id + ? WHERE name = ? RETURNING next_id"
+    ADVANCE = "UPDATE sequences SET next_id = MAX(next_id, ?) WHERE name = 'expenses'"
+    LAST_VERSION = "SELECT next_id - 1 FROM sequences WHERE name = 'changes'"
+    LOG = "INSERT INTO change_log (old, new) VALUES (?, ?)"
+    READ_LOG = "SELECT seq, old, new FROM change_log WHERE seq > ? ORDER BY seq"
+    LAST_LOGGED = "SELECT COALESCE(MAX(seq), 0) FROM change_log"
+    READERS = "SELECT reader, pid FROM log_readers"
+    FORGET_READER = "DELETE FROM log_readers WHERE reader = ?"
+    SAVE_READER = "INSERT OR REPLACE INTO log_readers (reader, pid, seq) VALUES (?, ?, ?)"
+    PRUNE_LOG = "DELETE FROM change_log WHERE seq <= (SELECT MIN(seq) FROM log_readers)"
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self._pid = os.getpid()
+        # Serializes reading change_log, so listeners see it once and in order
+        self._log_lock = threading.Lock()
+        self._reader = None
+        self._forked = False
+        self._log_seq = self._saved_seq = 0
+        conn = self._conn()
+        conn.executescript(self.SCHEMA)
+        self._upgrade(conn)
+        conn.executescript(self.VERSION_SCHEMA)
+        self._register(conn, start=True)
+
+    @staticmethod
+    def _upgrade(conn):
+        """Add the sync columns to a database created before they existed."""
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(expenses)")}
+        if 'version' in columns:
+            return
+        with conn:
+            conn.execute("ALTER TABLE expenses ADD COLUMN updated_at TEXT NOT NULL DEFAULT ''")
+            conn.execute("ALTER TABLE expenses ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+            # Like legacy JSON snapshots: every existing row is version 1.
+            conn.execute("UPDATE expenses SET updated_at = created_at, version = 1")
+
+    def _conn(self):
+        if self._pid != os.getpid():
+            # Forked into a new worker: inherited connections must not be used.
+            self._local = threading.local()
+            self._connections = []
+            self._pid = os.getpid()
+            self._log_lock = threading.Lock()
+            self._forked = True
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, cached_statements=256)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            # 64 MiB page cache keeps the index B-trees hot during bulk inserts.
+            conn.execute("PRAGMA cache_size=-65536")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+            if self._forked:
+                # A forked worker carries on from where its parent had read to.
+                self._forked = False
+                self._register(conn)
+        return conn
+
+    def _register(self, conn, start=False):
+        """Record this process as a change_log reader (from the end of the log if start)."""
+        self._reader = f'{os.getpid()}:{os.urandom(8).hex()}'
+        with conn:
+            if start:
+                conn.execute("BEGIN IMMEDIATE")
+                self._log_seq = conn.execute(self.LAST_LOGGED).fetchone()[0]
+            conn.execute(self.SAVE_READER, (self._reader, os.getpid(), self._log_seq))
+        self._saved_seq = self._log_seq
+
+    def _log(self, conn, changes):
+        """Append (old, new) pairs to change_log inside the caller's transaction."""
+        conn.executemany(self.LOG, ((old and json.dumps(old), new and json.dumps(new)) for old, new in changes))
+
+    def _catch_up(self):
+        """Tell listeners about every change logged since the last call, by any process."""
+        conn = self._conn()
+        with self._log_lock:
+            if self._listeners:
+                for seq, old, new in conn.execute(self.READ_LOG, (self._log_seq,)).fetchall():
+                    self._notify(old and json.loads(old), new and json.loads(new))
+                    self._log_seq = seq
+            else:
+                self._log_seq = max(self._log_seq, conn.execute(self.LAST_LOGGED).fetchone()[0])
+            if self._log_seq - self._saved_seq >= LOG_SAVE_EVERY:
+                self._save_position(conn)
+
+    def _save_position(self, conn):
+        """Record how far this store has read, and drop entries every live reader has passed."""
+        dead = [(reader,) for reader, pid in conn.execute(self.READERS) if not pid_alive(pid)]
+        with conn:
+            conn.executemany(self.FORGET_READER, dead)
+            conn.execute(self.SAVE_READER, (self._reader, os.getpid(), self._log_seq))
+            conn.execute(self.PRUNE_LOG)
+        self._saved_seq = self._log_seq
+
+    def refresh(self):
+        conn = self._conn()
+        data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+        if data_version != getattr(self._local, 'data_version', None):
+            self._local.data_version = data_version
+            self._catch_up()
+
+    def __len__(self):
+        return self._conn().execute("SELECT COUNT(*) FROM expenses").fetchone()[0]
+
+    def all(self):
+        rows = self._conn().execute(f"SELECT {self.COLUMNS} FROM expenses ORDER BY id")
+        return [dict(row) for row in rows]
+
+    def get(self, expense_id):
+        row = self._conn().execute(self.SELECT_ONE, (expense_id,)).fetchone()
+        return dict(row) if row else None
+
+    @staticmethod
+    def _where(category, date_from, date_to, payment_method, after=None):
+        clauses, params = [], []
+        for column, op, value in (("category", "=", category), ("payment_method", "=", payment_method),
+                                  ("date", ">=", date_from), ("date", "<=", date_to)):
+            if value is not None:
+                clauses.append(f"{column} {op} ?")
+                params.append(value)
+        if after is not None:
+            # Row-value comparison keeps this a range scan on the (..., date, id) indexes.
+            clauses.append("(date, id) < (?, ?)")
+            params.extend(after)
+        return (f" WHERE {' AND '.join(clauses)}" if clauses else ""), params
+
+    def find(self, category=None, date_from=None, date_to=None, payment_method=None):
+        where, params = self._where(category, date_from, date_to, payment_method)
+        rows = self._conn().execute(f"SELECT {self.COLUMNS} FROM expenses{where} ORDER BY date, id", params)
+        return [dict(row) for row in rows]
+
+    def page(self, category=None, date_from=None, date_to=None, payment_method=None, limit=50, after=None):
+        where, params = self._where(category, date_from, date_to, payment_method, after)
+        rows = self._conn().execute(
+            f"SELECT {self.COLUMNS} FROM expenses{where} ORDER BY date DESC, id DESC LIMIT ?",
+            params + [limit + 1]).fetchall()
+        expenses = [dict(row) for row in rows[:limit]]
+        next_key = None
+        if len(rows) > limit:
+            next_key = (expenses[-1]['date'], expenses[-1]['id'])
+        return expenses, next_key
+
+    def _allocate(self, conn, count, sequence='expenses'):
+        """Claim count ids (or versions) inside the caller's transaction."""
+        end = conn.execute(self.ALLOCATE, (count, sequence)).fetchone()[0]
+        return range(end - count, end)
+
+    def _stamp(self, conn, expenses):
+        """Give each expense a new version (in order) and, if missing, updated_at.
+
+        Writers hold SQLite's write lock from their first statement until
+        commit, so versions become visible in the order they were allocated
+        and changes() never skips one that commits late.
+        """
+        now = timestamp()
+        versions = self._allocate(conn, len(expenses), 'changes')
+        return [{**expense, "updated_at": expense.get('updated_at') or now, "version": version}
+                for expense, version in zip(expenses, versions)]
+
+    def tombstone(self, expense_id):
+        row = self._conn().execute(self.SELECT_TOMBSTONE, (expense_id,)).fetchone()
+        return {**dict(row), "deleted": True} if row else None
+
+    def changes(self, since=0, limit=1000):
+        rows = self._conn().execute(self.CHANGES, {"since": since, "limit": limit})
+        changes = []
+        for row in rows:
+            if row['deleted']:
+                changes.append({"id": row['id'], "deleted": True,
+                                "updated_at": row['updated_at'], "version": row['version']})
+            else:
+                change = dict(row)
+                del change['deleted']
+                changes.append(change)
+        return changes
+
+    def last_version(self):
+        return self._conn().execute(self.LAST_VERSION).fetchone()[0]
+
+    def allocate_ids(self, count=1):
+        conn = self._conn()
+        with conn:
+            return self._allocate(conn, count)
+
+    def add(self, data):
+        expense = validate_expense(data)
+        conn = self._conn()
+        with conn:
+            [expense] = self._stamp(conn, [{"id": self._allocate(conn, 1)[0], **expense}])
+            conn.execute(self.INSERT, expense)
+            self._log(conn, [(None, expense)])
+        self._catch_up()
+        return expense
+
+    def add_many(self, expenses):
+        conn = self._conn()
+        with conn:
+            ids = self._allocate(conn, len(expenses))
+            stored = self._stamp(conn, [{"id": expense_id, **expense} for expense_id, expense in zip(ids, expenses)])
+            conn.executemany(self.INSERT, stored)
+            self._log(conn, ((None, expense) for expense in stored))
+        self._catch_up()
+        return stored
+
+    def update(self, expense_id, data):
+        conn = self._conn()
+        with conn:
+            # Take the write lock before reading, so the logged old row is the one replaced.
+            conn.execute("BEGIN IMMEDIATE")
+            existing = self.get(expense_id)
+            if existing is None:
+                self.check_archived(expense_id)
+                return None
+            [expense] = self._stamp(conn, [{"id": expense_id, **validate_expense(data, existing)}])
+            conn.execute(self.UPDATE, expense)
+            self._log(conn, [(existing, expense)])
+        self._catch_up()
+        return expense
+
+    def delete(self, expense_id, updated_at=None):
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            existing = self.get(expense_id)
+            if existing is None:
+                self.check_archived(expense_id)
+                return False
+            conn.execute(self.DELETE, (expense_id,))
+            [version] = self._allocate(conn, 1, 'changes')
+            conn.execute(self.BURY, (expense_id, updated_at or timestamp(), version))
+            self._log(conn, [(existing, None)])
+        self._catch_up()
+        return True
+
+    def move_out(self, date_from, date_to, save):
+        where, params = self._where(None, date_from, date_to, None)
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute(f"SELECT {self.COLUMNS} FROM expenses{where} ORDER BY date, id", params)
+            moved = [dict(row) for row in rows]
+            if moved:
+                save(moved)
+                conn.executemany(self.DELETE, ((expense['id'],) for expense in moved))
+                self._log(conn, [(expense, expense) for expense in moved])
+        self._catch_up()
+        return moved
+
+    def put(self, expense):
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            existing = self.get(expense['id'])
+            if existing is None:
+                self.check_archived(expense['id'])
+            [expense] = self._stamp(conn, [expense])
+            conn.execute(self.PUT, expense)
+            conn.execute(self.UNBURY, (expense['id'],))
+            conn.execute(self.ADVANCE, (expense['id'] + 1,))
+            self._log(conn, [(existing, expense)])
+        self._catch_up()
+        return expense
+
+    def import_expenses(self, expenses):
+        expenses = list(expenses)
+        if not expenses:
+            return
+        conn = self._conn()
+        with conn:
+            expenses = self._stamp(conn, expenses)
+            conn.executemany(self.INSERT, expenses)
+            conn.execute(self.ADVANCE, (max(e['id'] for e in expenses) + 1,))
+            self._log(conn, ((None, expense) for expense in expenses))
+        self._catch_up()
+
+    def flush(self):
+        """Checkpoint the WAL into the database file."""
+        self._conn().execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def close(self):
+        if self._reader is not None:
+            with self._conn() as conn:
+                conn.execute(self.FORGET_READER, (self._reader,))
+            self._reader = None
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections = []
+        self._local = threading.local()
+
+
+def open_store(backend=None, path=None):
+    """Open the configured storage backend.
+
+    The backend comes from EXPENSE_STORE ("json" or "sqlite") and the file
+    from EXPENSES_FILE / EXPENSES_DB unless given explicitly.
+    """
+    backend = backend or os.environ.get('EXPENSE_STORE', 'json')
+    here = os.path.dirname(os.path.abspath(__file__))
+    if backend == 'json':
+        return JsonExpenseStore(path or os.environ.get('EXPENSES_FILE', os.path.join(here, 'expenses.json')))
+    if backend == 'sqlite':
+        return SQLiteExpenseStore(path or os.environ.get('EXPENSES_DB', os.path.join(here, 'expenses.db')))
+    raise ValueError(f"Unknown storage backend: {backend}")
+
+
+def migrate_json_to_sqlite(json_path, db_path, batch_size=10000):
+    """Copy every expense from a JSON store into a SQLite database, keeping ids."""
+    source = JsonExpenseStore(json_path)
+    target = SQLiteExpenseStore(db_path)
+    expenses = source.all()
+    for start in range(0, len(expenses), batch_size):
+        target.import_expenses([{field: e.get(field, '') for field in EXPENSE_FIELDS + ['updated_at']}
+                                for e in expenses[start:start + batch_size]])
+    count = len(target)
+    source.close()
+    target.close()
+    return count
+
+
+if __name__ == '__main__':
+    # python storage.py migrate [expenses.json] [expenses.db]
+    if len(sys.argv) >= 2 and sys.argv[1] == 'migrate':
+        json_path = sys.argv[2] if len(sys.argv) > 2 else 'expenses.json'
+        db_path = sys.argv[3] if len(sys.argv) > 3 else 'expenses.db'
+        print(f'Migrated {migrate_json_to_sqlite(json_path, db_path)} expenses into {db_path}')
+    else:
+        print('usage: python storage.py migrate [expenses.json] [expenses.db]')
+        sys.exit(2)
@@ -0,0 +1,123 @@
+# sync.py - Delta sync between browser localStorage and the server store
+#
+# Every write to the store is stamped with a version from one increasing
+# sequence, and deletes leave tombstones (see storage.ExpenseStore.changes),
+# so a device that last synced at version N only downloads what changed
+# after N. A device uploads its own edits since its last sync in the same
+# request. Conflicts are settled per expense, last writer wins on
+# updated_at (falling back to created_at for rows that were never edited).
+import threading
+from datetime import datetime, timezone
+
+from storage import EXPENSE_FIELDS, ValidationError, check_text, validate_expense
+
+# Changes returned per response; the client asks again while has_more is set
+SYNC_PAGE_SIZE = 1000
+
+# Changes accepted per request
+MAX_PUSH = 5000
+
+# Merges read-compare-write the store, so a worker applies one push at a time.
+_merge_lock = threading.Lock()
+
+
+def parse_timestamp(value):
+    """An aware datetime for an ISO timestamp; naive ones are taken as UTC.
+
+    Accepts both the browser's toISOString() "Z" suffix and Python's
+    isoformat(). Missing or malformed timestamps sort before everything.
+    """
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except (AttributeError, ValueError):
+        return datetime.min.replace(tzinfo=timezone.utc)
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def changed_at(record):
+    return parse_timestamp(record.get('updated_at') or record.get('created_at'))
+
+
+def merge(store, change):
+    """Apply one client change to the store if it wins.
+
+    Returns (record, new_id, applied): the server's copy of the expense
+    afterwards (an expense, a tombstone or None), the id the server
+    assigned when the client's id already belonged to a different expense,
+    and whether the client's change was written. Raises ValidationError
+    for malformed changes, and ArchivedError for changes to expenses moved
+    into a closed year's archive.
+    """
+    expense_id = change.get('id') if isinstance(change, dict) else None
+    if not isinstance(expense_id, int) or isinstance(expense_id, bool) or expense_id < 1:
+        raise ValidationError("Change must have a positive integer id")
+    if change.get('updated_at') is not None:
+        check_text('updated_at', change['updated_at'])
+    current = store.get(expense_id)
+    if change.get('deleted'):
+        if current is None:
+            store.check_archived(expense_id)
+            return None, None, True
+        if changed_at(change) > changed_at(current):
+            store.delete(expense_id, updated_at=change.get('updated_at'))
+            return store.tombstone(expense_id), None, True
+        return current, None, False
+    expense = validate_expense(change)
+    expense['updated_at'] = change.get('updated_at') or expense['created_at']
+    if current is None:
+        tombstone = store.tombstone(expense_id)
+        if tombstone is not None and changed_at(tombstone) >= changed_at(expense):
+            # Deleted elsewhere after this device last edited it.
+            return tombstone, None, False
+        return store.put({"id": expense_id, **expense}), None, True
+    if change.get('created_at') and current['created_at'] != change['created_at']:
+        # Two devices gave different expenses the same id while offline.
+        new_id = store.allocate_ids(1)[0]
+        return store.put({"id": new_id, **expense}), new_id, True
+    if changed_at(expense) > changed_at(current):
+        return store.put({"id": expense_id, **expense}), None, True
+    return current, None, False
+
+
+def sync(store, since, changes, limit=SYNC_PAGE_SIZE):
+    """Apply a device's changes, then return the server's changes since `since`.
+
+    The response carries the changes (expenses and tombstones, oldest
+    first), the version to send as `since` next time, has_more while
+    further pages remain, ids for expenses moved to a new id, and the
+    changes rejected as invalid. Where the server's copy beat a pushed
+    change, that copy is included even if the device saw it before. If
+    `since` is ahead of the server (its data was restored or migrated) the
+    device gets everything with reset set and should rebuild its copy from
+    the server's.
+    """
+    reset = since > store.last_version()
+    if reset:
+        since = 0
+    ids, rejected, echoes, corrections = {}, [], set(), {}
+    with _merge_lock:
+        for change in changes:
+            try:
+                record, new_id, applied = merge(store, change)
+            except ValidationError as e:
+                rejected.append({"id": change.get('id') if isinstance(change, dict) else None, "error": str(e)})
+                continue
+            if new_id is not None:
+                ids[str(change['id'])] = new_id
+            if record is None:
+                continue
+            if applied and (record.get('deleted') or all(record[f] == change.get(f) for f in EXPENSE_FIELDS)):
+                # The device already has exactly this; don't send it back.
+                echoes.add(record['version'])
+            else:
+                corrections[record['id']] = record
+    page = store.changes(since, limit)
+    return {
+        "changes": ([c for c in page if c['version'] not in echoes]
+                    + [c for c in corrections.values() if c['version'] <= since]),
+        "version": page[-1]['version'] if page else since,
+        "has_more": len(page) == limit,
+        "ids": ids,
+        "rejected": rejected,
+        "reset": reset,
+    }
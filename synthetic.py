@@ -0,0 +1,56 @@
+# synthetic.py - Deterministic synthetic expenses for demos and load tests
+import random
+from datetime import date, datetime, timedelta
+
+# Relative frequency of each category, typical items and a median amount (Rs.)
+CATEGORY_PROFILES = {
+    "Food & Dining": (30, ["Coffee", "Tea", "Lunch", "Dinner", "Groceries", "Momo", "Pizza", "Snacks"], 250),
+    "Transportation": (18, ["Bus Fare", "Taxi", "Fuel", "Bike Service", "Parking"], 150),
+    "Shopping": (12, ["Clothes", "Shoes", "Bag", "Electronics", "Books"], 1500),
+    "Entertainment": (8, ["Netflix", "Movie Tickets", "Concert", "Games", "Spotify"], 600),
+    "Bills & Utilities": (12, ["Electricity", "Internet", "Water", "Phone Recharge", "Rent"], 2000),
+    "Healthcare": (6, ["Pharmacy", "Doctor Visit", "Lab Test", "Gym"], 800),
+    "Education": (5, ["Course Fee", "Stationery", "Tuition", "Exam Fee"], 1200),
+    "Other": (9, ["Gift", "Donation", "Repair", "Misc"], 400),
+}
+
+# Relative frequency of each payment method
+PAYMENT_WEIGHTS = {
+    "Cash": 40,
+    "Digital (Esewa/Net Banking)": 35,
+    "Card (Credit/Debit)": 20,
+    "Other": 5,
+}
+
+NOTES = ["", "", "", "Monthly subscription", "With friends", "Commute to work", "Weekend", "Urgent"]
+
+
+def generate_expenses(n, seed=0, days=365, start_id=1, end=None):
+    """Yield n expenses spread over the `days` days ending at `end` (default today).
+
+    The same (n, seed, days, end) always yields the same rows. Amounts are
+    log-normal around each category's median, so a few large purchases
+    sit among many small ones, as in real spending.
+    """
+    rng = random.Random(seed)
+    end = end or date.today()
+    start = end - timedelta(days=max(days, 1) - 1)
+    categories = list(CATEGORY_PROFILES)
+    category_weights = [CATEGORY_PROFILES[c][0] for c in categories]
+    payments = list(PAYMENT_WEIGHTS)
+    payment_weights = list(PAYMENT_WEIGHTS.values())
+    for i in range(n):
+        category = rng.choices(categories, category_weights)[0]
+        _, items, median = CATEGORY_PROFILES[category]
+        day = start + timedelta(days=rng.randrange(max(days, 1)))
+        created = datetime(day.year, day.month, day.day, rng.randrange(7, 23), rng.randrange(60), rng.randrange(60))
+        yield {
+            "id": start_id + i,
+            "item": rng.choice(items),
+            "amount": round(max(1.0, rng.lognormvariate(0, 0.8) * median), 2),
+            "category": category,
+            "date": day.isoformat(),
+            "payment_method": rng.choices(payments, payment_weights)[0],
+            "notes": rng.choice(NOTES),
+            "created_at": created.isoformat(),
+        }
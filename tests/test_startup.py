@@ -0,0 +1,69 @@
+# tests/test_startup.py - Fails when start-up gets slower than its budget
+#
+# Starts a fresh interpreter over a store of ROWS synthetic expenses that
+# imports main, serves `/` and polls `/ready` through the Flask test
+# client, timing each from the start of the import. Both must be within
+# STARTUP_BUDGET, the budget benchmarks/bench_startup.py holds gunicorn to
+# (run that for the full picture: import profile, workers, dashboard).
+# Run from the repo root:  python -m pytest tests
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+sys.path.insert(0, ROOT)
+
+from bench_startup import STARTUP_BUDGET
+from bench_storage import make_expenses
+
+from storage import JsonExpenseStore
+
+ROWS = 50_000
+# Seconds to wait for /ready before giving up on the worker warming at all
+READY_TIMEOUT = 60
+
+PROBE = f'''
+import json, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter() - start
+client = main.app.test_client()
+assert client.get('/').status_code == 200
+page = time.perf_counter() - start
+while client.get('/ready').status_code != 200:
+    assert time.perf_counter() - start < {READY_TIMEOUT}, main._warm_error
+    time.sleep(0.005)
+print(json.dumps({{"import": imported, "page": page, "ready": time.perf_counter() - start}}))
+'''
+
+
+@pytest.fixture(scope='module')
+def timings(tmp_path_factory):
+    """Seconds from the start of `import main` to it, the first page and /ready."""
+    tmp = tmp_path_factory.mktemp('startup')
+    path = str(tmp / 'expenses.json')
+    store = JsonExpenseStore(path, compact_every=float('inf'))
+    store.import_expenses(make_expenses(ROWS))
+    store.compact()
+    store.close()
+    env = {key: value for key, value in os.environ.items() if key != 'EXPENSE_SHARDS_DIR'}
+    env.update(EXPENSE_STORE='json', EXPENSES_FILE=path, ARCHIVE_DIR=str(tmp / 'archive'),
+               BUDGETS_FILE=str(tmp / 'budgets.json'))
+    result = subprocess.run([sys.executable, '-c', PROBE], cwd=ROOT, env=env, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def test_first_page_within_budget(timings):
+    assert timings['page'] <= STARTUP_BUDGET, (
+        f"first page {timings['page']:.2f} s after import started (import {timings['import']:.2f} s), "
+        f"budget {STARTUP_BUDGET} s")
+
+
+def test_ready_within_budget(timings):
+    assert timings['ready'] <= STARTUP_BUDGET, (
+        f"/ready {timings['ready']:.2f} s after import started, budget {STARTUP_BUDGET} s")
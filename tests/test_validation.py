@@ -0,0 +1,68 @@
+# tests/test_validation.py - Expense input the stores must refuse
+#
+# Run from the repo root:  python -m pytest tests
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage import JsonExpenseStore, SQLiteExpenseStore, ValidationError, validate_expense
+
+VALID = {"item": "Tea", "amount": 40, "category": "Food & Dining", "date": "2024-12-30", "payment_method": "Cash"}
+
+
+@pytest.mark.parametrize('date', [
+    '2025-W01-1',  # ISO week date, 10 characters like YYYY-MM-DD
+    '2025W011',
+    '2024-001',  # ISO ordinal date
+    '2024001',
+    '20241230',
+    '2024-12-30T00',
+    '2024-1-30',
+    '2024-02-30',
+    '',
+    20241230,
+])
+def test_only_canonical_dates(date):
+    with pytest.raises(ValidationError):
+        validate_expense({**VALID, "date": date})
+
+
+@pytest.mark.parametrize('amount', [True, False, None, "", "abc", "1e400", float('nan'), 0, -5, 1e10])
+def test_invalid_amounts(amount):
+    with pytest.raises(ValidationError):
+        validate_expense({**VALID, "amount": amount})
+
+
+def test_canonical_date_kept():
+    assert validate_expense(VALID)['date'] == '2024-12-30'
+
+
+@pytest.fixture(params=['json', 'sqlite'])
+def store(request, tmp_path):
+    if request.param == 'json':
+        store = JsonExpenseStore(str(tmp_path / 'expenses.json'))
+    else:
+        store = SQLiteExpenseStore(str(tmp_path / 'expenses.db'))
+    yield store
+    store.close()
+
+
+def test_week_date_never_reaches_the_store(store):
+    store.import_expenses([{**VALID, "id": i, "date": f"2024-12-{1 + i % 28:02d}", "notes": "",
+                            "created_at": "2024-12-01T00:00:00"} for i in range(1, 301)])
+    with pytest.raises(ValidationError):
+        store.add({**VALID, "date": "2025-W01-1"})
+    added = store.add(VALID)
+    with pytest.raises(ValidationError):
+        store.update(added['id'], {"date": "2025-W01-1"})
+    assert store.get(added['id'])['date'] == '2024-12-30'
+    after, ids = None, []
+    while True:
+        page, after = store.page(limit=37, after=after)
+        ids.extend(expense['id'] for expense in page)
+        if after is None:
+            break
+    assert sorted(ids) == sorted(expense['id'] for expense in store.all())